@@ -1,5 +1,6 @@
 from src.accounting.models.afip_invoices import AFIPInvoice
 from src.db import Database
+from src.date_ranges import days_range
 from datetime import datetime, timedelta
 
 class AFIPInvoiceService:
@@ -67,39 +68,33 @@ class AFIPInvoiceService:
             return None
 
         try:
-            # Iniciar transacción
-            # (Nota: La gestión de transacciones complejas con cursores 
-            # individuales puede ser delicada, pero la cerraremos)
-            
-            # Crear la factura AFIP
-            query = """
-            INSERT INTO afip_invoices (sale_id, cae, cae_expiration, invoice_type, invoice_number)
-            VALUES (%s, %s, %s, %s, %s)
-            """
-            params = (
-                data.get("sale_id"),
-                data.get("cae"),
-                data.get("cae_expiration"),
-                data.get("invoice_type"),
-                data.get("invoice_number")
-            )
-            
-            cursor = self.db.execute(query, params)
-            invoice_id = cursor.lastrowid
-            cursor.close()   
-            
-            # Marcar la venta como facturada
-            update_query = "UPDATE sales SET invoice_state = 'facturado' WHERE id = %s"
-            cursor2 = self.db.execute(update_query, (data.get("sale_id"),))
-            cursor2.close() 
-            
-            # Confirmar transacción
-            self.db.conn.commit()
-            
+            # La factura y el cambio de estado de la venta se confirman juntos
+            with self.db.transaction():
+                # Crear la factura AFIP
+                query = """
+                INSERT INTO afip_invoices (sale_id, cae, cae_expiration, invoice_type, invoice_number)
+                VALUES (%s, %s, %s, %s, %s)
+                """
+                params = (
+                    data.get("sale_id"),
+                    data.get("cae"),
+                    data.get("cae_expiration"),
+                    data.get("invoice_type"),
+                    data.get("invoice_number")
+                )
+
+                cursor = self.db.execute(query, params)
+                invoice_id = cursor.lastrowid
+                cursor.close()
+
+                # Marcar la venta como facturada
+                update_query = "UPDATE sales SET invoice_state = 'facturado' WHERE id = %s"
+                cursor2 = self.db.execute(update_query, (data.get("sale_id"),))
+                cursor2.close()
+
             return self.get_invoice_by_id(invoice_id)
-            
+
         except Exception as e:
-            self.db.conn.rollback()
             print(f"Error creando factura AFIP: {e}")
             return None
 
@@ -127,10 +122,10 @@ class AFIPInvoiceService:
         SELECT ai.*, s.total_amount, s.sale_date, s.payment_method
         FROM afip_invoices ai
         LEFT JOIN sales s ON ai.sale_id = s.id
-        WHERE DATE(s.sale_date) BETWEEN %s AND %s
+        WHERE s.sale_date >= %s AND s.sale_date < %s
         ORDER BY s.sale_date DESC
         """
-        cursor = self.db.execute(query, (start_date, end_date))
+        cursor = self.db.execute(query, days_range(start_date, end_date))
         results = cursor.fetchall() 
         invoices = []
         for row in results:
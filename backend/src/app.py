@@ -1,11 +1,17 @@
-from flask import Flask, send_from_directory
-import os
+from flask import Flask
 
 from src.accounting.routes import accounting_bp
 from src.configuration.routes.config_routes import config_bp
 from src.products.routes.products_routes import products_bp
+from src.products.routes.uploads_routes import uploads_bp
 from src.providers.routes.providers_routes import providers_bp
-from src.sales.routes.sales_routes import sales_bp
+from src.sales.routes.sales_routes import sales_bp, sale_service
+from src.tickets.routes.tickets_routes import tickets_bp, ticket_pipeline
+from src.events.routes.events_routes import events_bp
+from src.products.services.catalog_cache import CatalogCache
+from src.products.services.image_pipeline import ImagePipeline
+from src.products.services.stock_snapshot_service import StockSnapshotService
+from src.products.services.reorder_engine import ReorderEngine
 from src.users.routes.users_routes import users_bp
 from flask_cors import CORS
 
@@ -24,23 +30,43 @@ def create_app(testing: bool = False): # Funcion que usa patron factory
           app.config["DEBUG"] = False
 
      # inicializar servicios singleton con el patron builder
-     Database(testing=testing)  # instancia del cliente de MySQL
+     db = Database(testing=testing)  # instancia del cliente de MySQL (pool de conexiones)
      if not testing:
           MinioClient() # instancia el singleton de MinIO
+          ticket_pipeline.start(sale_service) # genera y sube los tickets en segundo plano
+          sale_service.journal.start_replayer(sale_service) # carga las ventas tomadas durante un corte de MySQL
+          ImagePipeline().start() # genera las variantes de las imágenes subidas en segundo plano
+          StockSnapshotService().start() # guarda el stock de cierre de cada día
+          ReorderEngine().start() # recalcula los puntos de pedido a medida que se vende
+
+     # Catálogo de productos en memoria: búsquedas y validación del carrito sin ir a MySQL
+     catalog = CatalogCache()
+     try:
+          catalog.load()
+     except Exception as e:
+          # Sin MySQL la app igual arranca (las ventas van al diario); el recargador reintenta
+          print(f"No se pudo cargar el catálogo de productos: {e}")
+     finally:
+          db.release_connection()  # la carga corre fuera de un request: devolver la conexión al pool
+     if not testing:
+          catalog.start_reloader()
 
      CORS(app)
 
-     # Servir archivos estáticos desde la carpeta uploads
-     @app.route('/uploads/<path:filename>')
-     def uploaded_file(filename):
-          return send_from_directory('/app/uploads', filename)
+     # Cada request usa su propia conexión del pool y la devuelve al terminar
+     @app.teardown_appcontext
+     def release_db_connection(exc):
+          db.release_connection(exc)
 
      # register blueprints
      app.register_blueprint(accounting_bp, url_prefix="/api/contabilidad")
      app.register_blueprint(config_bp)
      app.register_blueprint(products_bp, url_prefix="/api/productos")
+     app.register_blueprint(uploads_bp)
      app.register_blueprint(providers_bp, url_prefix="/api/proveedores")
      app.register_blueprint(sales_bp)
+     app.register_blueprint(tickets_bp)
+     app.register_blueprint(events_bp)
      app.register_blueprint(users_bp)
 
      return app
@@ -0,0 +1,45 @@
+from datetime import date, datetime, timedelta
+
+# Rangos de fechas semiabiertos [inicio, fin) para filtrar columnas DATE o DATETIME.
+# Comparar la columna "desnuda" (sale_date >= %s AND sale_date < %s) permite que MySQL
+# use el índice; envolverla en DATE(), MONTH() o YEAR() obliga a recorrer la tabla entera.
+
+
+def to_date(value):
+    """Acepta date, datetime o 'YYYY-MM-DD' y devuelve un date."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value), '%Y-%m-%d').date()
+
+
+def day_range(day):
+    start = to_date(day)
+    return start, start + timedelta(days=1)
+
+
+def days_range(first_day, last_day):
+    """Rango de varios días, ambos extremos incluidos."""
+    return to_date(first_day), to_date(last_day) + timedelta(days=1)
+
+
+def week_range(day):
+    """Semana de lunes a domingo que contiene al día."""
+    start = to_date(day)
+    start -= timedelta(days=start.weekday())
+    return start, start + timedelta(days=7)
+
+
+def month_range(year, month):
+    start = date(int(year), int(month), 1)
+    end = date(start.year + 1, 1, 1) if start.month == 12 else date(start.year, start.month + 1, 1)
+    return start, end
+
+
+def year_range(year):
+    return date(int(year), 1, 1), date(int(year) + 1, 1, 1)
+
+
+def previous_month(year, month):
+    return (year, month - 1) if month > 1 else (year - 1, 12)
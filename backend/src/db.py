@@ -2,7 +2,11 @@ import mysql.connector
 from mysql.connector import Error
 
 import os
+import queue
+import threading
+from contextlib import contextmanager
 from dotenv import load_dotenv
+from flask import g, has_app_context
 import time
 
 
@@ -12,19 +16,120 @@ load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '../../.env'))
 print(f"HOST {os.getenv('MYSQL_HOST')}")
 print(f"DATABASE {os.getenv('MYSQL_DATABASE')}")
 print(f"PORT {os.getenv('MYSQL_PORT')}")
-# Conexión a la base de datos MySQL Singleton
+
+
+class PoolTimeoutError(Error):
+    """No se pudo obtener una conexión del pool dentro del timeout."""
+
+
+# Errores del cliente que indican que el servidor MySQL no responde (no errores de la consulta)
+UNAVAILABLE_ERRNOS = {
+    2003,  # no se puede conectar al servidor
+    2005,  # host desconocido
+    2006,  # el servidor se fue (MySQL server has gone away)
+    2013,  # conexión perdida durante la consulta
+    2055,  # conexión perdida (errores de socket)
+}
+
+
+def is_unavailable_error(exc):
+    return isinstance(exc, Error) and exc.errno in UNAVAILABLE_ERRNOS
+
+
+class ConnectionPool:
+    """
+    Pool de conexiones MySQL de tamaño fijo.
+    Cada hilo/request toma su propia conexión, así las consultas no se bloquean entre sí.
+    """
+
+    def __init__(self, size, timeout, ping_interval, **connect_args):
+        self.size = size
+        self.timeout = timeout
+        self.ping_interval = ping_interval  # segundos inactiva antes de chequearla al prestarla
+        self.connect_args = connect_args
+        self._idle = queue.LifoQueue()  # LIFO: reutiliza las conexiones más "calientes"
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        return mysql.connector.connect(autocommit=True, **self.connect_args)
+
+    def _is_healthy(self, conn, idle_since):
+        if time.monotonic() - idle_since < self.ping_interval:
+            return True
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Error:
+            return False
+
+    def acquire(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeoutError(f"Pool de conexiones agotado ({self.size}) tras {self.timeout}s")
+        try:
+            try:
+                conn, idle_since = self._idle.get_nowait()
+            except queue.Empty:
+                conn = None
+
+            if conn is not None and not self._is_healthy(conn, idle_since):
+                self._discard(conn)
+                conn = None
+
+            return conn if conn is not None else self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn, discard=False):
+        try:
+            if discard:
+                self._discard(conn)
+                return
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put((conn, time.monotonic()))
+        except Error:
+            self._discard(conn)
+        finally:
+            self._slots.release()
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Error:
+            pass
+
+    def close(self):
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(conn)
+
+
+class _UnitOfWork:
+    """Estado de la conexión prestada a un request (o hilo): conexión y nivel de transacción."""
+
+    def __init__(self):
+        self.conn = None
+        self.depth = 0
+        self.on_commit = []  # callbacks a ejecutar después del COMMIT final
+
+
+# Conexión a la base de datos MySQL Singleton (con pool de conexiones)
 class Database:
     _instance = None  # atributo de clase para almacenar la única instancia
     _testing_mode = False
 
     def __new__(cls, *args, **kwargs):
-        if cls._instance is None:  
+        if cls._instance is None:
             cls._instance = super(Database, cls).__new__(cls)
         return cls._instance
 
     def __init__(self,testing=False,host=None, user="root", password=None, database=None, retries=5, delay=8):
         # Inicializamos solo una vez
-        if not hasattr(self, "initialized"):  
+        if not hasattr(self, "initialized"):
             self.host =  os.getenv("MYSQL_HOST","mysql")
             self.user = user
             self.password = os.getenv("MYSQL_ROOT_PASSWORD")
@@ -33,48 +138,195 @@ class Database:
                 self.database = os.getenv("MYSQL_TEST_DATABASE")
             else:
                 self.database = os.getenv("MYSQL_DATABASE")
-                
+
             self.retries = retries
             self.delay = delay
-            self.conn = None
-            self.cursor = None
+            self.pool_size = int(os.getenv("MYSQL_POOL_SIZE", 10))
+            self.pool_timeout = float(os.getenv("MYSQL_POOL_TIMEOUT", 10))
+            self.pool_ping_interval = float(os.getenv("MYSQL_POOL_PING_INTERVAL", 5))
+            self.pool = None
+            self._local = threading.local()  # unidad de trabajo de hilos fuera de Flask
             self.connect_with_retries()
             self.initialized = True  # evita reinicialización
 
     def connect_with_retries(self):
+        self.pool = ConnectionPool(
+            size=self.pool_size,
+            timeout=self.pool_timeout,
+            ping_interval=self.pool_ping_interval,
+            host=self.host,
+            user=self.user,
+            password=self.password,
+            database=self.database
+        )
         attempts = 0
+        last_error = None
         while attempts < self.retries:
             try:
-                self.conn = mysql.connector.connect(
-                    host=self.host,
-                    user=self.user,
-                    password=self.password,
-                    database=self.database
-                )
-                self.cursor = self.conn.cursor(dictionary=True)
-                print(f"MySQL conectado correctamente a {self.host}:{self.database}")
+                # Se abre la primera conexión para verificar que MySQL responde
+                self.pool.release(self.pool.acquire())
+                print(f"MySQL conectado correctamente a {self.host}:{self.database} (pool de {self.pool_size})")
                 return
             except Error as e:
                 attempts += 1
+                last_error = e
                 print(f"Intento {attempts}: MySQL no disponible ({e}), reintentando en {self.delay}s...")
                 time.sleep(self.delay)
+        if is_unavailable_error(last_error):
+            # Sin servidor se arranca igual: el pool abre las conexiones recién al pedirlas, así que
+            # se recupera solo cuando MySQL vuelve. Mientras tanto las ventas van al diario.
+            print(f"MySQL sigue sin responder después de {self.retries} intentos: se arranca sin base")
+            return
+        # Credenciales o base inexistente: reintentar no lo arregla
         raise ConnectionError(f"No se pudo conectar a MySQL después de {self.retries} intentos.")
 
 
     def execute(self, query, params=None):
-        cursor = self.conn.cursor(dictionary=True)  # cursor nuevo como diccionario
+        conn = self.get_connection()
+        cursor = conn.cursor(dictionary=True, buffered=True)  # cursor nuevo como diccionario
         cursor.execute(query, params or ())
-        
-        if not query.strip().lower().startswith("select"):
-            self.conn.commit()
-        
+        # Las conexiones del pool están en autocommit: fuera de una transacción explícita
+        # cada sentencia se confirma sola, sin un COMMIT extra.
         return cursor
 
+    def stream(self, query, params=None, batch_size=1000):
+        """
+        Genera el resultado de la consulta en lotes de batch_size filas (dict) usando un
+        cursor sin buffer: el servidor va enviando filas a medida que se leen, así la memoria
+        no depende del tamaño del resultado.
+        Usa una conexión propia del pool (no la del request), porque el generador suele
+        consumirse cuando el request ya terminó, por ejemplo en una respuesta en streaming.
+        """
+        conn = self.pool.acquire()
+        finished = False
+        cursor = None
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(query, params or ())
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+            finished = True
+        finally:
+            if finished:
+                cursor.close()
+            # Si el consumidor cortó a mitad de camino quedan filas sin leer en el socket:
+            # es más barato cerrar esa conexión que drenarla.
+            self.pool.release(conn, discard=not finished)
+
     def close(self):
-        if self.cursor:
-            self.cursor.close()
-        if self.conn:
-            self.conn.close()
+        self.release_connection()
+        if self.pool:
+            self.pool.close()
+
+    def _unit(self):
+        """
+        Unidad de trabajo actual: ligada al app context de Flask durante un request,
+        o al hilo para workers que corren fuera de Flask.
+        """
+        if has_app_context():
+            if "_db_unit" not in g:
+                g._db_unit = _UnitOfWork()
+            return g._db_unit
+        unit = getattr(self._local, "unit", None)
+        if unit is None:
+            unit = self._local.unit = _UnitOfWork()
+        return unit
 
     def get_connection(self):
-        return self.conn
\ No newline at end of file
+        """Devuelve la conexión del request actual, tomándola del pool en el primer uso."""
+        unit = self._unit()
+        if unit.conn is None:
+            unit.conn = self.pool.acquire()
+        return unit.conn
+
+    def in_transaction(self):
+        return self._unit().depth > 0
+
+    @contextmanager
+    def transaction(self, savepoint=True):
+        """
+        Abre una transacción en la conexión del request.
+        Si ya hay una en curso, anida con un SAVEPOINT (o se une a ella con savepoint=False),
+        de modo que un error interno sólo deshace su propio bloque.
+        """
+        unit = self._unit()
+        conn = self.get_connection()
+        name = None
+        if unit.depth == 0:
+            conn.start_transaction()
+        elif savepoint:
+            name = f"sp_{unit.depth}"
+            self._run(conn, f"SAVEPOINT {name}")
+
+        pending_callbacks = len(unit.on_commit)
+        unit.depth += 1
+        try:
+            yield conn
+        except BaseException:
+            unit.depth -= 1
+            if unit.depth == 0:
+                unit.on_commit.clear()
+                conn.rollback()
+            elif name:
+                # Lo registrado dentro del bloque deshecho no debe ejecutarse
+                del unit.on_commit[pending_callbacks:]
+                self._run(conn, f"ROLLBACK TO SAVEPOINT {name}")
+            raise
+        else:
+            unit.depth -= 1
+            # Los savepoints se liberan solos con el COMMIT final, no hace falta RELEASE
+            if unit.depth == 0:
+                conn.commit()
+                self._run_on_commit(unit)
+
+    def on_commit(self, callback):
+        """
+        Ejecuta callback cuando se confirme la transacción en curso (o ya mismo si no hay
+        ninguna). Si la transacción se deshace, el callback se descarta.
+        Sirve para disparar trabajo en segundo plano sólo sobre datos ya confirmados.
+        """
+        unit = self._unit()
+        if unit.depth == 0:
+            callback()
+        else:
+            unit.on_commit.append(callback)
+
+    def _run_on_commit(self, unit):
+        callbacks, unit.on_commit = unit.on_commit, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                # Los datos ya están confirmados: un callback que falla no debe romper el request
+                print(f"Error en callback post-commit: {e}")
+
+    def _run(self, conn, statement):
+        cursor = conn.cursor()
+        cursor.execute(statement)
+        cursor.close()
+
+    def release_connection(self, exc=None):
+        """
+        Cierra la unidad de trabajo al terminar el request: confirma o deshace lo que
+        haya quedado abierto y devuelve la conexión al pool.
+        """
+        unit = self._unit()
+        conn = unit.conn
+        if conn is None:
+            return
+        unit.conn = None
+        unit.depth = 0
+        unit.on_commit.clear()
+        try:
+            if conn.in_transaction:
+                if exc is None:
+                    conn.commit()
+                else:
+                    conn.rollback()
+        except Error as e:
+            print(f"Error cerrando la transacción del request: {e}")
+        finally:
+            self.pool.release(conn)
@@ -0,0 +1,55 @@
+from flask import Blueprint, Response, request, jsonify
+from src.events.services.event_broadcaster import EventBroadcaster
+import os
+import queue
+
+events_bp = Blueprint('events', __name__, url_prefix='/api/events')
+broadcaster = EventBroadcaster()
+
+EVENT_TYPES = {'sale_created', 'sale_deleted', 'stock_changed', 'expense_created'}
+HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", 15))
+
+@events_bp.route('', methods=['GET'])
+def stream_events():
+    """Stream SSE de eventos de ventas, stock y gastos: ?types=sale_created,stock_changed"""
+    types = request.args.get('types')
+    event_types = None
+    if types:
+        event_types = {t.strip() for t in types.split(',') if t.strip()}
+        unknown = event_types - EVENT_TYPES
+        if unknown:
+            return jsonify({
+                'success': False,
+                'message': f"Tipos de evento desconocidos: {', '.join(sorted(unknown))}"
+            }), 400
+
+    # El navegador reenvía el último id recibido al reconectar
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    subscription = broadcaster.subscribe(event_types, last_event_id)
+
+    response = Response(_event_stream(subscription), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # que un proxy nginx no acumule el stream
+    return response
+
+def _event_stream(subscription):
+    try:
+        yield b"retry: 3000\n\n"
+        while True:
+            if subscription.overflowed:
+                # Se perdieron eventos: el cliente debe recargar el estado completo y reconectar
+                yield b"event: resync\ndata: {}\n\n"
+                return
+            try:
+                event_id, event_type, payload = subscription.queue.get(timeout=HEARTBEAT_SECONDS)
+            except queue.Empty:
+                yield b": ping\n\n"  # mantiene viva la conexión y detecta clientes caídos
+                continue
+            yield f"id: {event_id}\nevent: {event_type}\ndata: {payload}\n\n".encode('utf-8')
+    finally:
+        broadcaster.unsubscribe(subscription)
@@ -0,0 +1,87 @@
+from src.db import Database
+from flask import json
+from collections import deque
+import itertools
+import os
+import queue
+import threading
+
+
+class Subscription:
+    """Un cliente conectado: su cola acotada de eventos pendientes."""
+
+    def __init__(self, buffer_size, event_types=None):
+        self.queue = queue.Queue(maxsize=buffer_size)
+        self.event_types = event_types
+        self.overflowed = False  # el cliente no leyó a tiempo y perdió eventos
+
+    def wants(self, event_type):
+        return self.event_types is None or event_type in self.event_types
+
+
+class EventBroadcaster:
+    """
+    Difusor de eventos en proceso para el stream SSE.
+    Cada suscriptor tiene una cola acotada: publicar nunca bloquea, y un cliente lento que
+    llena su cola se marca como desbordado para que se resincronice, sin frenar al resto.
+    Guarda los últimos eventos para que un cliente que reconecta con Last-Event-ID no pierda
+    los intermedios.
+    """
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super(EventBroadcaster, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, "initialized"):
+            self.buffer_size = int(os.getenv("EVENTS_BUFFER_SIZE", 256))
+            self._subscribers = set()
+            self._history = deque(maxlen=int(os.getenv("EVENTS_HISTORY_SIZE", 1000)))
+            self._ids = itertools.count(1)
+            self._lock = threading.Lock()
+            self.initialized = True
+
+    def subscribe(self, event_types=None, last_event_id=None):
+        subscription = Subscription(self.buffer_size, event_types)
+        with self._lock:
+            if last_event_id is not None:
+                latest_id = self._history[-1][0] if self._history else 0
+                missed = [event for event in self._history if event[0] > last_event_id]
+                if (last_event_id > latest_id  # el servidor se reinició y los ids volvieron a empezar
+                        or (missed and missed[0][0] != last_event_id + 1)  # ya salieron del historial
+                        or len(missed) > self.buffer_size):
+                    subscription.overflowed = True
+                for event in missed:
+                    if not subscription.overflowed and subscription.wants(event[1]):
+                        subscription.queue.put_nowait(event)
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, event_type, data):
+        """Publica un evento a todos los suscriptores. Devuelve el id asignado."""
+        payload = json.dumps(data)
+        with self._lock:
+            event = (next(self._ids), event_type, payload)
+            self._history.append(event)
+            for subscription in self._subscribers:
+                if subscription.overflowed or not subscription.wants(event_type):
+                    continue
+                try:
+                    subscription.queue.put_nowait(event)
+                except queue.Full:
+                    subscription.overflowed = True
+        return event[0]
+
+    def publish_after_commit(self, event_type, data):
+        """Publica recién cuando se confirme la transacción en curso (y nunca si se deshace)."""
+        Database().on_commit(lambda: self.publish(event_type, data))
@@ -0,0 +1,20 @@
+from datetime import datetime
+import base64
+
+# Cursores de paginación por keyset sobre (fecha, id): el cliente recibe la clave de la última
+# fila de la página como texto opaco y la devuelve para pedir la siguiente.
+
+
+def encode_cursor(row_date, row_id):
+    raw = f"{row_date.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """Devuelve (fecha, id). Lanza ValueError si el cursor no es válido."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        row_date, row_id = raw.split("|")
+        return datetime.fromisoformat(row_date), int(row_id)
+    except Exception:
+        raise ValueError("Cursor inválido")
@@ -1,6 +1,10 @@
 from minio import Minio
+from minio.error import S3Error
 from dotenv import load_dotenv
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlparse
 
+import io
 import os
 
 load_dotenv('../.env')
@@ -15,12 +19,24 @@ class MinioClient:
             access_key = os.getenv("MINIO_ROOT_USER")
             secret_key = os.getenv("MINIO_ROOT_PASSWORD")
             endpoint = os.getenv("MINIO_ENDPOINT")
+            # URL con la que el navegador llega a MinIO (puede diferir del endpoint interno)
+            self.public_url = os.getenv("MINIO_PUBLIC_URL", f"http://{endpoint}").rstrip("/")
             self.client = Minio(
                 endpoint,
                 access_key=access_key,
                 secret_key=secret_key,
                 secure=False
             )
+            # Las URLs prefirmadas se firman con el host público; con la región fija no hace falta
+            # consultarla al servidor (el host público puede no ser accesible desde el backend)
+            public = urlparse(self.public_url)
+            self.signer = Minio(
+                public.netloc,
+                access_key=access_key,
+                secret_key=secret_key,
+                secure=public.scheme == "https",
+                region=os.getenv("MINIO_REGION", "us-east-1")
+            )
             MinioClient._instance = self
             self.init_buckets()
             self.initialized = True
@@ -40,16 +56,78 @@ class MinioClient:
         return cls._instance.client
     
     @classmethod
-    def guardar_ticket(cls, ticket_pdf): # implementar
+    def guardar_ticket(cls, nombre, ticket_pdf):
+        """
+        Sube el PDF del ticket (bytes en memoria) al bucket tickets y devuelve el nombre del
+        objeto. El bucket no es público: para descargarlo hace falta url_ticket.
+        Args:
+            nombre (str): nombre del objeto, por ejemplo "ticket_123.pdf"
+            ticket_pdf (bytes): contenido del PDF
+        """
+        cls.get_instance().put_object(
+            "tickets",
+            nombre,
+            io.BytesIO(ticket_pdf),
+            length=len(ticket_pdf),
+            content_type="application/pdf"
+        )
+        return nombre
+
+    @classmethod
+    def url_ticket(cls, nombre, expira=timedelta(minutes=15)):
+        """
+        URL prefirmada para descargar un ticket del bucket tickets.
+        Acepta también las URLs sin firmar que se guardaban antes en ticket_url; una URL de
+        otro servidor se devuelve tal cual.
+        """
+        cls.get_instance()
+        prefijo = f"{cls._instance.public_url}/tickets/"
+        if nombre.startswith(prefijo):
+            nombre = nombre[len(prefijo):]
+        elif "://" in nombre:
+            return nombre
+        return cls._instance.signer.presigned_get_object("tickets", nombre, expires=expira)
+
+    @classmethod
+    def guardar_imagen(cls, nombre, data, content_type, cache_control=None):
         """
-        Guarda el pdf que le mandes en el bucket tickets. 
-        A definir si mandamos un path, un archivo directo, etc.
-        Depende mucho del momento de creacion del pdf.
+        Sube una imagen (bytes en memoria) al bucket images.
         Args:
-            ticket_pdf (_type_): _description_
+            nombre (str): nombre del objeto, por ejemplo "<hash>/medium.webp"
+            cache_control (str): Cache-Control con el que MinIO servirá el objeto
+        """
+        cls.get_instance().put_object(
+            "images",
+            nombre,
+            io.BytesIO(data),
+            length=len(data),
+            content_type=content_type,
+            metadata={"Cache-Control": cache_control} if cache_control else None
+        )
+
+    @classmethod
+    def existe_imagen(cls, nombre):
+        try:
+            cls.get_instance().stat_object("images", nombre)
+            return True
+        except S3Error as e:
+            if e.code in ("NoSuchKey", "NoSuchObject"):
+                return False
+            raise
+
+    @classmethod
+    def url_imagen(cls, nombre, rotacion=timedelta(days=1)):
+        """
+        URL prefirmada para descargar una imagen del bucket images.
+        La firma usa la hora truncada al período de rotación, así la URL es la misma durante
+        todo el período y el navegador puede cachear tanto la redirección como la imagen.
+        Vale dos períodos: una URL cacheada hasta el final del suyo sigue siendo válida.
+        Devuelve (url, segundos que faltan para que cambie la URL).
         """
-        cls.get_instance().fput_object(
-            "tickets", 
-            ticket_pdf.filename, 
-            ticket_pdf.path
-        )
\ No newline at end of file
+        cls.get_instance()
+        now = datetime.now(timezone.utc)
+        period = int(rotacion.total_seconds())
+        start = datetime.fromtimestamp(int(now.timestamp()) // period * period, tz=timezone.utc)
+        url = cls._instance.signer.presigned_get_object(
+            "images", nombre, expires=rotacion * 2, request_date=start)
+        return url, max(0, int((start + rotacion - now).total_seconds()))
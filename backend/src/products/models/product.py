@@ -1,5 +1,6 @@
 class Product:
-    def __init__(self, id=None, name=None, barcode=None, price=None, stock=None, url_image=None, category=None):
+    def __init__(self, id=None, name=None, barcode=None, price=None, stock=None, url_image=None, category=None,
+                 created_at=None, updated_at=None):
         self.id = id
         self.name = name
         self.barcode = barcode
@@ -7,6 +8,8 @@ class Product:
         self.stock = stock
         self.url_image = url_image
         self.category = category
+        self.created_at = created_at
+        self.updated_at = updated_at  # versión de la fila para la sincronización incremental
 
     def __repr__(self):
         return (f"Product(id={self.id}, name={self.name}, barcode={self.barcode}, price={self.price}, "
@@ -1,16 +1,29 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, make_response, json
+from datetime import datetime, timezone
+import csv
+import io
+import math
 import os
-import uuid
 from werkzeug.utils import secure_filename
 
 from src.products.services.products_service import ProductoService
 from src.products.services.stock_service import StockService
+from src.products.services.stock_snapshot_service import StockSnapshotService
+from src.products.services.reorder_engine import ReorderEngine
+from src.products.services.image_pipeline import ImagePipeline, InvalidImageError
 
 products_bp = Blueprint("products", __name__)
 p_service = ProductoService()
 s_service = StockService()
+snapshot_service = StockSnapshotService()
+reorder_engine = ReorderEngine()
+image_pipeline = ImagePipeline()
 
-UPLOAD_FOLDER = '/app/uploads'
+MAX_BARCODE_LOOKUP = 500
+MAX_SEARCH_RESULTS = 50
+MAX_REORDER_RESULTS = 1000
+
+MAX_IMAGE_BYTES = int(os.getenv("MAX_IMAGE_BYTES", 20 * 1024 * 1024))
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 
 def allowed_file(filename):
@@ -18,8 +31,52 @@ def allowed_file(filename):
 
 @products_bp.route("/", methods=["GET"])
 def get_products():
+    # El catálogo completo es la respuesta más pesada: las cajas lo revalidan con
+    # If-None-Match / If-Modified-Since y reciben 304 si no cambió
+    version = p_service.get_catalog_version()
+    etag = last_modified = None
+    if version and version["settled"]:
+        etag = f"{version['total']}-{version['version']}"
+        last_modified = datetime.fromtimestamp(math.ceil(version["version"] / 1_000_000), tz=timezone.utc)
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains(etag)
+        else:
+            not_modified = request.if_modified_since is not None and last_modified <= request.if_modified_since
+        if not_modified:
+            return _catalog_response(make_response("", 304), etag, last_modified)
+
     products = p_service.get_all_products()
-    return jsonify([product.to_dict() for product in products]), 200
+    return _catalog_response(jsonify([product.to_dict() for product in products]), etag, last_modified)
+
+def _catalog_response(response, etag, last_modified):
+    if etag:
+        response.set_etag(etag)
+        response.last_modified = last_modified
+    response.headers["Cache-Control"] = "no-cache"  # el navegador puede guardarla pero revalida siempre
+    return response
+
+@products_bp.route("/changes", methods=["GET"])
+def get_product_changes():
+    """Sincronización incremental: ?since=<version> devuelve sólo lo que cambió desde entonces."""
+    since = request.args.get("since", "0")
+    try:
+        since = int(since)
+    except ValueError:
+        since = -1
+    if since < 0:
+        return jsonify({"error": "since debe ser la versión devuelta por la llamada anterior (o 0)"}), 400
+
+    try:
+        products, deleted, version = p_service.get_changes(since)
+    except Exception as e:
+        print(f"Error obteniendo cambios del catálogo: {e}")
+        return jsonify({"error": "Error al obtener los cambios"}), 500
+
+    return jsonify({
+        "products": [product.to_dict() for product in products],
+        "deleted": deleted,
+        "version": version
+    }), 200
 
 @products_bp.route("/<int:product_id>", methods=["GET"])
 def get_product(product_id):
@@ -28,6 +85,45 @@ def get_product(product_id):
         return jsonify(product.to_dict()), 200
     return jsonify({"error": "Product not found"}), 404
 
+@products_bp.route("/search", methods=["GET"])
+def search_products():
+    """Búsqueda por nombre, código o categoría, sin distinguir acentos: ?q=jamon&limit=20"""
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"error": "Se requiere el parámetro q"}), 400
+    limit = request.args.get("limit", 20, type=int)
+    if limit < 1 or limit > MAX_SEARCH_RESULTS:
+        return jsonify({"error": f"limit debe estar entre 1 y {MAX_SEARCH_RESULTS}"}), 400
+
+    results = p_service.search_products(query, limit)
+    return jsonify([{**product.to_dict(), "score": score} for product, score in results]), 200
+
+@products_bp.route("/barcode/<string:barcode>", methods=["GET"])
+def get_product_by_barcode(barcode):
+    """Resuelve un código escaneado sin descargar el catálogo."""
+    product = p_service.get_product_by_barcode(barcode.strip())
+    if product:
+        return jsonify(product.to_dict()), 200
+    return jsonify({"error": "Producto no encontrado"}), 404
+
+@products_bp.route("/barcode/lookup", methods=["POST"])
+def lookup_barcodes():
+    """Resuelve varios códigos en una sola llamada: {"barcodes": ["779...", ...]}"""
+    data = request.get_json(silent=True) or {}
+    barcodes = data.get("barcodes")
+    if not isinstance(barcodes, list) or not barcodes:
+        return jsonify({"error": "Se requiere una lista barcodes"}), 400
+    if len(barcodes) > MAX_BARCODE_LOOKUP:
+        return jsonify({"error": f"Máximo {MAX_BARCODE_LOOKUP} códigos por consulta"}), 400
+
+    barcodes = [str(barcode).strip() for barcode in barcodes if barcode is not None and str(barcode).strip()]
+    found = p_service.get_products_by_barcodes(barcodes)
+    unique = list(dict.fromkeys(barcodes))
+    return jsonify({
+        "products": [found[barcode].to_dict() for barcode in unique if barcode in found],
+        "not_found": [barcode for barcode in unique if barcode not in found]
+    }), 200
+
 @products_bp.route("/", methods=["POST"])
 def create_product():
     data = request.get_json()
@@ -41,6 +137,86 @@ def create_product():
     
     return jsonify(result.to_dict()), 201 # devuelve el producto creado con su ID
 
+@products_bp.route("/import", methods=["POST"])
+def import_products():
+    """
+    Alta o actualización masiva por nombre o código de barras. Acepta el cuerpo como CSV
+    (text/csv), JSON (lista de objetos) o NDJSON (application/x-ndjson), o un archivo en
+    el campo "file" de un formulario multipart.
+    """
+    if "file" in request.files:
+        upload = request.files["file"]
+        filename = upload.filename.lower()
+        kind = "csv" if filename.endswith(".csv") else "ndjson" if filename.endswith((".ndjson", ".jsonl")) else "json"
+        stream = upload.stream
+    else:
+        kind = {"text/csv": "csv", "application/csv": "csv", "application/json": "json",
+                "application/x-ndjson": "ndjson"}.get(request.mimetype)
+        stream = request.stream
+    if kind is None:
+        return jsonify({"error": "Formato no soportado: usar CSV, JSON o NDJSON"}), 415
+
+    try:
+        rows = _import_rows(kind, stream)
+        if kind == "json":
+            rows = list(rows)  # una lista JSON se valida entera antes de empezar
+    except ValueError as e:
+        return jsonify({"error": f"JSON inválido: {e}"}), 400
+
+    try:
+        summary = p_service.import_products(rows)
+    except UnicodeDecodeError:
+        return jsonify({"error": "El archivo debe estar en UTF-8 (las filas anteriores al error ya se cargaron)"}), 400
+    return jsonify(summary), 200
+
+def _import_rows(kind, stream):
+    """Genera (número de fila, dict) leyendo el cuerpo de a poco (salvo JSON, que es una lista)."""
+    if kind == "json":
+        data = json.load(stream)
+        if not isinstance(data, list):
+            raise ValueError("se esperaba una lista de productos")
+        return enumerate(data, start=1)
+
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if kind == "csv":
+        # El número de fila cuenta el encabezado, como en una planilla
+        return ((number, row) for number, row in enumerate(csv.DictReader(text), start=2))
+    return ((number, _parse_ndjson_line(line)) for number, line in enumerate(text, start=1) if line.strip())
+
+def _parse_ndjson_line(line):
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None  # se informa como fila inválida
+
+@products_bp.route("/prices/bulk", methods=["POST"])
+def bulk_update_prices():
+    """Cambio de precios por categoría y/o proveedor: {"category": "Bebidas", "percentage": 10}"""
+    data = request.get_json(silent=True) or {}
+    category = data.get("category")
+    provider_id = data.get("provider_id")
+    percentage = data.get("percentage")
+    amount = data.get("amount")
+
+    if category is None and provider_id is None:
+        return jsonify({"error": "Indicar category y/o provider_id"}), 400
+    if (percentage is None) == (amount is None):
+        return jsonify({"error": "Indicar percentage o amount (uno solo)"}), 400
+    change = percentage if percentage is not None else amount
+    if isinstance(change, bool) or not isinstance(change, (int, float)):
+        return jsonify({"error": "percentage / amount debe ser numérico"}), 400
+    if percentage is not None and percentage <= -100:
+        return jsonify({"error": "percentage debe ser mayor a -100"}), 400
+    if provider_id is not None and (isinstance(provider_id, bool) or not isinstance(provider_id, int)):
+        return jsonify({"error": "provider_id debe ser un número"}), 400
+
+    try:
+        updated = p_service.bulk_update_prices(percentage, amount, category, provider_id)
+    except Exception as e:
+        print(f"Error en la actualización masiva de precios: {e}")
+        return jsonify({"error": "Error al actualizar precios"}), 500
+    return jsonify({"updated": updated}), 200
+
 @products_bp.route("/upload-image", methods=["POST"])
 def upload_image():
     """Endpoint para subir imágenes de productos"""
@@ -56,21 +232,19 @@ def upload_image():
         if not allowed_file(file.filename):
             return jsonify({"error": "Tipo de archivo no permitido"}), 400
         
-        # Crear carpeta uploads si no existe
-        os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+        data = file.read(MAX_IMAGE_BYTES + 1)
+        if len(data) > MAX_IMAGE_BYTES:
+            return jsonify({"error": f"La imagen supera los {MAX_IMAGE_BYTES // (1024 * 1024)} MB"}), 413
         
-        # Generar nombre único
-        extension = file.filename.rsplit('.', 1)[1].lower()
-        unique_filename = f"{uuid.uuid4()}.{extension}"
-        filepath = os.path.join(UPLOAD_FOLDER, unique_filename)
+        # Se guarda por hash de contenido (una imagen repetida reutiliza la existente) y las
+        # variantes WebP/JPEG por tamaño se generan en segundo plano.
+        # "url" es la variante mediana; el resto de las URLs van en "variants".
+        try:
+            result = image_pipeline.store(data)
+        except InvalidImageError as e:
+            return jsonify({"error": str(e)}), 400
         
-        # Guardar archivo
-        file.save(filepath)
-        
-        # Retornar URL relativa
-        image_url = f"/uploads/{unique_filename}"
-        
-        return jsonify({"url": image_url}), 200
+        return jsonify(result), 200
         
     except Exception as e:
         return jsonify({"error": f"Error al subir imagen: {str(e)}"}), 500
@@ -123,11 +297,64 @@ def add_stock(product_id):
 
     return jsonify({"message": f"Se agregaron {quantity} unidades al stock"}), 200
 
+@products_bp.route("/stock/as-of", methods=["GET"])
+def get_stock_as_of():
+    """Inventario al cierre de una fecha, valuado al precio actual: ?date=YYYY-MM-DD&product_id="""
+    try:
+        day = datetime.strptime(request.args.get("date", ""), "%Y-%m-%d").date()
+        product_id = request.args.get("product_id")
+        product_id = int(product_id) if product_id else None
+        result = snapshot_service.get_stock_as_of(day, product_id)
+    except ValueError as e:
+        return jsonify({"error": f"Parámetros inválidos: {e}"}), 400
+
+    if result == "NOT_FOUND":
+        return jsonify({"error": "Producto no encontrado"}), 404
+    return jsonify(result), 200
+
+@products_bp.route("/reorder", methods=["GET"])
+def get_reorder_list():
+    """Productos con stock en o por debajo de su punto de pedido: ?limit=100"""
+    limit = request.args.get("limit", 100, type=int)
+    if limit < 1 or limit > MAX_REORDER_RESULTS:
+        return jsonify({"error": f"limit debe estar entre 1 y {MAX_REORDER_RESULTS}"}), 400
+    return jsonify(reorder_engine.get_reorder_list(limit)), 200
+
 @products_bp.route("/<int:product_id>/stock", methods=["GET"])
 def get_stock_movements(product_id):
-    result = s_service.get_movements(product_id)
+    """
+    Movimientos paginados: ?limit=&cursor=&from=&to= (la página siguiente va en X-Next-Cursor)
+    o totales por período: ?group=day|week&from=&to=
+    """
+    try:
+        date_from = request.args.get("from")
+        date_to = request.args.get("to")
+        date_from = datetime.strptime(date_from, "%Y-%m-%d").date() if date_from else None
+        date_to = datetime.strptime(date_to, "%Y-%m-%d").date() if date_to else None
+
+        group = request.args.get("group")
+        if group:
+            result = s_service.get_movement_totals(product_id, group, date_from, date_to)
+        else:
+            result = s_service.get_movements(
+                product_id,
+                limit=int(request.args.get("limit", 100)),
+                cursor=request.args.get("cursor"),
+                date_from=date_from,
+                date_to=date_to
+            )
+    except ValueError as e:
+        return jsonify({"error": f"Parámetros inválidos: {e}"}), 400
 
     if result == "NOT_FOUND":
         return jsonify({"error": "Producto no encontrado"}), 404
+    if group:
+        return jsonify(result), 200
 
-    return jsonify(result), 200
\ No newline at end of file
+    # El cuerpo sigue siendo la lista de movimientos; la paginación va en los headers
+    movements, next_cursor = result
+    response = jsonify(movements)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["Access-Control-Expose-Headers"] = "X-Next-Cursor"
+    return response, 200
\ No newline at end of file
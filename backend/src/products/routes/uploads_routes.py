@@ -0,0 +1,51 @@
+from flask import Blueprint, abort, redirect, send_from_directory
+from werkzeug.security import safe_join
+from src.minio_storage.minio_service import MinioClient
+from src.products.services.image_pipeline import ImagePipeline
+import os
+
+uploads_bp = Blueprint('uploads', __name__, url_prefix='/uploads')
+images = ImagePipeline()
+
+# Las URLs de /uploads nunca cambian de contenido: las imágenes nuevas van por hash
+# (<hash>/<variante>) y las viejas tienen un nombre aleatorio (uuid)
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+@uploads_bp.route('/<path:filename>', methods=['GET'])
+def uploaded_file(filename):
+    """
+    Imágenes subidas. Se sirven como inmutables: con ETag, Last-Modified y Range (206), y
+    con IMAGE_STORAGE=minio como redirección a una URL prefirmada de MinIO.
+    """
+    path = safe_join(images.upload_folder, filename)
+    if path is None:
+        abort(404)
+    if os.path.isfile(path):
+        # También con MinIO: las imágenes subidas antes de activarlo siguen en disco
+        return _immutable(send_from_directory(images.upload_folder, filename, max_age=IMMUTABLE_MAX_AGE))
+
+    digest, _, variant = filename.partition('/')
+    original = images.original_name(digest) if variant and not variant.startswith('original.') else None
+    if original:
+        # Variante que todavía se está generando: mientras tanto se sirve el original, sin cachear
+        if images.uses_minio:
+            url, _ = MinioClient.url_imagen(original)
+            response = redirect(url, 302)
+        else:
+            response = send_from_directory(images.upload_folder, original)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    if images.uses_minio:
+        # La redirección se cachea mientras la URL prefirmada no cambie
+        url, max_age = MinioClient.url_imagen(filename)
+        response = redirect(url, 302)
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+        return response
+    abort(404)
+
+def _immutable(response):
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
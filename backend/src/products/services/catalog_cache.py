@@ -0,0 +1,182 @@
+from src.products.models.product import Product
+from src.products.services.search_index import ProductSearchIndex
+from src.db import Database
+import os
+import threading
+import time
+
+
+class CatalogCache:
+    """
+    Catálogo de productos en memoria con índices por id, por código de barras y de
+    búsqueda por texto (ProductSearchIndex).
+    Las lecturas no toman locks: cada entrada es un Product que nunca se modifica (los
+    cambios reemplazan el objeto entero) y un get sobre un dict es atómico.
+    Las escrituras se serializan con un lock y suben version, que sirve para saber si el
+    catálogo cambió. Los servicios lo parchean después de cada COMMIT y un hilo lo recarga
+    completo cada tanto para absorber cambios hechos por fuera de la API. Los productos
+    parcheados mientras la recarga lee la base conservan su entrada parcheada: la fila
+    leída puede ser anterior al parche.
+    Singleton: un catálogo por proceso.
+    """
+    _instance = None
+    RETRY_SECONDS = 5
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super(CatalogCache, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, "initialized"):
+            self.db = Database()
+            self.reload_interval = float(os.getenv("CATALOG_RELOAD_SECONDS", 300))
+            self._by_id = {}
+            self._by_barcode = {}
+            self._search_index = ProductSearchIndex()
+            self._search_terms = {}
+            self._write_lock = threading.Lock()
+            self._reload_touched = None  # ids parcheados durante una recarga en curso
+            self._reloader = None
+            self.loaded = False
+            self.version = 0
+            self.initialized = True
+
+    # ------------ Lecturas (sin lock) ------------
+
+    def get(self, product_id):
+        return self._by_id.get(product_id)
+
+    def get_by_barcode(self, barcode):
+        return self._by_barcode.get(barcode)
+
+    def get_many(self, product_ids):
+        by_id = self._by_id
+        return {pid: by_id[pid] for pid in product_ids if pid in by_id}
+
+    def search(self, query, limit=20):
+        """Busca por nombre, código o categoría. Devuelve pares (Product, puntaje)."""
+        by_id = self._by_id
+        results = []
+        for product_id, score in self._search_index.search(query, limit):
+            product = by_id.get(product_id)
+            if product is not None:
+                results.append((product, score))
+        return results
+
+    def products(self):
+        return list(self._by_id.values())
+
+    def __len__(self):
+        return len(self._by_id)
+
+    # ------------ Escrituras ------------
+
+    def load(self):
+        """Carga el catálogo completo y reemplaza los índices de una sola vez."""
+        with self._write_lock:
+            self._reload_touched = set()
+        try:
+            cursor = self.db.execute("SELECT * FROM products")
+            products = [Product(**row) for row in cursor.fetchall()]
+            cursor.close()
+        except Exception:
+            with self._write_lock:
+                self._reload_touched = None
+            raise
+
+        by_id = {product.id: product for product in products}
+        by_barcode = {product.barcode: product for product in products if product.barcode}
+        # Armar el índice de búsqueda es lo más caro de la carga: sólo se rehace si cambió
+        # algún nombre, código o categoría (la recarga periódica casi siempre trae sólo stock)
+        search_terms = {product.id: (product.name, product.barcode, product.category) for product in products}
+        search_index = self._search_index
+        if search_terms != self._search_terms:
+            search_index = ProductSearchIndex(products)
+        with self._write_lock:
+            # Los parches llegados durante la lectura ganan sobre la fila leída (que puede
+            # ser anterior): se conserva la entrada actual, o su ausencia si se eliminó
+            for product_id in self._reload_touched:
+                loaded, current = by_id.pop(product_id, None), self._by_id.get(product_id)
+                if loaded is not None and loaded.barcode:
+                    by_barcode.pop(loaded.barcode, None)
+                if current is None:
+                    search_terms.pop(product_id, None)
+                    if search_index is not self._search_index:
+                        search_index.remove(product_id)
+                    continue
+                by_id[product_id] = current
+                if current.barcode:
+                    by_barcode[current.barcode] = current
+                search_terms[product_id] = (current.name, current.barcode, current.category)
+                if search_index is not self._search_index:
+                    search_index.add(current)
+            self._reload_touched = None
+            self._by_id, self._by_barcode = by_id, by_barcode
+            self._search_index, self._search_terms = search_index, search_terms
+            self.loaded = True
+            self.version += 1
+        return len(by_id)
+
+    def put(self, product):
+        """Agrega o reemplaza un producto (alta o modificación)."""
+        with self._write_lock:
+            previous = self._by_id.get(product.id)
+            self._by_id[product.id] = product
+            if previous is not None and previous.barcode != product.barcode:
+                self._by_barcode.pop(previous.barcode, None)
+            if product.barcode:
+                self._by_barcode[product.barcode] = product
+            self._search_index.add(product)
+            self._search_terms[product.id] = (product.name, product.barcode, product.category)
+            self._touch(product.id)
+            self.version += 1
+
+    def remove(self, product_id):
+        with self._write_lock:
+            previous = self._by_id.pop(product_id, None)
+            if previous is not None and previous.barcode:
+                self._by_barcode.pop(previous.barcode, None)
+            self._search_index.remove(product_id)
+            self._search_terms.pop(product_id, None)
+            self._touch(product_id)
+            self.version += 1
+
+    def apply_stock_deltas(self, deltas):
+        """Aplica {product_id: delta} de movimientos de stock ya confirmados."""
+        with self._write_lock:
+            for product_id, delta in deltas.items():
+                previous = self._by_id.get(product_id)
+                if previous is None:
+                    continue
+                product = Product(**{**previous.to_dict(), "stock": previous.stock + delta},
+                                  created_at=previous.created_at, updated_at=previous.updated_at)
+                self._by_id[product_id] = product
+                if product.barcode:
+                    self._by_barcode[product.barcode] = product
+                self._touch(product_id)
+            self.version += 1
+
+    def _touch(self, product_id):
+        # Con el lock de escritura tomado
+        if self._reload_touched is not None:
+            self._reload_touched.add(product_id)
+
+    # ------------ Recarga periódica ------------
+
+    def start_reloader(self):
+        if self._reloader is not None:
+            return
+        self._reloader = threading.Thread(target=self._reload_loop, name="catalog-cache", daemon=True)
+        self._reloader.start()
+
+    def _reload_loop(self):
+        while True:
+            # Si todavía no se pudo cargar (MySQL caído al arrancar), reintenta antes
+            time.sleep(self.reload_interval if self.loaded else self.RETRY_SECONDS)
+            try:
+                self.load()
+            except Exception as e:
+                print(f"Error recargando el catálogo de productos: {e}")
+            finally:
+                self.db.release_connection()
@@ -0,0 +1,234 @@
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import io
+import os
+import re
+import threading
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from src.minio_storage.minio_service import MinioClient
+
+
+_DIGEST = re.compile(r"^[0-9a-f]{32}$")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class InvalidImageError(ValueError):
+    """El archivo subido no es una imagen que Pillow pueda leer."""
+
+
+class LocalImageStorage:
+    """Imágenes en la carpeta de uploads, que Flask sirve en /uploads."""
+
+    def __init__(self, folder):
+        self.folder = folder
+
+    def path(self, name):
+        return os.path.join(self.folder, name)
+
+    def exists(self, name):
+        return os.path.exists(self.path(name))
+
+    def save(self, name, data, content_type):
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _write_atomic(path, data)
+
+
+class MinioImageStorage:
+    """
+    Imágenes en el bucket images de MinIO. /uploads redirige a URLs prefirmadas y los bytes
+    los entrega MinIO, sin pasar por los workers de la app.
+    """
+
+    def exists(self, name):
+        return MinioClient.existe_imagen(name)
+
+    def save(self, name, data, content_type):
+        # MinIO devuelve este Cache-Control al servir el objeto: el navegador no lo vuelve a pedir
+        MinioClient.guardar_imagen(name, data, content_type, cache_control=IMMUTABLE_CACHE_CONTROL)
+
+
+class ImagePipeline:
+    """
+    Guarda imágenes de productos por hash de contenido y genera sus variantes.
+    Cada imagen vive en <hash>/: el original tal cual se subió y, por cada tamaño de
+    VARIANTS, una versión WebP y otra JPEG. Subir dos veces la misma imagen reutiliza la
+    existente. Según IMAGE_STORAGE se guardan en la carpeta de uploads (local, por defecto)
+    o en el bucket images de MinIO (minio).
+    La decodificación y codificación de variantes corre en un pool de hilos; mientras no
+    se llame a start() (por ejemplo en tests) se hace en el mismo hilo.
+    Singleton: un pool por proceso.
+    """
+    _instance = None
+
+    VARIANTS = {"thumb": 160, "medium": 480, "large": 1024}  # lado mayor en píxeles
+    DEFAULT_VARIANT = "medium"
+    FORMATS = {
+        "webp": ("WEBP", {"quality": 80, "method": 4}),
+        "jpg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+    }
+    ORIGINAL_EXTENSIONS = {"JPEG": "jpg", "PNG": "png", "GIF": "gif", "WEBP": "webp"}
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super(ImagePipeline, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, "initialized"):
+            self.upload_folder = os.getenv("UPLOAD_FOLDER", "/app/uploads")
+            self.uses_minio = os.getenv("IMAGE_STORAGE", "local").lower() == "minio"
+            self.storage = MinioImageStorage() if self.uses_minio else LocalImageStorage(self.upload_folder)
+            self.executor = None
+            self._lock = threading.Lock()
+            self._pending = {}  # hash -> (Future de las variantes en proceso, nombre del original)
+            self.initialized = True
+
+    def start(self, workers=None):
+        if self.executor is not None:
+            return
+        workers = workers or int(os.getenv("IMAGE_WORKERS", 2))
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="images")
+        print(f"Pipeline de imágenes iniciado ({workers} workers)")
+
+    def shutdown(self, wait=True):
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait)
+            self.executor = None
+
+    # ------------ Alta ------------
+
+    def store(self, data):
+        """
+        Guarda la imagen y encola sus variantes. Devuelve las URLs de todas ellas; las que
+        todavía no se generaron se sirven con el original hasta que estén listas.
+        Lanza InvalidImageError si el archivo no es una imagen.
+        """
+        image_format = self._identify(data)
+        digest = hashlib.sha256(data).hexdigest()[:32]
+        original = f"original.{self.ORIGINAL_EXTENSIONS.get(image_format, 'img')}"
+
+        deduplicated = self.storage.exists(f"{digest}/{original}")
+        if not deduplicated:
+            self.storage.save(f"{digest}/{original}", data, Image.MIME.get(image_format, "application/octet-stream"))
+        if not (deduplicated and self.variants_ready(digest)):
+            self._submit(digest, data, f"{digest}/{original}")
+
+        return self.urls(digest, original, deduplicated)
+
+    def urls(self, digest, original, deduplicated=False):
+        base = f"/uploads/{digest}"
+        return {
+            "url": f"{base}/{self.DEFAULT_VARIANT}.webp",
+            "hash": digest,
+            "original": f"{base}/{original}",
+            "variants": {
+                name: {extension: f"{base}/{name}.{extension}" for extension in self.FORMATS}
+                for name in self.VARIANTS
+            },
+            "deduplicated": deduplicated
+        }
+
+    def variants_ready(self, digest):
+        # Las variantes se escriben en orden: si está la última, están todas
+        name, extension = self._variant_order()[-1]
+        return self.storage.exists(f"{digest}/{name}.{extension}")
+
+    def original_name(self, digest):
+        """
+        Nombre del original ("<hash>/original.<ext>") de una imagen cuyas variantes todavía no
+        están, o None. Con MinIO sólo se conocen las que procesa este proceso.
+        """
+        if not _DIGEST.match(digest):
+            return None
+        with self._lock:
+            pending = self._pending.get(digest)
+        if pending is not None:
+            return pending[1]
+        if self.uses_minio:
+            return None
+        for extension in set(self.ORIGINAL_EXTENSIONS.values()) | {"img"}:
+            name = f"{digest}/original.{extension}"
+            if self.storage.exists(name):
+                return name
+        return None
+
+    @staticmethod
+    def _identify(data):
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                image_format = image.format
+                image.verify()  # sólo lee la estructura, no decodifica los píxeles
+        except (UnidentifiedImageError, OSError, SyntaxError, Image.DecompressionBombError) as e:
+            raise InvalidImageError("El archivo no es una imagen válida") from e
+        return image_format
+
+    # ------------ Variantes ------------
+
+    def _variant_order(self):
+        """(nombre, extensión) de cada variante en el orden en que se generan."""
+        return [(name, extension)
+                for name, _ in sorted(self.VARIANTS.items(), key=lambda item: -item[1])
+                for extension in self.FORMATS]
+
+    def _submit(self, digest, data, original):
+        with self._lock:
+            if digest in self._pending:
+                return  # la misma imagen ya se está procesando
+            if self.executor is None:
+                future = None
+            else:
+                future = self.executor.submit(self._generate_variants, digest, data)
+                self._pending[digest] = (future, original)
+        if future is None:
+            self._generate_variants(digest, data)
+        else:
+            future.add_done_callback(lambda _: self._forget(digest))
+
+    def _forget(self, digest):
+        with self._lock:
+            self._pending.pop(digest, None)
+
+    def _generate_variants(self, digest, data):
+        try:
+            with Image.open(io.BytesIO(data)) as source:
+                source = ImageOps.exif_transpose(source)  # fotos de celular giradas
+                source.load()
+            # De mayor a menor: cada tamaño se reduce desde el anterior, que ya es más chico
+            image = source
+            for name, size in sorted(self.VARIANTS.items(), key=lambda item: -item[1]):
+                image = image.copy()
+                image.thumbnail((size, size), Image.Resampling.LANCZOS)  # nunca agranda
+                for extension, (image_format, options) in self.FORMATS.items():
+                    encoded = io.BytesIO()
+                    _for_format(image, image_format).save(encoded, image_format, **options)
+                    self.storage.save(f"{digest}/{name}.{extension}", encoded.getvalue(),
+                                      Image.MIME[image_format])
+        except Exception as e:
+            print(f"Error generando variantes de la imagen {digest}: {e}")
+
+
+def _for_format(image, image_format):
+    """JPEG no admite transparencia ni paleta: se aplana sobre blanco."""
+    if image_format == "JPEG":
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A"))
+            return background
+        if image.mode != "RGB":
+            return image.convert("RGB")
+        return image
+    if image.mode not in ("RGB", "RGBA"):
+        return image.convert("RGBA" if "A" in image.getbands() or image.mode == "P" else "RGB")
+    return image
+
+
+def _write_atomic(path, data):
+    """Escribe en un temporal y lo renombra: nunca se sirve un archivo a medio escribir."""
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(data)
+    os.replace(tmp_path, path)
@@ -1,38 +1,211 @@
 from src.products.models.product import Product
+from src.products.services.catalog_cache import CatalogCache
+from decimal import Decimal, InvalidOperation
+import itertools
 import mysql.connector
+import os
 from src.db import Database
-from src.db_lock import db_lock
 
 class ProductoService:
+    # Los cambios más nuevos que esto pueden tener transacciones todavía sin confirmar con
+    # un updated_at anterior: las versiones que se entregan quedan siempre así de atrás
+    SETTLE_SECONDS = float(os.getenv("CATALOG_SETTLE_SECONDS", 5))
+    IMPORT_CHUNK_SIZE = 1000
+    MAX_IMPORT_ERRORS = 1000  # errores por fila que se informan como máximo
+
+    # Alta o actualización por nombre o código de barras (ambos únicos). El stock de un
+    # producto existente no se toca: se mueve con los movimientos de stock.
+    UPSERT_QUERY = """
+        INSERT INTO products (name, barcode, price, stock, url_image, category)
+        VALUES (%s, %s, %s, %s, %s, %s) AS new
+        ON DUPLICATE KEY UPDATE
+            name = new.name,
+            barcode = COALESCE(new.barcode, products.barcode),
+            price = new.price,
+            url_image = COALESCE(new.url_image, products.url_image),
+            category = COALESCE(new.category, products.category)
+    """
+
     def __init__(self):
         self.db = Database()
+        self.catalog = CatalogCache()
 
     def get_all_products(self):
-        with db_lock:
-            query = "SELECT * FROM products"
-            try:
-                cursor = self.db.conn.cursor(dictionary=True, buffered=True)
-                cursor.execute(query)
-                results = cursor.fetchall()
-                cursor.close()
-                return [Product(**row) for row in results]
-            except Exception as e:
-                print(f"Error getting products: {e}")
-                return []
+        query = "SELECT * FROM products"
+        try:
+            cursor = self.db.execute(query)
+            results = cursor.fetchall()
+            cursor.close()
+            return [Product(**row) for row in results]
+        except Exception as e:
+            print(f"Error getting products: {e}")
+            return []
 
     def get_product_by_id(self, product_id):
-        with db_lock:
-            query = "SELECT * FROM products WHERE id = %s"
-            try:
-                cursor = self.db.conn.cursor(dictionary=True, buffered=True)
-                cursor.execute(query, (product_id,))
-                row = cursor.fetchone()
-                cursor.close()
-                if row:
-                    return Product(**row)
-                return None
-            except Exception:
-                return None
+        product = self.catalog.get(product_id)
+        if product is not None:
+            return product
+        try:
+            product = self._fetch_product(product_id)
+            if product is not None and self.catalog.loaded:
+                self.catalog.put(product)  # alta hecha por fuera de este proceso
+            return product
+        except Exception:
+            return None
+
+    def _fetch_product(self, product_id):
+        """Lee el producto de la base, sin pasar por el catálogo en memoria."""
+        query = "SELECT * FROM products WHERE id = %s"
+        cursor = self.db.execute(query, (product_id,))
+        row = cursor.fetchone()
+        cursor.close()
+        return Product(**row) if row else None
+
+    def get_catalog_version(self):
+        """
+        Versión del catálogo completo para GET condicionales: cantidad de productos y último
+        cambio (alta, modificación o baja) en microsegundos desde epoch.
+        settled es False si ese cambio tiene menos de SETTLE_SECONDS: todavía puede
+        confirmarse otra transacción con una versión anterior, así que no conviene cachear.
+        """
+        query = """
+            SELECT (SELECT COUNT(*) FROM products) AS total,
+                   (SELECT UNIX_TIMESTAMP(MAX(updated_at)) FROM products) AS updated_at,
+                   (SELECT UNIX_TIMESTAMP(MAX(deleted_at)) FROM product_deletions) AS deleted_at,
+                   UNIX_TIMESTAMP(NOW(6)) AS now
+        """
+        try:
+            cursor = self.db.execute(query)
+            row = cursor.fetchone()
+            cursor.close()
+        except Exception as e:
+            print(f"Error obteniendo la versión del catálogo: {e}")
+            return None
+        version = max(_to_micros(row["updated_at"]), _to_micros(row["deleted_at"]))
+        return {
+            "total": row["total"],
+            "version": version,
+            "settled": version <= _to_micros(row["now"]) - self.SETTLE_SECONDS * 1_000_000
+        }
+
+    def get_changes(self, since=0):
+        """
+        Productos creados o modificados (incluido el stock) y productos borrados después de
+        la versión since (microsegundos; 0 trae todo el catálogo).
+        Devuelve (productos, ids borrados, versión para la próxima llamada). La próxima
+        versión queda SETTLE_SECONDS atrás, así un cambio confirmado tarde se vuelve a
+        entregar en lugar de perderse; el cliente aplica los cambios por id y repetirlos
+        no tiene efecto.
+        """
+        since_timestamp = Decimal(since).scaleb(-6)
+        cursor = self.db.execute("SELECT UNIX_TIMESTAMP(NOW(6)) AS now")
+        now = _to_micros(cursor.fetchone()["now"])
+        cursor.close()
+
+        cursor = self.db.execute(
+            "SELECT * FROM products WHERE updated_at > FROM_UNIXTIME(%s) ORDER BY updated_at, id",
+            (since_timestamp,))
+        products = [Product(**row) for row in cursor.fetchall()]
+        cursor.close()
+
+        deleted = []
+        if since > 0:
+            cursor = self.db.execute(
+                "SELECT product_id FROM product_deletions WHERE deleted_at > FROM_UNIXTIME(%s) ORDER BY deleted_at",
+                (since_timestamp,))
+            deleted = [row["product_id"] for row in cursor.fetchall()]
+            cursor.close()
+
+        next_version = max(since, now - int(self.SETTLE_SECONDS * 1_000_000))
+        return products, deleted, next_version
+
+    def search_products(self, query, limit=20):
+        """
+        Búsqueda por nombre, código de barras o categoría, ordenada por relevancia.
+        Devuelve pares (Product, puntaje). Usa el índice del catálogo en memoria; si el
+        catálogo todavía no se cargó, busca con LIKE en la base (sin puntaje).
+        """
+        if self.catalog.loaded:
+            return self.catalog.search(query, limit)
+
+        pattern = f"%{query.strip()}%"
+        sql = """
+            SELECT * FROM products
+            WHERE name LIKE %s OR barcode = %s OR category LIKE %s
+            ORDER BY CHAR_LENGTH(name), name
+            LIMIT %s
+        """
+        try:
+            cursor = self.db.execute(sql, (pattern, query.strip(), pattern, limit))
+            results = cursor.fetchall()
+            cursor.close()
+            return [(Product(**row), None) for row in results]
+        except Exception as e:
+            print(f"Error buscando productos: {e}")
+            return []
+
+    def get_product_by_barcode(self, barcode):
+        product = self.catalog.get_by_barcode(barcode)
+        if product is not None:
+            return product
+        return self.get_products_by_barcodes([barcode]).get(barcode)
+
+    def get_products_by_barcodes(self, barcodes):
+        """
+        Resuelve varios códigos de barras. Devuelve un dict {barcode: Product}.
+        Se buscan en el índice en memoria y los que falten en una sola consulta sobre
+        la columna indexada.
+        """
+        barcodes = list(dict.fromkeys(barcodes))
+        products = {}
+        missing = []
+        for barcode in barcodes:
+            product = self.catalog.get_by_barcode(barcode)
+            if product is not None:
+                products[barcode] = product
+            else:
+                missing.append(barcode)
+        if not missing:
+            return products
+
+        placeholders = ", ".join(["%s"] * len(missing))
+        query = f"SELECT * FROM products WHERE barcode IN ({placeholders})"
+        try:
+            cursor = self.db.execute(query, tuple(missing))
+            results = cursor.fetchall()
+            cursor.close()
+        except Exception as e:
+            print(f"Error buscando productos por código de barras: {e}")
+            return products
+        for row in results:
+            product = Product(**row)
+            products[product.barcode] = product
+            if self.catalog.loaded:
+                self.catalog.put(product)  # alta hecha por fuera de este proceso
+        return products
+
+    def get_products_by_ids(self, product_ids, use_cache=True):
+        """
+        Trae varios productos. Devuelve un dict {id: Product}.
+        Los que están en el catálogo en memoria no van a la base; el resto se busca en una
+        sola consulta. use_cache=False lee todo de la base (por ejemplo, stock al día).
+        """
+        product_ids = list(set(product_ids))
+        if not product_ids:
+            return {}
+        products = self.catalog.get_many(product_ids) if use_cache else {}
+        missing = [pid for pid in product_ids if pid not in products]
+        if not missing:
+            return products
+
+        placeholders = ", ".join(["%s"] * len(missing))
+        query = f"SELECT * FROM products WHERE id IN ({placeholders})"
+        cursor = self.db.execute(query, tuple(missing))
+        results = cursor.fetchall()
+        cursor.close()
+        for row in results:
+            products[row["id"]] = Product(**row)
+        return products
     
     def create_product(self, data):
         query = """
@@ -52,7 +225,10 @@ class ProductoService:
             product_id = cursor.lastrowid
             cursor.close()  
             if product_id: 
-                return self.get_product_by_id(product_id) 
+                product = self._fetch_product(product_id)
+                if product is not None:
+                    self.db.on_commit(lambda: self.catalog.put(product))
+                return product
             return None
         except mysql.connector.IntegrityError as e:
             if e.errno == 1062:
@@ -60,6 +236,139 @@ class ProductoService:
             return {"error": "DB_ERROR"}
         
 
+    def import_products(self, rows):
+        """
+        Alta o actualización masiva (listas de precios de proveedores).
+        rows es un iterable de (número de fila, dict); se consume de a bloques, así un archivo
+        grande no se carga entero en memoria. Cada bloque va en un INSERT ... ON DUPLICATE KEY
+        UPDATE multi-fila y su propia transacción; si la base rechaza el bloque, se reintenta
+        fila por fila para informar cuáles fallaron.
+        Devuelve {"processed", "upserted", "failed", "errors": [{"row", "error"}]}.
+        """
+        summary = {"processed": 0, "upserted": 0, "failed": 0, "errors": []}
+        rows = iter(rows)
+        while True:
+            batch = list(itertools.islice(rows, self.IMPORT_CHUNK_SIZE))
+            if not batch:
+                break
+            chunk = []
+            for row_number, data in batch:
+                summary["processed"] += 1
+                try:
+                    chunk.append((row_number, self._import_params(data)))
+                except ValueError as e:
+                    self._import_error(summary, row_number, str(e))
+            if chunk:
+                self._import_chunk(chunk, summary)
+
+        if summary["upserted"]:
+            self._reload_catalog()
+        return summary
+
+    def _import_chunk(self, chunk, summary):
+        try:
+            with self.db.transaction() as connection:
+                cursor = connection.cursor()
+                cursor.executemany(self.UPSERT_QUERY, [params for _, params in chunk])
+                cursor.close()
+            summary["upserted"] += len(chunk)
+            return
+        except mysql.connector.Error as e:
+            print(f"Bloque de importación rechazado, se reintenta fila por fila: {e}")
+
+        # Fila por fila, cada una en su savepoint: sólo se pierden las que fallan
+        with self.db.transaction() as connection:
+            cursor = connection.cursor()
+            for row_number, params in chunk:
+                try:
+                    with self.db.transaction():
+                        cursor.execute(self.UPSERT_QUERY, params)
+                    summary["upserted"] += 1
+                except mysql.connector.Error as e:
+                    self._import_error(summary, row_number, e.msg)
+            cursor.close()
+
+    def _import_error(self, summary, row_number, message):
+        summary["failed"] += 1
+        if len(summary["errors"]) < self.MAX_IMPORT_ERRORS:
+            summary["errors"].append({"row": row_number, "error": message})
+
+    @staticmethod
+    def _import_params(data):
+        """Valida y normaliza una fila (CSV trae todo como texto). Lanza ValueError."""
+        if not isinstance(data, dict):
+            raise ValueError("La fila no es un objeto")
+
+        def text(field, max_length):
+            value = data.get(field)
+            value = str(value).strip() if value is not None else ""
+            if len(value) > max_length:
+                raise ValueError(f"{field} supera los {max_length} caracteres")
+            return value or None
+
+        name = text("name", 255)
+        if not name:
+            raise ValueError("Falta name")
+        try:
+            price = Decimal(str(data.get("price")).strip().replace(",", "."))
+        except InvalidOperation:
+            raise ValueError(f"price inválido: {data.get('price')!r}")
+        if not price.is_finite() or price < 0:
+            raise ValueError(f"price inválido: {data.get('price')!r}")
+        stock = data.get("stock")
+        try:
+            stock = int(str(stock).strip()) if stock not in (None, "") else 0
+        except ValueError:
+            raise ValueError(f"stock inválido: {stock!r}")
+        if stock < 0:
+            raise ValueError(f"stock inválido: {stock!r}")
+
+        return (name, text("barcode", 100), price.quantize(Decimal("0.01")), stock,
+                text("url_image", 255), text("category", 100))
+
+    def bulk_update_prices(self, percentage=None, amount=None, category=None, provider_id=None):
+        """
+        Cambia el precio de todos los productos de una categoría y/o de un proveedor en una
+        sola sentencia: percentage (10 = +10 %) o amount (suma fija, puede ser negativa).
+        Los precios nunca quedan negativos. Devuelve la cantidad de productos actualizados.
+        """
+        if percentage is not None:
+            new_price = "ROUND(p.price * (1 + %s / 100), 2)"
+            change = Decimal(str(percentage))
+        else:
+            new_price = "p.price + %s"
+            change = Decimal(str(amount))
+
+        joins, conditions, params = "", [], [change]
+        if provider_id is not None:
+            joins = "JOIN product_provider pp ON pp.product_id = p.id"
+            conditions.append("pp.provider_id = %s")
+            params.append(provider_id)
+        if category is not None:
+            conditions.append("p.category = %s")
+            params.append(category)
+
+        query = f"""
+            UPDATE products p {joins}
+            SET p.price = GREATEST(0, {new_price})
+            WHERE {" AND ".join(conditions)}
+        """
+        cursor = self.db.execute(query, tuple(params))
+        updated = cursor.rowcount
+        cursor.close()
+        if updated:
+            self._reload_catalog()
+        return updated
+
+    def _reload_catalog(self):
+        # Tras una carga masiva es más barato recargar el catálogo en memoria una vez que
+        # parchearlo producto por producto (el índice de búsqueda sólo se rehace si cambió
+        # algún nombre, código o categoría)
+        try:
+            self.catalog.load()
+        except Exception as e:
+            print(f"Error recargando el catálogo de productos: {e}")
+
     def update_product(self, product_id, data):
         product = self.get_product_by_id(product_id) 
         if not product:
@@ -87,7 +396,10 @@ class ProductoService:
         try:
             cursor = self.db.execute(query, params)
             cursor.close()
-            return self.get_product_by_id(product_id)
+            product = self._fetch_product(product_id)
+            if product is not None:
+                self.db.on_commit(lambda: self.catalog.put(product))
+            return product
         except mysql.connector.IntegrityError as e:
             if e.errno == 1062:
                 return "DUPLICATE"
@@ -96,13 +408,29 @@ class ProductoService:
     def delete_product(self, product_id):
         query = "DELETE FROM products WHERE id = %s"
         try:
-            cursor = self.db.execute(query, (product_id,))
-            rowcount = cursor.rowcount
-            cursor.close() 
+            with self.db.transaction():
+                cursor = self.db.execute(query, (product_id,))
+                rowcount = cursor.rowcount
+                cursor.close() 
+                if rowcount > 0:
+                    # Marca de borrado para que las cajas la reciban en /changes
+                    cursor = self.db.execute(
+                        "INSERT INTO product_deletions (product_id) VALUES (%s) "
+                        "ON DUPLICATE KEY UPDATE deleted_at = CURRENT_TIMESTAMP(6)",
+                        (product_id,))
+                    cursor.close()
             if rowcount > 0:
+                self.db.on_commit(lambda: self.catalog.remove(product_id))
                 return "DELETED"
             else:
                 return "NOT_FOUND"
         except Exception as e:
             print(f"{e}")
-            return "ERROR"
\ No newline at end of file
+            return "ERROR"
+
+
+def _to_micros(unix_timestamp):
+    """UNIX_TIMESTAMP(...) de MySQL (Decimal con 6 decimales o NULL) a microsegundos enteros."""
+    if unix_timestamp is None:
+        return 0
+    return int(Decimal(unix_timestamp).scaleb(6))
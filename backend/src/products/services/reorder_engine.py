@@ -0,0 +1,228 @@
+from datetime import timedelta
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+from src.db import Database
+
+
+class ReorderEngine:
+    """
+    Punto de pedido de cada producto según su velocidad de venta.
+    Arma una matriz productos × días con las unidades vendidas en los últimos WINDOW_DAYS
+    días (sale_product) y calcula con NumPy, para todos los productos a la vez, la venta
+    diaria promedio, su desvío, los días de cobertura del stock y el punto de pedido:
+        punto de pedido = velocidad × LEAD_TIME_DAYS + Z × desvío × √LEAD_TIME_DAYS
+    Los resultados quedan en product_reorder_stats. needs_reorder (stock <= punto de pedido
+    de un producto que se vende, o sin stock) se cuenta por índice, sin recorrer products.
+    Un producto agotado deja de venderse y su velocidad cae a 0: se marca igual, para que
+    un faltante no se oculte solo.
+    Cada movimiento de stock confirmado marca el producto y un hilo recalcula sólo los
+    marcados cada REFRESH_SECONDS; cada FULL_REFRESH_SECONDS recalcula el catálogo entero
+    para que la ventana avance también en los productos que dejaron de venderse.
+    Singleton: un hilo por proceso.
+    """
+    _instance = None
+    LOCK_NAME = "product_reorder_stats"
+    CHUNK_SIZE = 1000
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super(ReorderEngine, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, "initialized"):
+            self.db = Database()
+            self.window_days = int(os.getenv("REORDER_WINDOW_DAYS", 28))
+            self.lead_time_days = float(os.getenv("REORDER_LEAD_TIME_DAYS", 3))
+            self.service_z = float(os.getenv("REORDER_SERVICE_Z", 1.65))  # ~95% de los días sin faltante
+            self.refresh_seconds = float(os.getenv("REORDER_REFRESH_SECONDS", 60))
+            self.full_refresh_seconds = float(os.getenv("REORDER_FULL_REFRESH_SECONDS", 3600))
+            self._dirty = set()
+            self._lock = threading.Lock()
+            self._worker = None
+            self.initialized = True
+
+    # ------------ Actualización ------------
+
+    def mark_dirty(self, product_ids):
+        """Productos cuyo stock cambió: se recalculan en la próxima pasada del hilo."""
+        with self._lock:
+            self._dirty.update(product_ids)
+
+    def start(self):
+        if self._worker is not None:
+            return
+        self._worker = threading.Thread(target=self._loop, name="reorder-engine", daemon=True)
+        self._worker.start()
+
+    def _loop(self):
+        last_full = None
+        while True:
+            try:
+                if last_full is None or time.monotonic() - last_full >= self.full_refresh_seconds:
+                    self.refresh_all()
+                    last_full = time.monotonic()
+                else:
+                    self.refresh_dirty()
+            except Exception as e:
+                print(f"Error recalculando puntos de pedido: {e}")
+            finally:
+                self.db.release_connection()
+            time.sleep(self.refresh_seconds)
+
+    def refresh_all(self):
+        """Recalcula todo el catálogo (si otro proceso no lo está haciendo)."""
+        cursor = self.db.execute("SELECT GET_LOCK(%s, 0) AS locked", (self.LOCK_NAME,))
+        locked = cursor.fetchone()["locked"] == 1
+        cursor.close()
+        if not locked:
+            return 0
+        with self._lock:
+            self._dirty.clear()  # la pasada completa los incluye
+        try:
+            return self.refresh()
+        finally:
+            cursor = self.db.execute("SELECT RELEASE_LOCK(%s)", (self.LOCK_NAME,))
+            cursor.close()
+
+    def refresh_dirty(self):
+        with self._lock:
+            product_ids, self._dirty = sorted(self._dirty), set()
+        refreshed = 0
+        try:
+            for start in range(0, len(product_ids), self.CHUNK_SIZE):
+                refreshed += self.refresh(product_ids[start:start + self.CHUNK_SIZE])
+        except Exception:
+            self.mark_dirty(product_ids)  # se reintentan en la próxima pasada
+            raise
+        return refreshed
+
+    def refresh(self, product_ids=None):
+        """Recalcula y guarda las estadísticas de product_ids (todo el catálogo si es None)."""
+        if product_ids is not None and not product_ids:
+            return 0
+        filter_products = ""
+        filter_sales = ""
+        params = []
+        if product_ids is not None:
+            placeholders = ", ".join(["%s"] * len(product_ids))
+            filter_products = f"WHERE id IN ({placeholders})"
+            filter_sales = f"AND sp.product_id IN ({placeholders})"
+            params = list(product_ids)
+
+        cursor = self.db.execute(f"SELECT id, stock FROM products {filter_products}", tuple(params))
+        products = cursor.fetchall()
+        cursor.close()
+        if not products:
+            return 0
+
+        cursor = self.db.execute("SELECT CURDATE() AS today")
+        today = cursor.fetchone()["today"]
+        cursor.close()
+        # Unidades por producto y por día de antigüedad (0 = hoy) dentro de la ventana
+        cursor = self.db.execute(f"""
+        SELECT sp.product_id, DATEDIFF(%s, s.sale_date) AS age, SUM(sp.quantity) AS units
+        FROM sales s
+        JOIN sale_product sp ON sp.sale_id = s.id
+        WHERE s.sale_date >= %s {filter_sales}
+        GROUP BY sp.product_id, age
+        """, (today, today - timedelta(days=self.window_days - 1), *params))
+        sales = cursor.fetchall()
+        cursor.close()
+
+        ids = np.fromiter((row["id"] for row in products), dtype=np.int64, count=len(products))
+        stats = self.compute(
+            ids,
+            np.fromiter((row["stock"] for row in products), dtype=np.float64, count=len(products)),
+            np.fromiter((row["product_id"] for row in sales), dtype=np.int64, count=len(sales)),
+            np.fromiter((row["age"] for row in sales), dtype=np.int64, count=len(sales)),
+            np.fromiter((row["units"] for row in sales), dtype=np.float64, count=len(sales))
+        )
+        self._save(ids, stats)
+        return len(products)
+
+    def compute(self, ids, stock, sale_ids, sale_ages, sale_units):
+        """
+        Cálculo vectorizado. ids y stock describen los productos; sale_* son las ventas
+        agrupadas por (producto, antigüedad en días). Devuelve un dict de arrays alineados
+        con ids: velocity, stddev, days_of_cover (0 sin stock, NaN si no se vende),
+        reorder_point y needs_reorder.
+        """
+        # Fila de la matriz de cada venta (búsqueda binaria sobre los ids ordenados)
+        order = np.argsort(ids)
+        positions = np.searchsorted(ids, sale_ids, sorter=order)
+        rows = order[np.minimum(positions, len(ids) - 1)]
+        in_window = (ids[rows] == sale_ids) & (sale_ages >= 0) & (sale_ages < self.window_days)
+        units = np.zeros((len(ids), self.window_days))
+        np.add.at(units, (rows[in_window], sale_ages[in_window]), sale_units[in_window])
+
+        velocity = units.mean(axis=1)
+        stddev = units.std(axis=1)
+        reorder_point = np.ceil(velocity * self.lead_time_days
+                                + self.service_z * stddev * math.sqrt(self.lead_time_days))
+        selling = velocity > 0
+        out_of_stock = stock <= 0
+        days_of_cover = np.full(len(ids), np.nan)
+        np.divide(np.maximum(stock, 0), velocity, out=days_of_cover, where=selling)
+        days_of_cover[out_of_stock] = 0  # primeros en la lista de reposición
+        return {
+            "velocity": velocity,
+            "stddev": stddev,
+            "days_of_cover": days_of_cover,
+            "reorder_point": reorder_point.astype(np.int64),
+            "needs_reorder": out_of_stock | (selling & (stock <= reorder_point))
+        }
+
+    def _save(self, ids, stats):
+        rows = list(zip(
+            ids.tolist(),
+            np.round(stats["velocity"], 3).tolist(),
+            np.round(stats["stddev"], 3).tolist(),
+            [None if math.isnan(days) else round(days, 1) for days in stats["days_of_cover"].tolist()],
+            stats["reorder_point"].tolist(),
+            stats["needs_reorder"].astype(int).tolist()
+        ))
+        query = """
+        INSERT INTO product_reorder_stats
+            (product_id, daily_velocity, velocity_stddev, days_of_cover, reorder_point, needs_reorder)
+        VALUES (%s, %s, %s, %s, %s, %s) AS new
+        ON DUPLICATE KEY UPDATE
+            daily_velocity = new.daily_velocity,
+            velocity_stddev = new.velocity_stddev,
+            days_of_cover = new.days_of_cover,
+            reorder_point = new.reorder_point,
+            needs_reorder = new.needs_reorder
+        """
+        with self.db.transaction() as connection:
+            cursor = connection.cursor()
+            for start in range(0, len(rows), self.CHUNK_SIZE):
+                cursor.executemany(query, rows[start:start + self.CHUNK_SIZE])
+            cursor.close()
+
+    # ------------ Consultas ------------
+
+    def count_needs_reorder(self):
+        cursor = self.db.execute("SELECT COUNT(*) AS count FROM product_reorder_stats WHERE needs_reorder = 1")
+        row = cursor.fetchone()
+        cursor.close()
+        return row["count"] if row else 0
+
+    def get_reorder_list(self, limit=100):
+        """Productos a reponer, primero los que antes se quedan sin stock."""
+        cursor = self.db.execute("""
+        SELECT p.id AS product_id, p.name, p.stock, r.daily_velocity, r.velocity_stddev,
+               r.days_of_cover, r.reorder_point, r.updated_at
+        FROM product_reorder_stats r
+        JOIN products p ON p.id = r.product_id
+        WHERE r.needs_reorder = 1
+        ORDER BY r.days_of_cover, p.id
+        LIMIT %s
+        """, (limit,))
+        rows = cursor.fetchall()
+        cursor.close()
+        return rows
@@ -0,0 +1,360 @@
+from collections import Counter
+import bisect
+import heapq
+import itertools
+import math
+import re
+import unicodedata
+
+_NOT_ALPHANUMERIC = re.compile(r"[^a-z0-9]+")
+_EMPTY = frozenset()
+
+
+def normalize(text):
+    """Minúsculas, sin acentos ni signos: "Jamón Crudo" -> "jamon crudo"."""
+    if not text:
+        return ""
+    text = str(text).lower()
+    if not text.isascii():
+        # NFKD separa la letra de su acento ("ó" -> "o" + tilde); el acento no es ASCII y se descarta
+        text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    return _NOT_ALPHANUMERIC.sub(" ", text).strip()
+
+
+def trigrams(word):
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+
+def deletions(word):
+    """La palabra y las que salen de sacarle una letra: dos palabras a un error comparten alguna."""
+    return {word} | {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+def one_typo_apart(a, b):
+    """True si b sale de a con un solo error: una letra cambiada, de más, de menos o dos invertidas."""
+    if abs(len(a) - len(b)) > 1 or a == b:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) < len(b):
+        return a[i:] == b[i + 1:]
+    return a[i + 1:] == b[i + 1:] or (a[i + 2:] == b[i + 2:] and a[i:i + 2] == b[i + 1:i + 2] + b[i:i + 1])
+
+
+class _Document:
+    """Campos normalizados de un producto, tal como se indexan."""
+    __slots__ = ("name_words", "category_words", "barcode", "sort_key")
+
+    def __init__(self, product):
+        name = normalize(product.name)
+        self.name_words = frozenset(name.split())
+        self.category_words = frozenset(normalize(product.category).split())
+        self.barcode = normalize(product.barcode).replace(" ", "")
+        self.sort_key = (len(name), name, product.id)
+
+    def same_terms(self, other):
+        return (self.name_words, self.category_words, self.barcode, self.sort_key) == \
+            (other.name_words, other.category_words, other.barcode, other.sort_key)
+
+
+class _TermMatch:
+    """Cómo coincide un término de la consulta: palabras con su puntaje y listas de productos."""
+    __slots__ = ("term", "short", "words", "barcode_prefix", "postings", "size", "best")
+
+    def __init__(self, term, short):
+        self.term = term
+        self.short = short
+        self.words = {}  # palabra del vocabulario -> puntaje (términos de 3 o más letras)
+        self.barcode_prefix = False
+        self.postings = []  # listas de productos ordenadas por sort_key
+        self.size = 0
+        self.best = 0.0  # mayor puntaje que puede aportar el término
+
+
+class ProductSearchIndex:
+    """
+    Índice de búsqueda de productos por nombre, código de barras y categoría.
+    Trabaja en dos niveles: los trigramas apuntan a palabras del vocabulario (mucho más chico
+    que el catálogo) y cada palabra apunta a los productos que la contienen. Un término se
+    resuelve primero contra el vocabulario (exacto, prefijo, parte de una palabra o, si no hay,
+    parecido por trigramas o a un solo error) y recién después se pasa a productos.
+    Los términos de 1 o 2 letras usan listas de productos por prefijo. Los términos de 3 o más
+    caracteres con algún dígito también se buscan como comienzo de código de barras, sobre
+    los códigos ordenados (hasta MAX_BARCODE_PREFIX).
+    Todas las listas de productos están ordenadas por sort_key (largo del nombre, nombre, id),
+    que es el orden de los resultados a igual puntaje. La búsqueda recorre en ese orden las
+    listas del término con menos productos, puntúa cada producto contra el resto de los
+    términos y corta apenas junta limit resultados con el puntaje máximo posible; si no los
+    encuentra, revisa a lo sumo MAX_CANDIDATES productos.
+    Las listas son inmutables (frozenset / tuple) y se reemplazan al escribir, así las
+    búsquedas no necesitan lock. Las escrituras las serializa CatalogCache.
+    """
+
+    EXACT, PREFIX, INFIX, BARCODE_PREFIX, CATEGORY = 30.0, 25.0, 15.0, 12.0, 8.0
+    MIN_SIMILARITY = 0.6  # fracción de trigramas del término que debe tener una palabra "parecida"
+    TYPO_SIMILARITY = 0.5  # similitud mínima de una palabra a un solo error del término
+    MAX_CANDIDATES = 2000  # productos que se revisan como máximo por consulta
+    MAX_BARCODE_PREFIX = 1000  # códigos que se revisan por comienzo de código de barras
+
+    def __init__(self, products=()):
+        docs = {product.id: _Document(product) for product in products}
+        name_words = {}
+        category_words = {}
+        by_prefix = {}
+        # Recorrer en orden deja cada lista ya ordenada por sort_key
+        for product_id, doc in sorted(docs.items(), key=lambda item: item[1].sort_key):
+            for word in doc.name_words:
+                name_words.setdefault(word, []).append(product_id)
+            for word in doc.category_words:
+                category_words.setdefault(word, []).append(product_id)
+            for prefix in _prefixes(doc):
+                by_prefix.setdefault(prefix, []).append(product_id)
+
+        by_trigram = {}
+        by_deletion = {}
+        for word in name_words.keys() | category_words.keys():
+            for gram in trigrams(word):
+                by_trigram.setdefault(gram, set()).add(word)
+            if len(word) >= 3:
+                for key in deletions(word):
+                    by_deletion.setdefault(key, set()).add(word)
+
+        self._docs = docs
+        self._name_words = {word: tuple(ids) for word, ids in name_words.items()}
+        self._category_words = {word: tuple(ids) for word, ids in category_words.items()}
+        self._barcodes = {doc.barcode: product_id for product_id, doc in docs.items() if doc.barcode}
+        self._sorted_barcodes = tuple(sorted(self._barcodes))
+        self._by_trigram = {gram: frozenset(words) for gram, words in by_trigram.items()}
+        self._by_deletion = {key: frozenset(words) for key, words in by_deletion.items()}
+        self._by_prefix = {prefix: tuple(ids) for prefix, ids in by_prefix.items()}
+
+    def __len__(self):
+        return len(self._docs)
+
+    # ------------ Escrituras ------------
+
+    def add(self, product):
+        """Indexa un producto nuevo o reindexa uno modificado."""
+        doc = _Document(product)
+        previous = self._docs.get(product.id)
+        if previous is not None:
+            if previous.same_terms(doc):
+                return
+            self.remove(product.id)
+
+        self._docs[product.id] = doc
+        for words, doc_words in ((self._name_words, doc.name_words),
+                                 (self._category_words, doc.category_words)):
+            for word in doc_words:
+                if word not in self._name_words and word not in self._category_words:
+                    for gram in trigrams(word):
+                        self._by_trigram[gram] = self._by_trigram.get(gram, _EMPTY) | {word}
+                    if len(word) >= 3:
+                        for key in deletions(word):
+                            self._by_deletion[key] = self._by_deletion.get(key, _EMPTY) | {word}
+                words[word] = self._insert_sorted(words.get(word, ()), product.id)
+        if doc.barcode:
+            if doc.barcode not in self._barcodes:
+                barcodes = self._sorted_barcodes
+                position = bisect.bisect_left(barcodes, doc.barcode)
+                self._sorted_barcodes = barcodes[:position] + (doc.barcode,) + barcodes[position:]
+            self._barcodes[doc.barcode] = product.id
+        for prefix in _prefixes(doc):
+            self._by_prefix[prefix] = self._insert_sorted(self._by_prefix.get(prefix, ()), product.id)
+
+    def _insert_sorted(self, postings, product_id):
+        docs = self._docs
+        position = bisect.bisect(postings, docs[product_id].sort_key, key=lambda other: docs[other].sort_key)
+        return postings[:position] + (product_id,) + postings[position:]
+
+    def remove(self, product_id):
+        # Las palabras que quedan sin productos siguen en el vocabulario hasta la próxima
+        # recarga completa: no devuelven resultados y no vale la pena rehacer los trigramas
+        doc = self._docs.pop(product_id, None)
+        if doc is None:
+            return
+        for words, doc_words in ((self._name_words, doc.name_words),
+                                 (self._category_words, doc.category_words)):
+            for word in doc_words:
+                words[word] = tuple(other for other in words.get(word, ()) if other != product_id)
+        if doc.barcode and self._barcodes.get(doc.barcode) == product_id:
+            del self._barcodes[doc.barcode]
+            barcodes = self._sorted_barcodes
+            position = bisect.bisect_left(barcodes, doc.barcode)
+            self._sorted_barcodes = barcodes[:position] + barcodes[position + 1:]
+        for prefix in _prefixes(doc):
+            self._by_prefix[prefix] = tuple(
+                other for other in self._by_prefix.get(prefix, ()) if other != product_id)
+
+    # ------------ Búsqueda ------------
+
+    def search(self, query, limit=20):
+        """
+        Devuelve hasta limit pares (product_id, puntaje), de mayor a menor puntaje y, a igual
+        puntaje, los de nombre más corto primero. Todas las palabras de la consulta tienen que
+        coincidir con el producto; un código de barras exacto devuelve sólo ese producto.
+        """
+        normalized = normalize(query)
+        terms = normalized.split()
+        if not terms:
+            return []
+        product_id = self._barcodes.get(normalized.replace(" ", ""))
+        if product_id is not None and product_id in self._docs:
+            return [(product_id, 100.0)]
+
+        matches = [self._match(term) for term in dict.fromkeys(terms)]
+        if not all(match.size for match in matches):
+            return []
+        best_total = sum(match.best for match in matches)
+
+        # Candidatos en orden de resultado: las listas del término con menos productos
+        docs = self._docs
+        driver = min(matches, key=lambda match: match.size)
+        candidates = heapq.merge(*driver.postings, key=lambda other: _sort_key(docs.get(other)))
+        if len(matches) > 1:
+            # Sólo los que tienen todos los términos: se calcula con conjuntos, sin recorrerlos
+            common = set().union(*driver.postings)
+            for match in matches:
+                if match is not driver:
+                    common.intersection_update(set().union(*match.postings))
+            if len(common) <= self.MAX_CANDIDATES:
+                candidates = sorted(common, key=lambda other: _sort_key(docs.get(other)))
+            else:
+                candidates = (product_id for product_id in candidates if product_id in common)
+        buckets = {}  # puntaje -> hasta limit productos, en orden
+        previous = None
+        for product_id in itertools.islice(candidates, self.MAX_CANDIDATES):
+            if product_id == previous:
+                continue  # el mismo producto en dos listas del término
+            previous = product_id
+            doc = docs.get(product_id)
+            if doc is None:
+                continue  # eliminado durante la búsqueda
+            total = 0.0
+            for match in matches:
+                points = self._points(match, doc)
+                if not points:
+                    break
+                total += points
+            else:
+                bucket = buckets.setdefault(total, [])
+                if len(bucket) < limit:
+                    bucket.append(product_id)
+                    # Nadie que venga después puede superarlos: mismo puntaje y nombre más largo
+                    if total >= best_total and len(bucket) == limit:
+                        break
+
+        results = []
+        for total in sorted(buckets, reverse=True):
+            results.extend((product_id, round(total, 3)) for product_id in buckets[total])
+        return results[:limit]
+
+    def _match(self, term):
+        match = _TermMatch(term, short=len(term) < 3)
+        if match.short:
+            # Los términos cortos sólo se comparan como prefijo de una palabra del nombre
+            postings = self._by_prefix.get(term, ())
+            if postings:
+                match.postings.append(postings)
+                match.best = self.EXACT if self._name_words.get(term) else self.PREFIX
+        else:
+            match.words = self._word_points(term)
+            for word, points in match.words.items():
+                for postings, word_points in ((self._name_words.get(word), points),
+                                              (self._category_words.get(word), min(points, self.CATEGORY))):
+                    if postings:
+                        match.postings.append(postings)
+                        match.best = max(match.best, word_points)
+            if not term.isalpha():
+                docs = self._docs
+                ids = sorted((product_id for product_id in self._barcode_prefix_ids(term) if product_id in docs),
+                             key=lambda product_id: _sort_key(docs.get(product_id)))
+                if ids:
+                    match.barcode_prefix = True
+                    match.postings.append(ids)
+                    match.best = max(match.best, self.BARCODE_PREFIX)
+        match.size = sum(len(postings) for postings in match.postings)
+        return match
+
+    def _points(self, match, doc):
+        """Puntaje de doc para un término (0 si no coincide): su mejor coincidencia."""
+        term = match.term
+        best = 0.0
+        if match.short:
+            for word in doc.name_words:
+                if word == term:
+                    return self.EXACT
+                if word.startswith(term):
+                    best = self.PREFIX
+            return best
+        words = match.words
+        for word in doc.name_words:
+            points = words.get(word)
+            if points is not None and points > best:
+                best = points
+        for word in doc.category_words:
+            points = words.get(word)
+            if points is not None and min(points, self.CATEGORY) > best:
+                best = min(points, self.CATEGORY)
+        if match.barcode_prefix and best < self.BARCODE_PREFIX and doc.barcode.startswith(term):
+            best = self.BARCODE_PREFIX
+        return best
+
+    def _word_points(self, term):
+        """{palabra del vocabulario: puntaje} de las que coinciden con un término de 3 o más letras."""
+        grams = trigrams(term)
+        postings = sorted((self._by_trigram.get(gram, _EMPTY) for gram in grams), key=len)
+        matches = {}
+        for word in postings[0].intersection(*postings[1:]):
+            if word == term:
+                matches[word] = self.EXACT
+            elif word.startswith(term):
+                matches[word] = self.PREFIX
+            elif term in word:
+                matches[word] = self.INFIX
+
+        if not matches:
+            # Con errores de tipeo: palabras que comparten la mayoría de los trigramas
+            needed = max(1, math.ceil(len(grams) * self.MIN_SIMILARITY))
+            for word, shared in Counter(itertools.chain.from_iterable(postings)).items():
+                if shared >= needed:
+                    similarity = shared / (len(grams) + len(trigrams(word)) - shared)
+                    matches[word] = round(10.0 * similarity, 3)
+            # ... o a un solo error (en palabras cortas un error se lleva casi todos los trigramas)
+            words = set()
+            for key in deletions(term):
+                words |= self._by_deletion.get(key, _EMPTY)
+            for word in words:
+                if one_typo_apart(term, word):
+                    word_grams = trigrams(word)
+                    shared = len(grams & word_grams)
+                    similarity = max(shared / (len(grams) + len(word_grams) - shared), self.TYPO_SIMILARITY)
+                    matches[word] = max(matches.get(word, 0.0), round(10.0 * similarity, 3))
+        return matches
+
+    def _barcode_prefix_ids(self, prefix):
+        barcodes = self._sorted_barcodes
+        start = bisect.bisect_left(barcodes, prefix)
+        ids = []
+        for barcode in barcodes[start:start + self.MAX_BARCODE_PREFIX]:
+            if not barcode.startswith(prefix):
+                break
+            product_id = self._barcodes.get(barcode)
+            if product_id is not None:
+                ids.append(product_id)
+        return ids
+
+
+_REMOVED = (math.inf,)
+
+
+def _sort_key(doc):
+    # Un producto eliminado durante la búsqueda va al final (y después se descarta)
+    return doc.sort_key if doc is not None else _REMOVED
+
+
+def _prefixes(doc):
+    return {prefix for word in doc.name_words for prefix in (word[:1], word[:2])}
@@ -1,8 +1,34 @@
+from src.date_ranges import day_range, to_date
 from src.db import Database
+from src.keyset_cursor import decode_cursor, encode_cursor
+from src.events.services.event_broadcaster import EventBroadcaster
+from src.products.services.catalog_cache import CatalogCache
+from src.products.services.reorder_engine import ReorderEngine
+
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# Inicio de cada período; la semana empieza el lunes, como en date_ranges.week_range
+MOVEMENT_GROUPS = {
+    "day": "DATE(movement_date)",
+    "week": "DATE(movement_date) - INTERVAL WEEKDAY(movement_date) DAY",
+}
+
+
+class _StockConflict(Exception):
+    """Corta la transacción de un movimiento en bloque que no se pudo aplicar completo."""
+
+    def __init__(self, code):
+        super().__init__(code)
+        self.code = code
+
 
 class StockService:
     def __init__(self):
         self.db = Database()
+        self.events = EventBroadcaster()
+        self.catalog = CatalogCache()
+        self.reorder = ReorderEngine()
 
     def add_stock(self, product_id, quantity, user_id=None, provider_id=None, notes=None):
         if quantity <= 0:
@@ -18,9 +44,12 @@ class StockService:
         VALUES (%s, 'ingreso', %s, %s, %s, %s)
         """
         try:
-            self.db.execute(insert_query, (product_id, quantity, user_id, provider_id, notes))
-            update_query = "UPDATE products SET stock = stock + %s WHERE id = %s"
-            self.db.execute(update_query, (quantity, product_id))
+            # Se une a la transacción del llamador si la hay (ej. eliminación de venta)
+            with self.db.transaction(savepoint=False):
+                self.db.execute(insert_query, (product_id, quantity, user_id, provider_id, notes))
+                update_query = "UPDATE products SET stock = stock + %s WHERE id = %s"
+                self.db.execute(update_query, (quantity, product_id))
+                self._publish_stock_changed({product_id: quantity})
             return "OK"
         except Exception as e:
             print(e)
@@ -29,50 +58,199 @@ class StockService:
     def reduce_stock(self, product_id, quantity, user_id=None, notes=None):
         """
         Reduce el stock de un producto. Se usa para ventas o salidas de inventario.
-        
+        El descuento es un único UPDATE condicional: si no alcanza el stock no se toca la fila,
+        y dentro de una venta se une a su transacción en lugar de confirmar por sentencia.
         """
         if quantity <= 0:
             return "INVALID_QUANTITY"
 
-        # Verificar que el producto existe y obtener stock actual
-        product_query = "SELECT id, stock FROM products WHERE id = %s"
-        cursor = self.db.execute(product_query, (product_id,))
-        product = cursor.fetchone()
-        
-        if product is None:
-            return "NOT_FOUND"
-        
-        current_stock = product['stock']
-        
-        # Verificar que hay stock suficiente
-        if current_stock < quantity:
-            return "INSUFFICIENT_STOCK"
-
+        update_query = "UPDATE products SET stock = stock - %s WHERE id = %s AND stock >= %s"
         insert_query = """
         INSERT INTO stock_movements (product_id, movement_type, quantity, user_id, notes)
         VALUES (%s, 'salida', %s, %s, %s)
         """
         try:
-            self.db.execute(insert_query, (product_id, quantity, user_id, notes))
-            update_query = "UPDATE products SET stock = stock - %s WHERE id = %s"
-            self.db.execute(update_query, (quantity, product_id))
+            with self.db.transaction(savepoint=False):
+                cursor = self.db.execute(update_query, (quantity, product_id, quantity))
+                updated = cursor.rowcount
+                cursor.close()
+
+                if updated == 0:
+                    # Sólo en el camino de error: distinguir producto inexistente de stock insuficiente
+                    cursor = self.db.execute("SELECT id FROM products WHERE id = %s", (product_id,))
+                    exists = cursor.fetchone() is not None
+                    cursor.close()
+                    return "INSUFFICIENT_STOCK" if exists else "NOT_FOUND"
+
+                cursor = self.db.execute(insert_query, (product_id, quantity, user_id, notes))
+                cursor.close()
+                self._publish_stock_changed({product_id: -quantity})
             return "OK"
         except Exception as e:
             print(e)
             return "ERROR"
         
-    def get_movements(self, product_id):
-        product_query = "SELECT id FROM products WHERE id = %s"
-        cursor = self.db.execute(product_query, (product_id,))
-        if cursor.fetchone() is None:
-            return "NOT_FOUND"
+    def apply_movements(self, movements, allow_negative=False):
+        """
+        Aplica varios movimientos de stock con un número fijo de sentencias, sea cual sea
+        la cantidad: un UPDATE con JOIN a una tabla derivada de deltas por producto y un
+        INSERT multi-fila en stock_movements. Se une a la transacción del llamador.
 
-        movements_query = """
+        movements: lista de dicts con product_id, movement_type ('ingreso', 'salida' o
+        'devolucion'), quantity y opcionalmente user_id, provider_id y notes.
+        Si algún producto no existe o quedaría con stock negativo no se aplica ninguno
+        (salvo allow_negative, para registrar ventas que ya ocurrieron fuera de línea).
+        """
+        if not movements:
+            return "OK"
+        if any(int(m["quantity"]) <= 0 for m in movements):
+            return "INVALID_QUANTITY"
+
+        deltas = {}
+        for m in movements:
+            sign = -1 if m["movement_type"] == "salida" else 1
+            product_id = int(m["product_id"])
+            deltas[product_id] = deltas.get(product_id, 0) + sign * int(m["quantity"])
+        deltas = {pid: delta for pid, delta in sorted(deltas.items()) if delta != 0}
+
+        insert_query = """
+        INSERT INTO stock_movements (product_id, movement_type, quantity, user_id, provider_id, notes)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        """
+        insert_params = [
+            (m["product_id"], m["movement_type"], int(m["quantity"]),
+             m.get("user_id"), m.get("provider_id"), m.get("notes"))
+            for m in movements
+        ]
+        try:
+            with self.db.transaction(savepoint=False) as connection:
+                cursor = connection.cursor()
+                if deltas:
+                    derived = " UNION ALL ".join(["SELECT %s AS id, %s AS delta"] * len(deltas))
+                    update_query = f"""
+                    UPDATE products p
+                    JOIN ({derived}) d ON d.id = p.id
+                    SET p.stock = p.stock + d.delta
+                    {"" if allow_negative else "WHERE d.delta > 0 OR p.stock + d.delta >= 0"}
+                    """
+                    params = [value for item in deltas.items() for value in item]
+                    cursor.execute(update_query, params)
+                    if cursor.rowcount != len(deltas):
+                        raise _StockConflict(self._diagnose_conflict(cursor, list(deltas)))
+
+                cursor.executemany(insert_query, insert_params)
+                cursor.close()
+                self._publish_stock_changed(deltas)
+            return "OK"
+        except _StockConflict as e:
+            return e.code
+        except Exception as e:
+            print(e)
+            return "ERROR"
+
+    def _publish_stock_changed(self, deltas):
+        """
+        Cuando se confirme la transacción: actualiza el stock del catálogo en memoria, marca
+        los productos para recalcular su punto de pedido y avisa a los clientes del stream
+        de eventos.
+        """
+        if deltas:
+            self.db.on_commit(lambda: self.catalog.apply_stock_deltas(deltas))
+            self.db.on_commit(lambda: self.reorder.mark_dirty(deltas))
+            self.events.publish_after_commit("stock_changed", {
+                "changes": [{"product_id": pid, "delta": delta} for pid, delta in deltas.items()]
+            })
+
+    def _diagnose_conflict(self, cursor, product_ids):
+        placeholders = ", ".join(["%s"] * len(product_ids))
+        cursor.execute(f"SELECT COUNT(*) FROM products WHERE id IN ({placeholders})", product_ids)
+        (found,) = cursor.fetchone()
+        return "NOT_FOUND" if found < len(product_ids) else "INSUFFICIENT_STOCK"
+
+    def get_movements(self, product_id, limit=DEFAULT_PAGE_SIZE, cursor=None, date_from=None, date_to=None):
+        """
+        Movimientos de un producto paginados por keyset sobre (movement_date, id), del más
+        reciente al más antiguo. Cada página es un rango de idx_stock_movements_product_date.
+        Devuelve (movimientos, next_cursor), o "NOT_FOUND". date_from/date_to son fechas
+        inclusivas. Lanza ValueError si el cursor no es válido.
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        conditions, params = self._movement_filters(product_id, date_from, date_to)
+        if cursor:
+            last_date, last_id = decode_cursor(cursor)
+            conditions.append("(movement_date < %s OR (movement_date = %s AND id < %s))")
+            params.extend([last_date, last_date, last_id])
+
+        movements_query = f"""
         SELECT id, movement_type, movement_date, quantity, user_id, provider_id, notes
         FROM stock_movements
-        WHERE product_id = %s
-        ORDER BY movement_date DESC
+        WHERE {" AND ".join(conditions)}
+        ORDER BY movement_date DESC, id DESC
+        LIMIT %s
+        """
+        # Una fila de más para saber si hay otra página sin hacer un COUNT
+        params.append(limit + 1)
+        cursor_db = self.db.execute(movements_query, tuple(params))
+        movements = cursor_db.fetchall()
+        cursor_db.close()
+
+        if not movements and not cursor and not self._product_exists(product_id):
+            return "NOT_FOUND"
+        has_more = len(movements) > limit
+        movements = movements[:limit]
+        next_cursor = encode_cursor(movements[-1]["movement_date"], movements[-1]["id"]) if has_more else None
+        return movements, next_cursor
+
+    def get_movement_totals(self, product_id, group="day", date_from=None, date_to=None):
+        """
+        Totales de ingresos, salidas y devoluciones de un producto por día o por semana (de
+        lunes a domingo), del período más reciente al más antiguo. Se calculan en MySQL
+        leyendo sólo idx_stock_movements_product_date. Devuelve una lista o "NOT_FOUND".
         """
-        cursor = self.db.execute(movements_query, (product_id,))
-        movements = cursor.fetchall()
-        return movements
+        if group not in MOVEMENT_GROUPS:
+            raise ValueError(f"Agrupación inválida: {group}")
+        conditions, params = self._movement_filters(product_id, date_from, date_to)
+        totals_query = f"""
+        SELECT {MOVEMENT_GROUPS[group]} AS period,
+               SUM(CASE WHEN movement_type = 'ingreso' THEN quantity ELSE 0 END) AS ingreso,
+               SUM(CASE WHEN movement_type = 'salida' THEN quantity ELSE 0 END) AS salida,
+               SUM(CASE WHEN movement_type = 'devolucion' THEN quantity ELSE 0 END) AS devolucion,
+               COUNT(*) AS movements
+        FROM stock_movements
+        WHERE {" AND ".join(conditions)}
+        GROUP BY period
+        ORDER BY period DESC
+        """
+        cursor = self.db.execute(totals_query, tuple(params))
+        rows = cursor.fetchall()
+        cursor.close()
+
+        if not rows and not self._product_exists(product_id):
+            return "NOT_FOUND"
+        return [{
+            "period": row["period"].isoformat(),
+            "ingreso": int(row["ingreso"]),
+            "salida": int(row["salida"]),
+            "devolucion": int(row["devolucion"]),
+            "net": int(row["ingreso"]) + int(row["devolucion"]) - int(row["salida"]),
+            "movements": row["movements"]
+        } for row in rows]
+
+    @staticmethod
+    def _movement_filters(product_id, date_from, date_to):
+        conditions = ["product_id = %s"]
+        params = [product_id]
+        if date_from:
+            conditions.append("movement_date >= %s")
+            params.append(to_date(date_from))
+        if date_to:
+            conditions.append("movement_date < %s")
+            params.append(day_range(date_to)[1])
+        return conditions, params
+
+    def _product_exists(self, product_id):
+        # Sólo cuando no hay movimientos: un producto sin historial no es un producto inexistente
+        cursor = self.db.execute("SELECT id FROM products WHERE id = %s", (product_id,))
+        exists = cursor.fetchone() is not None
+        cursor.close()
+        return exists
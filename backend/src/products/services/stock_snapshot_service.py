@@ -0,0 +1,217 @@
+from datetime import timedelta
+from decimal import Decimal
+import os
+import threading
+import time
+
+from src.date_ranges import to_date
+from src.db import Database
+
+
+class StockSnapshotService:
+    """
+    Stock de cierre de cada día por producto (tabla stock_snapshots), para consultar el
+    inventario de cualquier fecha sin recorrer todo stock_movements.
+    Un hilo escribe el cierre de los días que falten hasta ayer, leyendo el stock actual y
+    restando sólo los movimientos posteriores a ese día. La consulta parte de la foto más
+    cercana a la fecha (o del stock actual) y aplica los movimientos entre ambas.
+    Singleton: un hilo de snapshots por proceso; entre procesos se coordinan con GET_LOCK.
+    """
+    _instance = None
+    LOCK_NAME = "stock_snapshots"
+    INSERT_CHUNK_SIZE = 1000
+    # Signo de cada tipo de movimiento sobre el stock
+    DELTA = "SUM(CASE WHEN movement_type = 'salida' THEN -quantity ELSE quantity END)"
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super(StockSnapshotService, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, "initialized"):
+            self.db = Database()
+            self.interval = float(os.getenv("STOCK_SNAPSHOT_INTERVAL_SECONDS", 3600))
+            self._worker = None
+            self.initialized = True
+
+    # ------------ Escritura ------------
+
+    def start(self):
+        if self._worker is not None:
+            return
+        self._worker = threading.Thread(target=self._loop, name="stock-snapshots", daemon=True)
+        self._worker.start()
+
+    def _loop(self):
+        while True:
+            try:
+                self.take_snapshots()
+            except Exception as e:
+                print(f"Error generando snapshots de stock: {e}")
+            finally:
+                self.db.release_connection()
+            time.sleep(self.interval)
+
+    def take_snapshots(self):
+        """
+        Escribe el cierre de cada día desde el último snapshot hasta ayer (sólo ayer si la
+        tabla está vacía). Devuelve las fechas escritas; vacío si otro proceso lo está haciendo.
+        """
+        cursor = self.db.execute("SELECT GET_LOCK(%s, 0) AS locked", (self.LOCK_NAME,))
+        locked = cursor.fetchone()["locked"] == 1
+        cursor.close()
+        if not locked:
+            return []
+        try:
+            cursor = self.db.execute("SELECT CURDATE() AS today, MAX(snapshot_date) AS last FROM stock_snapshots")
+            row = cursor.fetchone()
+            cursor.close()
+            yesterday = row["today"] - timedelta(days=1)
+            day = row["last"] + timedelta(days=1) if row["last"] else yesterday
+            written = []
+            while day <= yesterday:
+                self._write_snapshot(day)
+                written.append(day)
+                day += timedelta(days=1)
+            return written
+        finally:
+            cursor = self.db.execute("SELECT RELEASE_LOCK(%s)", (self.LOCK_NAME,))
+            cursor.close()
+
+    def _write_snapshot(self, day):
+        # Stock actual y movimientos posteriores salen de la misma vista consistente de la
+        # transacción; lecturas sin lock, así no frena las ventas que tocan products
+        with self.db.transaction() as connection:
+            stock = self._stock_from_live(day)
+            cursor = connection.cursor()
+            rows = [(day, product_id, value) for product_id, (value, _, _) in stock.items()]
+            for start in range(0, len(rows), self.INSERT_CHUNK_SIZE):
+                cursor.executemany("""
+                INSERT INTO stock_snapshots (snapshot_date, product_id, stock)
+                VALUES (%s, %s, %s) AS new
+                ON DUPLICATE KEY UPDATE stock = new.stock
+                """, rows[start:start + self.INSERT_CHUNK_SIZE])
+            cursor.close()
+
+    # ------------ Consulta ------------
+
+    def get_stock_as_of(self, day, product_id=None):
+        """
+        Stock de cierre de day (date o 'YYYY-MM-DD') por producto, valuado al precio actual.
+        Los productos creados después de day no aparecen. Con product_id, sólo ese producto
+        ("NOT_FOUND" si no existe o todavía no existía). Lanza ValueError si la fecha es futura.
+        """
+        day = to_date(day)
+        cursor = self.db.execute("""
+        SELECT CURDATE() AS today,
+               (SELECT MAX(snapshot_date) FROM stock_snapshots WHERE snapshot_date <= %s) AS before_day,
+               (SELECT MIN(snapshot_date) FROM stock_snapshots WHERE snapshot_date >= %s) AS after_day
+        """, (day, day))
+        row = cursor.fetchone()
+        cursor.close()
+        today = row["today"]
+        if day > today:
+            raise ValueError("La fecha no puede ser futura")
+
+        # Punto de partida con menos días de movimientos para aplicar
+        anchors = [("live", today, (today - day).days)]
+        if row["before_day"]:
+            anchors.append(("snapshot", row["before_day"], (day - row["before_day"]).days))
+        if row["after_day"]:
+            anchors.append(("snapshot", row["after_day"], (row["after_day"] - day).days))
+        source, anchor, _ = min(anchors, key=lambda item: item[2])
+
+        # Una transacción de sólo lectura: base y movimientos salen de la misma vista consistente
+        with self.db.transaction():
+            if source == "live":
+                stock = self._stock_from_live(day, product_id)
+            else:
+                stock = self._stock_from_snapshot(anchor, day, product_id)
+        if product_id is not None and not stock:
+            return "NOT_FOUND"
+
+        products = [{
+            "product_id": pid,
+            "name": name,
+            "stock": value,
+            "price": price,
+            "value": (price * value).quantize(Decimal("0.01"))
+        } for pid, (value, name, price) in sorted(stock.items())]
+        return {
+            "date": day.isoformat(),
+            "source": "live" if source == "live" else f"snapshot {anchor.isoformat()}",
+            "products": products,
+            "total_units": sum(p["stock"] for p in products),
+            "total_value": sum((p["value"] for p in products), Decimal("0.00"))
+        }
+
+    def _stock_from_live(self, day, product_id=None):
+        """Stock actual menos los movimientos posteriores al cierre de day."""
+        deltas = self._deltas(day + timedelta(days=1), None, product_id)
+        base = self._products(day, product_id)
+        return {pid: (stock - deltas.get(pid, 0), name, price) for pid, (stock, name, price) in base.items()}
+
+    def _stock_from_snapshot(self, anchor, day, product_id=None):
+        """Foto de anchor más (o menos) los movimientos entre su cierre y el de day."""
+        base = self._products(day, product_id, snapshot_date=anchor)
+        if anchor == day:
+            return base
+        if anchor < day:
+            deltas = self._deltas(anchor + timedelta(days=1), day + timedelta(days=1), product_id)
+            sign = 1
+        else:
+            deltas = self._deltas(day + timedelta(days=1), anchor + timedelta(days=1), product_id)
+            sign = -1
+        return {pid: (stock + sign * deltas.get(pid, 0), name, price) for pid, (stock, name, price) in base.items()}
+
+    def _products(self, day, product_id=None, snapshot_date=None):
+        """
+        {product_id: (stock, name, price)} de los productos que existían al cierre de day:
+        stock actual, o el de la foto de snapshot_date.
+        """
+        if snapshot_date is None:
+            query = "SELECT p.id, p.stock, p.name, p.price FROM products p"
+            params = []
+        else:
+            # Los creados después de la foto no tienen fila: su stock al cierre de la foto
+            # es el actual menos todos sus movimientos (el stock inicial no es un movimiento)
+            query = f"""
+            SELECT p.id, p.name, p.price,
+                   COALESCE(s.stock, p.stock - (
+                       SELECT COALESCE({self.DELTA}, 0) FROM stock_movements m
+                       WHERE m.product_id = p.id AND m.movement_date >= %s
+                   )) AS stock
+            FROM products p
+            LEFT JOIN stock_snapshots s ON s.snapshot_date = %s AND s.product_id = p.id
+            """
+            params = [snapshot_date + timedelta(days=1), snapshot_date]
+        query += " WHERE p.created_at < %s"
+        params.append(day + timedelta(days=1))
+        if product_id is not None:
+            query += " AND p.id = %s"
+            params.append(product_id)
+        cursor = self.db.execute(query, tuple(params))
+        rows = cursor.fetchall()
+        cursor.close()
+        return {row["id"]: (int(row["stock"]), row["name"], row["price"]) for row in rows}
+
+    def _deltas(self, start, end, product_id=None):
+        """{product_id: variación de stock} de los movimientos en [start, end) (end None: hasta hoy)."""
+        conditions = ["movement_date >= %s"]
+        params = [start]
+        if end is not None:
+            conditions.append("movement_date < %s")
+            params.append(end)
+        if product_id is not None:
+            conditions.append("product_id = %s")
+            params.append(product_id)
+        cursor = self.db.execute(f"""
+        SELECT product_id, {self.DELTA} AS delta
+        FROM stock_movements
+        WHERE {" AND ".join(conditions)}
+        GROUP BY product_id
+        """, tuple(params))
+        deltas = {row["product_id"]: int(row["delta"]) for row in cursor.fetchall()}
+        cursor.close()
+        return deltas
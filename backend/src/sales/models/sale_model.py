@@ -1,11 +1,12 @@
 class Sale:
-    def __init__(self, id, sale_date, total_amount, payment_method, ticket_url, invoice_state):
+    def __init__(self, id, sale_date, total_amount, payment_method, ticket_url, invoice_state, client_id=None):
         self.id = id
         self.sale_date = sale_date
         self.total_amount = total_amount
         self.payment_method = payment_method
         self.ticket_url = ticket_url
         self.invoice_state = invoice_state
+        self.client_id = client_id
 
     def __repr__(self):
         return f"Sale(id={self.id}, sale_date={self.sale_date}, total_amount={self.total_amount}, payment_method={self.payment_method}, ticket_url={self.ticket_url}, invoice_state={self.invoice_state})"
@@ -17,7 +18,8 @@ class Sale:
             "total_amount": float(self.total_amount),
             "payment_method": self.payment_method,
             "ticket_url": self.ticket_url,
-            "invoice_state": self.invoice_state
+            "invoice_state": self.invoice_state,
+            "client_id": self.client_id
         }   
     
     @classmethod
@@ -28,7 +30,8 @@ class Sale:
             total_amount=data.get("total_amount"),
             payment_method=data.get("payment_method"),
             ticket_url=data.get("ticket_url"),
-            invoice_state=data.get("invoice_state")
+            invoice_state=data.get("invoice_state"),
+            client_id=data.get("client_id")
         )
     
 
@@ -1,16 +1,32 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, json, redirect
+from src.minio_storage.minio_service import MinioClient
 from src.sales.services.sale_service import SaleService
+from src.sales.services.idempotency_service import IdempotencyConflict
 from datetime import datetime
+import csv
+import io
+import itertools
+import mysql.connector
+import zlib
 
 sales_bp = Blueprint('sales', __name__, url_prefix='/api/sales')
 sale_service = SaleService()
 
+SALE_JOURNALED_MESSAGE = 'Venta registrada sin conexión a la base; se sincronizará automáticamente'
+
 # ------------ ENDPOINT PRINCIPAL  ------------
 
 @sales_bp.route('/', methods=['POST'])
 def create_sale():
     """Crear venta completa con productos - Endpoint principal"""
+    idempotency_key = request.headers.get('Idempotency-Key')
     try:
+        # Un reintento con la misma clave devuelve la venta ya creada sin volver a ejecutarla
+        if idempotency_key:
+            stored = sale_service.idempotency_service.get(idempotency_key)
+            if stored:
+                return _replay_sale_response(stored)
+
         data = request.json or {}
         
         sale_data = {
@@ -20,31 +36,109 @@ def create_sale():
             'invoice_state': data.get('invoice_state', 'pendiente')
         }
         
-        new_sale = sale_service.create_sale(sale_data, data.get('products', []))
+        new_sale = sale_service.create_sale(sale_data, data.get('products', []), idempotency_key)
+
+        if new_sale.id is None:
+            # La base no respondió: la venta quedó en el diario local y se cargará sola
+            return jsonify({
+                'success': True,
+                'message': SALE_JOURNALED_MESSAGE,
+                'queued': True,
+                'sale': new_sale.to_dict()
+            }), 202
         
         return jsonify({
             'success': True,
             'message': 'Venta creada correctamente',
             'sale': new_sale.to_dict()
         }), 201
+
+    except IdempotencyConflict:
+        # Un request simultáneo con la misma clave terminó primero
+        stored = sale_service.idempotency_service.get(idempotency_key)
+        if stored:
+            return _replay_sale_response(stored)
+        return jsonify({
+            'success': False,
+            'message': 'Idempotency-Key en uso'
+        }), 409
         
     except Exception as e:
         return jsonify({
             'success': False,
             'message': f'Error al crear venta: {str(e)}'
         }), 500
+
+@sales_bp.route('/bulk', methods=['POST'])
+def create_sales_bulk():
+    """Carga masiva de ventas encoladas por cajas sin conexión"""
+    try:
+        data = request.json
+        sales = data.get('sales') if isinstance(data, dict) else data
+
+        if not isinstance(sales, list) or not sales:
+            return jsonify({
+                'success': False,
+                'message': 'Se espera una lista de ventas'
+            }), 400
+
+        results = sale_service.create_sales_bulk(sales)
+
+        return jsonify({
+            'success': True,
+            'created': sum(1 for r in results if r['status'] == 'created'),
+            'duplicates': sum(1 for r in results if r['status'] == 'duplicate'),
+            'errors': sum(1 for r in results if r['status'] == 'error'),
+            'results': results
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error en la carga masiva de ventas: {str(e)}'
+        }), 500
+
+def _replay_sale_response(stored):
+    response = jsonify({
+        'success': True,
+        'message': SALE_JOURNALED_MESSAGE if stored['status_code'] == 202 else 'Venta creada correctamente',
+        'sale': stored['body']
+    })
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response, stored['status_code']
     
 # ------------ ENDPOINTS DE CONSULTA ------------
 
 @sales_bp.route('/', methods=['GET'])
 def get_all_sales():
+    """Listado paginado: ?limit=&cursor=&from=&to=&payment_method=&invoice_state="""
     try:
-        sales = sale_service.get_all_sales()
+        try:
+            limit = int(request.args.get('limit', 50))
+            date_from = request.args.get('from')
+            date_to = request.args.get('to')
+            date_from = datetime.strptime(date_from, '%Y-%m-%d').date() if date_from else None
+            date_to = datetime.strptime(date_to, '%Y-%m-%d').date() if date_to else None
+
+            sales, next_cursor = sale_service.get_sales_page(
+                limit=limit,
+                cursor=request.args.get('cursor'),
+                date_from=date_from,
+                date_to=date_to,
+                payment_method=request.args.get('payment_method'),
+                invoice_state=request.args.get('invoice_state')
+            )
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': f'Parámetros inválidos: {str(e)}'
+            }), 400
         
         return jsonify({
             'success': True,
             'sales': [sale.to_dict() for sale in sales],
-            'total': len(sales)
+            'total': len(sales),
+            'next_cursor': next_cursor
         }), 200
         
     except Exception as e:
@@ -53,6 +147,92 @@ def get_all_sales():
             'message': f'Error: {str(e)}'
         }), 500
 
+EXPORT_COLUMNS = ['id', 'sale_date', 'total_amount', 'payment_method', 'invoice_state', 'ticket_url', 'client_id']
+EXPORT_CONTENT_TYPES = {'csv': 'text/csv; charset=utf-8', 'ndjson': 'application/x-ndjson'}
+
+@sales_bp.route('/export', methods=['GET'])
+def export_sales():
+    """Exporta el historial de ventas en streaming: ?format=csv|ndjson&from=&to=&gzip=true"""
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in EXPORT_CONTENT_TYPES:
+        return jsonify({
+            'success': False,
+            'message': 'format debe ser csv o ndjson'
+        }), 400
+
+    try:
+        date_from = request.args.get('from')
+        date_to = request.args.get('to')
+        date_from = datetime.strptime(date_from, '%Y-%m-%d').date() if date_from else None
+        date_to = datetime.strptime(date_to, '%Y-%m-%d').date() if date_to else None
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'message': 'Formato de fecha inválido. Use YYYY-MM-DD'
+        }), 400
+
+    use_gzip = request.args.get('gzip', '').lower() in ('1', 'true')
+
+    try:
+        batches = sale_service.export_sales(date_from, date_to)
+        # Se pide el primer lote antes de responder: si la base falla todavía podemos devolver 500
+        first_batch = next(batches, [])
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error: {str(e)}'
+        }), 500
+
+    chunks = _export_chunks(itertools.chain([first_batch], batches), export_format)
+    filename = f"ventas.{export_format}"
+    if use_gzip:
+        chunks = _gzip_chunks(chunks)
+        filename += ".gz"
+
+    response = Response(
+        chunks,
+        content_type='application/gzip' if use_gzip else EXPORT_CONTENT_TYPES[export_format]
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+def _export_chunks(batches, export_format):
+    """Un bloque de texto por lote de filas."""
+    if export_format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        for rows in batches:
+            for row in rows:
+                writer.writerow([_export_value(row[column]) for column in EXPORT_COLUMNS])
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode('utf-8')
+    else:
+        for rows in batches:
+            lines = [
+                json.dumps({column: _export_value(row[column]) for column in EXPORT_COLUMNS})
+                for row in rows
+            ]
+            if lines:
+                yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+def _export_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if hasattr(value, 'as_tuple'):  # Decimal
+        return float(value)
+    return value
+
+def _gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: formato gzip
+    for chunk in chunks:
+        # Z_SYNC_FLUSH por lote: el cliente recibe datos sin esperar a que se llene el buffer de zlib
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
 @sales_bp.route('/<int:sale_id>', methods=['GET'])
 def get_sale(sale_id):
     try:
@@ -75,6 +255,35 @@ def get_sale(sale_id):
             'message': f'Error: {str(e)}'
         }), 500
 
+@sales_bp.route('/<int:sale_id>/ticket', methods=['GET'])
+def get_sale_ticket(sale_id):
+    """PDF del ticket: redirección a una URL prefirmada de MinIO (el bucket tickets no es público)"""
+    try:
+        sale = sale_service.get_sale_by_id(sale_id)
+
+        if not sale:
+            return jsonify({
+                'success': False,
+                'message': 'Venta no encontrada'
+            }), 404
+        if not sale.ticket_url:
+            # El ticket se genera en segundo plano: puede no estar todavía
+            return jsonify({
+                'success': False,
+                'message': 'El ticket de la venta todavía no está disponible'
+            }), 404
+
+        # La URL vence: que el navegador no cachee la redirección
+        response = redirect(MinioClient.url_ticket(sale.ticket_url), 302)
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error: {str(e)}'
+        }), 500
+
 @sales_bp.route('/<int:sale_id>/complete', methods=['GET'])
 def get_sale_complete(sale_id):
     try:
@@ -97,6 +306,45 @@ def get_sale_complete(sale_id):
             'message': f'Error: {str(e)}'
         }), 500
 
+@sales_bp.route('/complete', methods=['GET'])
+def get_sales_complete():
+    """Varias ventas completas en una sola consulta: ?ids=1,2,3"""
+    try:
+        try:
+            sale_ids = [int(value) for value in request.args.get('ids', '').split(',') if value.strip()]
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'message': 'ids debe ser una lista de números separados por coma'
+            }), 400
+
+        if not sale_ids:
+            return jsonify({
+                'success': False,
+                'message': 'Se requiere el parámetro ids'
+            }), 400
+        if len(sale_ids) > SaleService.MAX_PAGE_SIZE:
+            return jsonify({
+                'success': False,
+                'message': f'Máximo {SaleService.MAX_PAGE_SIZE} ventas por consulta'
+            }), 400
+
+        sales = sale_service.get_sales_with_products(sale_ids)
+        found = {entry['sale']['id'] for entry in sales}
+
+        return jsonify({
+            'success': True,
+            'data': sales,
+            'total': len(sales),
+            'not_found': [sale_id for sale_id in dict.fromkeys(sale_ids) if sale_id not in found]
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error: {str(e)}'
+        }), 500
+
 @sales_bp.route('/<int:sale_id>/products', methods=['GET'])
 def get_sale_products(sale_id):
     try:
@@ -230,6 +478,51 @@ def delete_sale(sale_id):
             'message': f'Error al eliminar venta: {str(e)}'
         }), 500
 
+@sales_bp.route('/bulk', methods=['DELETE'])
+def delete_sales_bulk():
+    """Anular varias ventas en una sola transacción: {"ids": [1, 2, 3]}"""
+    try:
+        data = request.json or {}
+        sale_ids = data.get('ids') if isinstance(data, dict) else None
+
+        if not isinstance(sale_ids, list) or not sale_ids or not all(isinstance(i, int) for i in sale_ids):
+            return jsonify({
+                'success': False,
+                'message': 'Se espera una lista de ids de venta'
+            }), 400
+        if len(sale_ids) > SaleService.MAX_PAGE_SIZE:
+            return jsonify({
+                'success': False,
+                'message': f'Máximo {SaleService.MAX_PAGE_SIZE} ventas por anulación'
+            }), 400
+
+        deleted, not_found = sale_service.delete_sales(sale_ids)
+
+        return jsonify({
+            'success': True,
+            'message': f'{len(deleted)} ventas eliminadas',
+            'deleted': deleted,
+            'not_found': not_found
+        }), 200
+
+    except mysql.connector.IntegrityError as e:
+        if e.errno == 1451:
+            # Ventas con factura AFIP: no se anula ninguna del lote
+            return jsonify({
+                'success': False,
+                'message': 'Hay ventas facturadas que no se pueden eliminar'
+            }), 409
+        return jsonify({
+            'success': False,
+            'message': f'Error al eliminar ventas: {str(e)}'
+        }), 500
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error al eliminar ventas: {str(e)}'
+        }), 500
+
 # ========== MANEJO DE ERRORES ==========
 
 @sales_bp.errorhandler(404)
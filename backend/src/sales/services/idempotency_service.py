@@ -0,0 +1,120 @@
+from src.db import Database, is_unavailable_error
+from flask import json
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import os
+import threading
+import time
+
+
+class IdempotencyConflict(Exception):
+    """Otro request con la misma Idempotency-Key ya registró su venta."""
+
+
+class IdempotencyService:
+    """
+    Guarda la respuesta de cada POST de venta bajo su Idempotency-Key, para que los
+    reintentos del front devuelvan el mismo resultado sin volver a ejecutar la venta.
+    Las claves viven en una tabla indexada y las más recientes también en un LRU en memoria.
+    """
+    _cache = OrderedDict()  # clave -> (expira, sale_id, status_code, body), compartido por el proceso
+    _lock = threading.Lock()
+    _last_purge = 0.0
+
+    PURGE_INTERVAL = 15 * 60  # segundos entre limpiezas de claves vencidas
+
+    def __init__(self):
+        self.db = Database()
+        self.ttl = timedelta(seconds=int(os.getenv("IDEMPOTENCY_TTL_SECONDS", 24 * 3600)))
+        self.cache_size = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", 10000))
+
+    def get(self, key):
+        """Devuelve {'sale_id', 'status_code', 'body'} si la clave se usó dentro de la ventana, o None."""
+        now = datetime.now()
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._cache.move_to_end(key)
+                    return self._as_record(entry)
+                del self._cache[key]
+
+        self._purge_expired_if_due()
+
+        query = """
+        SELECT sale_id, status_code, response_body, created_at
+        FROM idempotency_keys
+        WHERE idempotency_key = %s AND created_at >= %s
+        """
+        try:
+            cursor = self.db.execute(query, (key, now - self.ttl))
+        except Exception as e:
+            if not is_unavailable_error(e):
+                raise
+            # Sin base la venta irá al diario local: la clave se trata como nueva
+            return None
+        row = cursor.fetchone()
+        cursor.close()
+        if not row:
+            return None
+
+        entry = (row["created_at"] + self.ttl, row["sale_id"], row["status_code"], json.loads(row["response_body"]))
+        self._remember(key, entry)
+        return self._as_record(entry)
+
+    def save(self, key, sale_id, status_code, body):
+        """
+        Registra la clave dentro de la transacción de la venta: si la venta se deshace,
+        la clave también. Una clave vencida se reutiliza; una vigente lanza IdempotencyConflict.
+        """
+        now = datetime.now()
+        # created_at va último: las asignaciones se evalúan en orden y los IF anteriores
+        # tienen que ver la fecha vieja. Si la clave sigue vigente la fila queda igual (rowcount 0).
+        query = """
+        INSERT INTO idempotency_keys (idempotency_key, sale_id, status_code, response_body, created_at)
+        VALUES (%s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            sale_id = IF(created_at < %s, VALUES(sale_id), sale_id),
+            status_code = IF(created_at < %s, VALUES(status_code), status_code),
+            response_body = IF(created_at < %s, VALUES(response_body), response_body),
+            created_at = IF(created_at < %s, VALUES(created_at), created_at)
+        """
+        expired_before = now - self.ttl
+        params = (key, sale_id, status_code, json.dumps(body), now) + (expired_before,) * 4
+        cursor = self.db.execute(query, params)
+        stored = cursor.rowcount > 0
+        cursor.close()
+        if not stored:
+            raise IdempotencyConflict(key)
+        return (now + self.ttl, sale_id, status_code, body)
+
+    def remember(self, key, entry):
+        """Publica en el LRU una clave ya confirmada en la base."""
+        self._remember(key, entry)
+
+    def remember_pending(self, key, status_code, body):
+        """Clave de una venta guardada en el diario local: sólo vive en el LRU de este proceso."""
+        self._remember(key, (datetime.now() + self.ttl, None, status_code, body))
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._cache[key] = entry
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _as_record(self, entry):
+        return {"sale_id": entry[1], "status_code": entry[2], "body": entry[3]}
+
+    def _purge_expired_if_due(self):
+        now = time.monotonic()
+        with self._lock:
+            if now - IdempotencyService._last_purge < self.PURGE_INTERVAL:
+                return
+            IdempotencyService._last_purge = now
+        try:
+            cursor = self.db.execute(
+                "DELETE FROM idempotency_keys WHERE created_at < %s", (datetime.now() - self.ttl,))
+            cursor.close()
+        except Exception as e:
+            print(f"Error limpiando claves de idempotencia: {e}")
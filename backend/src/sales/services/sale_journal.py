@@ -0,0 +1,182 @@
+from src.db import Database
+from flask import json
+import os
+import threading
+import time
+import zlib
+
+
+class SaleJournal:
+    """
+    Diario local (solo-agregar) de ventas tomadas mientras MySQL no responde.
+    Cada línea es "<crc32 en hex> <venta en JSON>" y se hace fsync antes de responder,
+    así una venta aceptada sobrevive a un corte del proceso.
+    Un hilo en segundo plano las reenvía por lotes con create_sales_bulk cuando la base
+    vuelve: el client_id de cada venta hace que reenviar sea seguro (las ya cargadas
+    quedan como duplicadas). Las que la base rechaza pasan al archivo <diario>.rejected.
+    Singleton: el diario es uno por proceso.
+    """
+    _instance = None
+
+    BATCH_SIZE = 500
+    OFFLINE_BACKOFF = 5  # segundos sin intentar MySQL después de detectar un corte
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super(SaleJournal, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, "initialized"):
+            self.path = os.getenv("SALES_JOURNAL_PATH", "/app/data/sales_journal.log")
+            self.rejected_path = self.path + ".rejected"
+            self.replay_interval = float(os.getenv("SALES_JOURNAL_REPLAY_INTERVAL", 5))
+            self._lock = threading.Lock()
+            self._file = None
+            self._offline_until = 0.0
+            self._replayer = None
+            self.initialized = True
+
+    # ------------ Escritura ------------
+
+    def append(self, sale):
+        """Agrega una venta al diario y no vuelve hasta que está en disco."""
+        line = _encode(sale)
+        with self._lock:
+            file = self._open()
+            file.write(line)
+            file.flush()
+            os.fsync(file.fileno())
+
+    def _open(self):
+        if self._file is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._file = open(self.path, "a+b")
+            # Si el proceso murió a mitad de una escritura, la línea cortada queda aislada
+            # (y se descarta por checksum) en lugar de pegarse a la próxima venta
+            self._file.seek(0, os.SEEK_END)
+            if self._file.tell() > 0:
+                self._file.seek(-1, os.SEEK_END)
+                if self._file.read(1) != b"\n":
+                    self._file.write(b"\n")
+        return self._file
+
+    # ------------ Estado de la base ------------
+
+    def is_offline(self):
+        """True si hace poco se detectó un corte: las ventas van directo al diario."""
+        return time.monotonic() < self._offline_until
+
+    def mark_offline(self):
+        self._offline_until = time.monotonic() + self.OFFLINE_BACKOFF
+
+    def _database_reachable(self):
+        try:
+            cursor = Database().execute("SELECT 1")
+            cursor.fetchall()
+            cursor.close()
+            self._offline_until = 0.0
+            return True
+        except Exception:
+            return False
+
+    # ------------ Reenvío ------------
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._read_lines())
+
+    def start_replayer(self, sale_service):
+        if self._replayer is not None:
+            return
+        self._replayer = threading.Thread(
+            target=self._replay_loop, args=(sale_service,), name="sales-journal", daemon=True)
+        self._replayer.start()
+
+    def _replay_loop(self, sale_service):
+        while True:
+            try:
+                while self.replay(sale_service):
+                    pass
+            except Exception as e:
+                print(f"Error reenviando el diario de ventas: {e}")
+            finally:
+                Database().release_connection()
+            time.sleep(self.replay_interval)
+
+    def replay(self, sale_service):
+        """
+        Reenvía el primer lote del diario y lo quita del archivo.
+        Devuelve la cantidad de líneas procesadas (0 si no hay nada o la base sigue caída).
+        """
+        with self._lock:
+            lines = self._read_lines()[:self.BATCH_SIZE]
+        if not lines or not self._database_reachable():
+            return 0
+
+        sales = []
+        rejected = []
+        for line in lines:
+            sale = _decode(line)
+            if sale is None:
+                rejected.append({"line": line.decode("utf-8", "replace"), "error": "Checksum inválido"})
+            else:
+                sales.append(sale)
+
+        results = sale_service.create_sales_bulk(sales, allow_negative_stock=True) if sales else []
+        errors = [(sale, result) for sale, result in zip(sales, results) if result["status"] == "error"]
+        if errors and not self._database_reachable():
+            # Se cortó de nuevo durante la carga: el lote entero se reintenta más tarde
+            return 0
+        rejected.extend({"sale": sale, "error": result.get("message")} for sale, result in errors)
+
+        with self._lock:
+            if rejected:
+                self._append_rejected(rejected)
+            self._drop_first_lines(len(lines))
+
+        created = len(sales) - len(errors)
+        print(f"Diario de ventas: {created} ventas sincronizadas, {len(rejected)} rechazadas")
+        return len(lines)
+
+    def _read_lines(self):
+        try:
+            with open(self.path, "rb") as file:
+                return [line for line in file.read().split(b"\n") if line]
+        except FileNotFoundError:
+            return []
+
+    def _drop_first_lines(self, count):
+        """Compacta el diario reescribiéndolo sin las líneas ya procesadas (reemplazo atómico)."""
+        remaining = self._read_lines()[count:]
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(b"".join(line + b"\n" for line in remaining))
+            file.flush()
+            os.fsync(file.fileno())
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        os.replace(tmp_path, self.path)
+
+    def _append_rejected(self, entries):
+        with open(self.rejected_path, "ab") as file:
+            for entry in entries:
+                file.write(json.dumps(entry).encode("utf-8") + b"\n")
+            file.flush()
+            os.fsync(file.fileno())
+
+
+def _encode(sale):
+    payload = json.dumps(sale, separators=(",", ":")).encode("utf-8")
+    return b"%08x %s\n" % (zlib.crc32(payload), payload)
+
+
+def _decode(line):
+    checksum, _, payload = line.partition(b" ")
+    try:
+        if int(checksum, 16) != zlib.crc32(payload):
+            return None
+        return json.loads(payload)
+    except ValueError:
+        return None
@@ -2,56 +2,78 @@ from src.sales.models.sale_model import Sale
 from src.sales.models.sale_product import SaleProduct
 from src.products.services.products_service import ProductoService
 from src.products.services.stock_service import StockService
-from src.db import Database
-from src.db_lock import db_lock
+from src.sales.services.idempotency_service import IdempotencyService
+from src.sales.services.sale_journal import SaleJournal
+from src.tickets.services.ticket_pipeline import TicketPipeline
+from src.events.services.event_broadcaster import EventBroadcaster
+from src.db import Database, is_unavailable_error
+from src.date_ranges import day_range
+from src.keyset_cursor import decode_cursor, encode_cursor
 from datetime import datetime
+import uuid
+import mysql.connector
 
 class SaleService:
+    BULK_CHUNK_SIZE = 500  # ventas por transacción en la carga masiva
+    MAX_PAGE_SIZE = 500
+
     def __init__(self):
         self.db = Database()
         self.product_service = ProductoService()
         self.stock_service = StockService()
+        self.idempotency_service = IdempotencyService()
+        self.ticket_pipeline = TicketPipeline()
+        self.journal = SaleJournal()
+        self.events = EventBroadcaster()
 
-    def create_sale(self, sale_data, products_data):
-        """Crear venta completa con productos."""
+    def create_sale(self, sale_data, products_data, idempotency_key=None):
+        """
+        Crear venta completa con productos.
+        La cantidad de consultas es fija sin importar las líneas del carrito: una validación
+        con IN (...), un INSERT multi-fila por tabla y un único UPDATE de stock en bloque.
+        Con idempotency_key la clave se registra en la misma transacción que la venta.
+        Si MySQL no responde la venta se guarda en el diario local y se devuelve sin id
+        (se carga sola cuando vuelve la base).
+        """
         
         current_date = datetime.now()
+        lines = self._merge_cart_lines(products_data)
+        idempotency_entry = None
+        # Identifica la venta aunque termine cargándose desde el diario: si el COMMIT llegó
+        # a la base antes del corte, el reenvío la detecta como duplicada
+        client_id = sale_data.get("client_id") or uuid.uuid4().hex
 
-        with db_lock: 
-            connection = self.db.get_connection()
-            
-            try:
-                connection.rollback()
-            except:
-                pass
+        if self.journal.is_offline():
+            return self._journal_sale(sale_data, lines, current_date, client_id, idempotency_key)
 
-            cursor = connection.cursor(dictionary=True, buffered=True)
-            
-            try:
-                connection.start_transaction()
-                
-                # 1. Validar productos
-                for product_data in products_data:
-                    product = self.product_service.get_product_by_id(product_data.get('product_id'))
+        try:
+            with self.db.transaction() as connection:
+                cursor = connection.cursor(dictionary=True, buffered=True)
+
+                # 1. Validar productos contra el catálogo en memoria. El stock en memoria puede
+                #    estar atrasado: si no alcanza se confirma con la base antes de rechazar.
+                #    El UPDATE condicional es el que realmente evita sobreventas.
+                products = self.product_service.get_products_by_ids([line["product_id"] for line in lines])
+                short = [line["product_id"] for line in lines
+                         if line["product_id"] in products and products[line["product_id"]].stock < line["quantity"]]
+                if short:
+                    products.update(self.product_service.get_products_by_ids(short, use_cache=False))
+                for line in lines:
+                    product = products.get(line["product_id"])
                     if not product:
-                        raise Exception(f"Producto {product_data.get('product_id')} no encontrado")
-                    
-                    quantity = int(product_data.get('quantity'))
-                    if product.stock < quantity:
+                        raise Exception(f"Producto {line['product_id']} no encontrado")
+                    if product.stock < line["quantity"]:
                         raise Exception(f"Stock insuficiente para {product.name}")
-                
+
                 # 2. Calcular total
-                total_amount = sum(
-                    int(p.get('quantity')) * float(p.get('unit_price')) 
-                    for p in products_data
-                )
-                
+                total_amount = sum(line["quantity"] * line["unit_price"] for line in lines)
+
                 # 3. Crear la venta
                 sale_query = """
-                INSERT INTO sales (sale_date, total_amount, payment_method, ticket_url, invoice_state)
-                VALUES (%s, %s, %s, %s, %s)
+                INSERT INTO sales (sale_date, total_amount, payment_method, ticket_url, invoice_state, client_id)
+                VALUES (%s, %s, %s, %s, %s, %s)
                 """
-                
+
                 payment_method = sale_data.get("payment_method", "efectivo")
                 ticket_url = sale_data.get("ticket_url", "")
                 invoice_state = sale_data.get("invoice_state", "pendiente")
@@ -61,58 +83,305 @@ class SaleService:
                     total_amount,
                     payment_method,
                     ticket_url,
-                    invoice_state
+                    invoice_state,
+                    client_id
                 )
-                
+
                 cursor.execute(sale_query, sale_params)
                 sale_id = cursor.lastrowid
-                
-                # 4. Insertar productos
-                for product_data in products_data:
-                    product_query = """
-                    INSERT INTO sale_product (sale_id, product_id, quantity, unit_price)
-                    VALUES (%s, %s, %s, %s)
-                    """
-                    product_params = (
-                        sale_id,
-                        product_data.get("product_id"),
-                        int(product_data.get("quantity")),
-                        float(product_data.get("unit_price"))
-                    )
-                    cursor.execute(product_query, product_params)
-                    
-                    # 5. Reducir stock
-                    stock_result = self.stock_service.reduce_stock(
-                        product_id=product_data.get("product_id"),
-                        quantity=int(product_data.get("quantity")),
-                        user_id=sale_data.get("user_id"),  
-                        notes=f"Venta #{sale_id}"
-                    )
-                    
-                    if stock_result != "OK":
-                        raise Exception(f"Error stock: {stock_result}")
-
-                connection.commit()
-                cursor.close() 
+
+                # 4. Insertar productos (un solo INSERT multi-fila)
+                self._insert_sale_lines(cursor, [(sale_id, line) for line in lines])
+                cursor.close()
+
+                # 5. Reducir stock de todas las líneas en bloque
+                stock_result = self.stock_service.apply_movements([
+                    {
+                        "product_id": line["product_id"],
+                        "movement_type": "salida",
+                        "quantity": line["quantity"],
+                        "user_id": sale_data.get("user_id"),
+                        "notes": f"Venta #{sale_id}"
+                    }
+                    for line in lines
+                ])
+
+                if stock_result == "INSUFFICIENT_STOCK":
+                    # Otra caja vendió el stock entre la validación y el descuento
+                    raise Exception("Stock insuficiente para uno o más productos")
+                if stock_result != "OK":
+                    raise Exception(f"Error stock: {stock_result}")
+
                 new_sale = Sale(
                     id=sale_id,
                     sale_date=current_date,
                     total_amount=total_amount,
                     payment_method=payment_method,
                     ticket_url=ticket_url,
-                    invoice_state=invoice_state
+                    invoice_state=invoice_state,
+                    client_id=client_id
                 )
-                return new_sale
-                
+
+                # 6. Registrar la clave de idempotencia (si otro request la ganó, se deshace todo)
+                if idempotency_key:
+                    idempotency_entry = self.idempotency_service.save(
+                        idempotency_key, sale_id, 201, new_sale.to_dict())
+
+                # 7. El ticket se genera en segundo plano, recién cuando la venta está confirmada
+                if not ticket_url:
+                    self.db.on_commit(lambda: self.ticket_pipeline.submit(sale_id))
+                self.events.publish_after_commit("sale_created", new_sale.to_dict())
+
+            if idempotency_entry:
+                self.idempotency_service.remember(idempotency_key, idempotency_entry)
+            return new_sale
+
+        except Exception as e:
+            if is_unavailable_error(e):
+                print(f"MySQL no disponible, venta enviada al diario: {e}")
+                self.journal.mark_offline()
+                return self._journal_sale(sale_data, lines, current_date, client_id, idempotency_key)
+            print(f"Error al crear venta: {e}")
+            raise e
+
+    def _journal_sale(self, sale_data, lines, sale_date, client_id, idempotency_key=None):
+        """Guarda la venta en el diario local con el formato de create_sales_bulk."""
+        payment_method = sale_data.get("payment_method", "efectivo")
+        ticket_url = sale_data.get("ticket_url", "")
+        invoice_state = sale_data.get("invoice_state", "pendiente")
+        self.journal.append({
+            "client_id": client_id,
+            "sale_date": sale_date.isoformat(),
+            "payment_method": payment_method,
+            "ticket_url": ticket_url,
+            "invoice_state": invoice_state,
+            "user_id": sale_data.get("user_id"),
+            "products": lines
+        })
+        sale = Sale(
+            id=None,
+            sale_date=sale_date,
+            total_amount=sum(line["quantity"] * line["unit_price"] for line in lines),
+            payment_method=payment_method,
+            ticket_url=ticket_url,
+            invoice_state=invoice_state,
+            client_id=client_id
+        )
+        if idempotency_key:
+            # Sin base no se puede registrar la clave: queda en memoria para los reintentos inmediatos
+            self.idempotency_service.remember_pending(idempotency_key, 202, sale.to_dict())
+        return sale
+
+    def _merge_cart_lines(self, products_data):
+        """Normaliza el carrito: una línea por producto, ordenadas por id (orden estable de locks)."""
+        lines = {}
+        for product_data in products_data:
+            product_id = int(product_data.get("product_id"))
+            quantity = int(product_data.get("quantity"))
+            if quantity <= 0:
+                raise Exception(f"Cantidad inválida para el producto {product_id}")
+            if product_id in lines:
+                lines[product_id]["quantity"] += quantity
+            else:
+                lines[product_id] = {
+                    "product_id": product_id,
+                    "quantity": quantity,
+                    "unit_price": float(product_data.get("unit_price"))
+                }
+        return [lines[pid] for pid in sorted(lines)]
+
+    def _insert_sale_lines(self, cursor, sale_lines):
+        """Inserta las líneas (sale_id, línea) en sale_product con un único INSERT multi-fila."""
+        product_query = """
+        INSERT INTO sale_product (sale_id, product_id, quantity, unit_price)
+        VALUES (%s, %s, %s, %s)
+        """
+        cursor.executemany(product_query, [
+            (sale_id, line["product_id"], line["quantity"], line["unit_price"])
+            for sale_id, line in sale_lines
+        ])
+
+    def create_sales_bulk(self, sales_data, allow_negative_stock=False):
+        """
+        Carga masiva de ventas (sincronización de cajas offline).
+        Cada venta trae un client_id generado por la caja: si ya existe se informa como
+        duplicada y no se vuelve a cargar, así reenviar la cola es seguro.
+        Valida todos los productos en una consulta e inserta en transacciones por bloques.
+        Devuelve un resultado por venta, en el mismo orden recibido.
+        allow_negative_stock acepta ventas que ya ocurrieron aunque el stock registrado
+        no alcance (por ejemplo las del diario local): el faltante queda como stock negativo.
+        """
+        results = [None] * len(sales_data)
+        pending = []
+        seen_client_ids = set()
+
+        for index, raw in enumerate(sales_data):
+            client_id = str(raw.get("client_id") or "").strip()
+            if not client_id:
+                results[index] = self._bulk_result(None, "error", message="Falta client_id")
+                continue
+            if client_id in seen_client_ids:
+                results[index] = self._bulk_result(client_id, "duplicate", message="client_id repetido en el lote")
+                continue
+            seen_client_ids.add(client_id)
+            try:
+                lines = self._merge_cart_lines(raw.get("products", []))
+                if not lines:
+                    raise Exception("La venta no tiene productos")
+                sale_date = raw.get("sale_date")
+                sale_date = datetime.fromisoformat(sale_date) if sale_date else datetime.now()
             except Exception as e:
-                connection.rollback()
-                print(f"Error al crear venta: {e}")
-                raise e 
-            finally:
+                results[index] = self._bulk_result(client_id, "error", message=str(e))
+                continue
+            pending.append({
+                "index": index,
+                "client_id": client_id,
+                "sale_date": sale_date,
+                "payment_method": raw.get("payment_method", "efectivo"),
+                "ticket_url": raw.get("ticket_url", ""),
+                "invoice_state": raw.get("invoice_state", "pendiente"),
+                "user_id": raw.get("user_id"),
+                "lines": lines,
+                "total_amount": sum(line["quantity"] * line["unit_price"] for line in lines)
+            })
+
+        # Validar todos los productos referenciados en una sola consulta
+        product_ids = {line["product_id"] for sale in pending for line in sale["lines"]}
+        known_products = self.product_service.get_products_by_ids(product_ids)
+        valid = []
+        for sale in pending:
+            missing = [line["product_id"] for line in sale["lines"] if line["product_id"] not in known_products]
+            if missing:
+                results[sale["index"]] = self._bulk_result(
+                    sale["client_id"], "error", message=f"Producto {missing[0]} no encontrado")
+            else:
+                valid.append(sale)
+
+        for start in range(0, len(valid), self.BULK_CHUNK_SIZE):
+            chunk = valid[start:start + self.BULK_CHUNK_SIZE]
+            for attempt in range(2):
                 try:
-                    cursor.close()
-                except:
-                    pass
+                    self._insert_sales_chunk(chunk, results, allow_negative_stock)
+                    break
+                except mysql.connector.IntegrityError as e:
+                    # Otra caja subió alguno de estos client_id en paralelo: se reintenta una vez
+                    # y esos quedan detectados como duplicados
+                    if e.errno == 1062 and attempt == 0:
+                        continue
+                    error = e
+                except Exception as e:
+                    error = e
+                print(f"Error en carga masiva de ventas: {error}")
+                for sale in chunk:
+                    if results[sale["index"]] is None:
+                        results[sale["index"]] = self._bulk_result(sale["client_id"], "error", message=str(error))
+                break
+
+        return results
+
+    def _insert_sales_chunk(self, chunk, results, allow_negative_stock=False):
+        with self.db.transaction() as connection:
+            cursor = connection.cursor(dictionary=True, buffered=True)
+
+            # 1. Descartar las ventas que ya se habían cargado
+            existing = self._find_sale_ids_by_client_id(cursor, [sale["client_id"] for sale in chunk])
+            accepted = []
+            for sale in chunk:
+                if sale["client_id"] in existing:
+                    results[sale["index"]] = self._bulk_result(
+                        sale["client_id"], "duplicate", sale_id=existing[sale["client_id"]])
+                else:
+                    accepted.append(sale)
+
+            # 2. Bloquear los productos del bloque y asignar el stock venta por venta
+            product_ids = sorted({line["product_id"] for sale in accepted for line in sale["lines"]})
+            stock = {}
+            if product_ids:
+                placeholders = ", ".join(["%s"] * len(product_ids))
+                cursor.execute(
+                    f"SELECT id, stock FROM products WHERE id IN ({placeholders}) ORDER BY id FOR UPDATE",
+                    tuple(product_ids))
+                stock = {row["id"]: row["stock"] for row in cursor.fetchall()}
+
+            to_insert = []
+            for sale in accepted:
+                # Eliminado entre la validación y el FOR UPDATE
+                missing = [line["product_id"] for line in sale["lines"] if line["product_id"] not in stock]
+                if missing:
+                    results[sale["index"]] = self._bulk_result(
+                        sale["client_id"], "error", message=f"Producto {missing[0]} no encontrado")
+                    continue
+                if not allow_negative_stock and any(
+                        stock[line["product_id"]] < line["quantity"] for line in sale["lines"]):
+                    results[sale["index"]] = self._bulk_result(sale["client_id"], "error", message="Stock insuficiente")
+                    continue
+                for line in sale["lines"]:
+                    stock[line["product_id"]] -= line["quantity"]
+                to_insert.append(sale)
+
+            if not to_insert:
+                cursor.close()
+                return
+
+            # 3. Insertar ventas, líneas y movimientos en bloque
+            cursor.executemany("""
+            INSERT INTO sales (sale_date, total_amount, payment_method, ticket_url, invoice_state, client_id)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            """, [
+                (sale["sale_date"], sale["total_amount"], sale["payment_method"],
+                 sale["ticket_url"], sale["invoice_state"], sale["client_id"])
+                for sale in to_insert
+            ])
+            sale_ids = self._find_sale_ids_by_client_id(cursor, [sale["client_id"] for sale in to_insert])
+
+            self._insert_sale_lines(cursor, [
+                (sale_ids[sale["client_id"]], line) for sale in to_insert for line in sale["lines"]
+            ])
+            cursor.close()
+
+            stock_result = self.stock_service.apply_movements([
+                {
+                    "product_id": line["product_id"],
+                    "movement_type": "salida",
+                    "quantity": line["quantity"],
+                    "user_id": sale["user_id"],
+                    "notes": f"Venta #{sale_ids[sale['client_id']]}"
+                }
+                for sale in to_insert for line in sale["lines"]
+            ], allow_negative=allow_negative_stock)
+            if stock_result != "OK":
+                raise Exception(f"Error stock: {stock_result}")
+
+            for sale in to_insert:
+                sale_id = sale_ids[sale["client_id"]]
+                if not sale["ticket_url"]:
+                    self.db.on_commit(lambda sale_id=sale_id: self.ticket_pipeline.submit(sale_id))
+                self.events.publish_after_commit("sale_created", Sale(
+                    id=sale_id,
+                    sale_date=sale["sale_date"],
+                    total_amount=sale["total_amount"],
+                    payment_method=sale["payment_method"],
+                    ticket_url=sale["ticket_url"],
+                    invoice_state=sale["invoice_state"],
+                    client_id=sale["client_id"]
+                ).to_dict())
+
+        for sale in to_insert:
+            results[sale["index"]] = self._bulk_result(
+                sale["client_id"], "created", sale_id=sale_ids[sale["client_id"]])
+
+    def _find_sale_ids_by_client_id(self, cursor, client_ids):
+        if not client_ids:
+            return {}
+        placeholders = ", ".join(["%s"] * len(client_ids))
+        cursor.execute(f"SELECT id, client_id FROM sales WHERE client_id IN ({placeholders})", tuple(client_ids))
+        return {row["client_id"]: row["id"] for row in cursor.fetchall()}
+
+    def _bulk_result(self, client_id, status, sale_id=None, message=None):
+        result = {"client_id": client_id, "status": status, "sale_id": sale_id}
+        if message:
+            result["message"] = message
+        return result
 
     def get_sale_by_id(self, sale_id):
         query = "SELECT * FROM sales WHERE id = %s"
@@ -130,21 +399,81 @@ class SaleService:
             print(f"Error al obtener venta {sale_id}: {e}")
             return None
             
-    def get_all_sales(self):
-        query = "SELECT * FROM sales ORDER BY sale_date DESC"
-        try:
-            cursor = self.db.execute(query)
-            results = cursor.fetchall()
-            cursor.close()
-            return [Sale.from_dict(row) for row in results]
-        except Exception as e:
-            print(f"Error al obtener ventas: {e}")
-            return []
-    
+    def get_sales_page(self, limit=50, cursor=None, date_from=None, date_to=None,
+                       payment_method=None, invoice_state=None):
+        """
+        Listado paginado por keyset sobre (sale_date, id), del más reciente al más antiguo.
+        Cada página es un rango del índice de fecha, así el costo no depende del tamaño
+        de la tabla. Devuelve (ventas, next_cursor); next_cursor es None en la última página.
+        date_from/date_to son fechas inclusivas (date).
+        """
+        limit = max(1, min(int(limit), self.MAX_PAGE_SIZE))
+        conditions = []
+        params = []
+
+        if date_from:
+            conditions.append("sale_date >= %s")
+            params.append(date_from)
+        if date_to:
+            conditions.append("sale_date < %s")
+            params.append(day_range(date_to)[1])
+        if payment_method:
+            conditions.append("payment_method = %s")
+            params.append(payment_method)
+        if invoice_state:
+            conditions.append("invoice_state = %s")
+            params.append(invoice_state)
+        if cursor:
+            last_date, last_id = decode_cursor(cursor)
+            conditions.append("(sale_date < %s OR (sale_date = %s AND id < %s))")
+            params.extend([last_date, last_date, last_id])
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f"""
+        SELECT * FROM sales
+        {where}
+        ORDER BY sale_date DESC, id DESC
+        LIMIT %s
+        """
+        # Se pide una fila de más para saber si hay otra página sin hacer un COUNT
+        params.append(limit + 1)
+
+        cursor_db = self.db.execute(query, tuple(params))
+        rows = cursor_db.fetchall()
+        cursor_db.close()
+
+        has_more = len(rows) > limit
+        sales = [Sale.from_dict(row) for row in rows[:limit]]
+        next_cursor = encode_cursor(sales[-1].sale_date, sales[-1].id) if has_more else None
+        return sales, next_cursor
+
+    def export_sales(self, date_from=None, date_to=None, batch_size=1000):
+        """
+        Genera todas las ventas (filas dict) en lotes, de la más antigua a la más nueva,
+        sin cargar el resultado completo en memoria. date_from/date_to son fechas inclusivas.
+        """
+        conditions = []
+        params = []
+        if date_from:
+            conditions.append("sale_date >= %s")
+            params.append(date_from)
+        if date_to:
+            conditions.append("sale_date < %s")
+            params.append(day_range(date_to)[1])
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f"""
+        SELECT id, sale_date, total_amount, payment_method, invoice_state, ticket_url, client_id
+        FROM sales
+        {where}
+        ORDER BY sale_date, id
+        """
+        return self.db.stream(query, tuple(params), batch_size=batch_size)
+
     def get_sales_by_date(self, date):
-        query = "SELECT * FROM sales WHERE DATE(sale_date) = %s ORDER BY sale_date DESC"
+        query = "SELECT * FROM sales WHERE sale_date >= %s AND sale_date < %s ORDER BY sale_date DESC"
         try:
-            cursor = self.db.execute(query, (date,))
+            cursor = self.db.execute(query, day_range(date))
             results = cursor.fetchall()
             cursor.close()
             return [Sale.from_dict(row) for row in results]
@@ -163,11 +492,11 @@ class SaleService:
             COALESCE(SUM(total_amount), 0) as total_revenue,
             COALESCE(AVG(total_amount), 0) as average_sale
         FROM sales 
-        WHERE DATE(sale_date) = %s 
+        WHERE sale_date >= %s AND sale_date < %s
         AND total_amount > 0
         """
         try:
-            cursor = self.db.execute(query, (date,))
+            cursor = self.db.execute(query, day_range(date))
             if cursor:
                 result = cursor.fetchone()
                 cursor.close()
@@ -184,15 +513,58 @@ class SaleService:
             return {'date': str(date), 'total_sales': 0, 'total_revenue': 0.0, 'average_sale': 0.0}
 
     def get_sale_with_products(self, sale_id):
-        sale = self.get_sale_by_id(sale_id)
-        if sale:
-            products = self.get_products_by_sale_id(sale_id)
-            return {
-                "sale": sale.to_dict(),
-                "products": [p.to_dict() for p in products],
-                "total_items": sum(p.quantity for p in products)
-            }
-        return None
+        sales = self.get_sales_with_products([sale_id])
+        return sales[0] if sales else None
+
+    def get_sales_with_products(self, sale_ids):
+        """
+        Ventas completas (venta + líneas con nombre y código de barras del producto)
+        en una sola consulta, en el orden de sale_ids. Las que no existen se omiten.
+        """
+        sale_ids = list(dict.fromkeys(int(sale_id) for sale_id in sale_ids))
+        if not sale_ids:
+            return []
+
+        placeholders = ", ".join(["%s"] * len(sale_ids))
+        query = f"""
+        SELECT s.*, sp.sale_id AS line_sale_id, sp.product_id, sp.quantity, sp.unit_price,
+            p.name AS product_name, p.barcode AS product_barcode
+        FROM sales s
+        LEFT JOIN sale_product sp ON sp.sale_id = s.id
+        LEFT JOIN products p ON p.id = sp.product_id
+        WHERE s.id IN ({placeholders})
+        ORDER BY s.id, sp.product_id
+        """
+        cursor = self.db.execute(query, tuple(sale_ids))
+        rows = cursor.fetchall()
+        cursor.close()
+
+        complete = {}
+        for row in rows:
+            entry = complete.get(row["id"])
+            if entry is None:
+                entry = complete[row["id"]] = {
+                    "sale": Sale.from_dict(row).to_dict(),
+                    "products": [],
+                    "total_items": 0
+                }
+            if row["line_sale_id"] is None:
+                continue  # venta sin líneas (LEFT JOIN)
+
+            # sale_product no tiene id propio: la línea se identifica por (sale_id, product_id)
+            line = SaleProduct(
+                id=None,
+                sale_id=row["id"],
+                product_id=row["product_id"],
+                quantity=row["quantity"],
+                unit_price=row["unit_price"]
+            ).to_dict()
+            line["product_name"] = row["product_name"]
+            line["barcode"] = row["product_barcode"]
+            entry["products"].append(line)
+            entry["total_items"] += row["quantity"]
+
+        return [complete[sale_id] for sale_id in sale_ids if sale_id in complete]
     
     def get_products_by_sale_id(self, sale_id):
         query = "SELECT * FROM sale_product WHERE sale_id = %s"
@@ -222,38 +594,59 @@ class SaleService:
             return None
 
     def delete_sale(self, sale_id):
-        with db_lock:
-            connection = self.db.get_connection()
-            cursor = connection.cursor()
-            try:
-                connection.start_transaction()
-                
-                products_query = "SELECT product_id, quantity FROM sale_product WHERE sale_id = %s"
-                cursor.execute(products_query, (sale_id,))
-                products = cursor.fetchall()
-                
-                for row in products:
-                    pid = row['product_id'] if isinstance(row, dict) else row[0]
-                    qty = row['quantity'] if isinstance(row, dict) else row[1]
-
-                    self.stock_service.add_stock(
-                        product_id=pid,
-                        quantity=qty,
-                        user_id=None,  
-                        provider_id=None,
-                        notes=f"Devolución por eliminación de venta #{sale_id}"
-                    )
-                
-                delete_query = "DELETE FROM sales WHERE id = %s"
-                cursor.execute(delete_query, (sale_id,))
-                
-                success = cursor.rowcount > 0
-                connection.commit()
-                return success
-                
-            except Exception as e:
-                connection.rollback()
-                print(f"Error al eliminar venta {sale_id}: {e}")
-                return False
-            finally:
-                cursor.close()
\ No newline at end of file
+        try:
+            deleted, _ = self.delete_sales([sale_id])
+            return bool(deleted)
+        except Exception as e:
+            print(f"Error al eliminar venta {sale_id}: {e}")
+            return False
+
+    def delete_sales(self, sale_ids):
+        """
+        Anula ventas y devuelve su stock en una sola transacción, con una cantidad fija de
+        sentencias sin importar ventas ni líneas: bloqueo de las ventas, lectura de sus líneas,
+        un UPDATE de stock en bloque con sus movimientos 'devolucion' y un DELETE.
+        Si algo falla no se anula ninguna. Devuelve (ids eliminados, ids inexistentes).
+        """
+        sale_ids = sorted({int(sale_id) for sale_id in sale_ids})
+        if not sale_ids:
+            return [], []
+
+        with self.db.transaction() as connection:
+            cursor = connection.cursor(dictionary=True)
+            placeholders = ", ".join(["%s"] * len(sale_ids))
+
+            # Bloquear las ventas: dos anulaciones simultáneas no pueden devolver el stock dos veces
+            cursor.execute(
+                f"SELECT id FROM sales WHERE id IN ({placeholders}) ORDER BY id FOR UPDATE", tuple(sale_ids))
+            found = [row["id"] for row in cursor.fetchall()]
+            missing = sorted(set(sale_ids) - set(found))
+            if not found:
+                cursor.close()
+                return [], missing
+
+            placeholders = ", ".join(["%s"] * len(found))
+            cursor.execute(
+                f"SELECT sale_id, product_id, quantity FROM sale_product WHERE sale_id IN ({placeholders})",
+                tuple(found))
+            lines = cursor.fetchall()
+
+            stock_result = self.stock_service.apply_movements([
+                {
+                    "product_id": line["product_id"],
+                    "movement_type": "devolucion",
+                    "quantity": line["quantity"],
+                    "notes": f"Devolución por eliminación de venta #{line['sale_id']}"
+                }
+                for line in lines
+            ])
+            if stock_result != "OK":
+                raise Exception(f"Error stock: {stock_result}")
+
+            cursor.execute(f"DELETE FROM sales WHERE id IN ({placeholders})", tuple(found))
+            cursor.close()
+
+            for sale_id in found:
+                self.events.publish_after_commit("sale_deleted", {"id": sale_id})
+
+        return found, missing
@@ -0,0 +1,13 @@
+from flask import Blueprint, jsonify
+from src.tickets.services.ticket_pipeline import TicketPipeline
+
+tickets_bp = Blueprint('tickets', __name__, url_prefix='/api/tickets')
+ticket_pipeline = TicketPipeline()
+
+@tickets_bp.route('/metrics', methods=['GET'])
+def get_ticket_metrics():
+    """Estado de la cola de generación de tickets"""
+    return jsonify({
+        'success': True,
+        'metrics': ticket_pipeline.metrics()
+    }), 200
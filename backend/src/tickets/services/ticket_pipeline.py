@@ -0,0 +1,129 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import os
+import threading
+import time
+
+from src.db import Database
+from src.minio_storage.minio_service import MinioClient
+from src.tickets.services.tickets.crear_ticket_reportlab import generar_ticket
+
+
+class TicketPipeline:
+    """
+    Cola en proceso que genera el PDF del ticket de cada venta y lo sube a MinIO, fuera
+    del request de la venta. Singleton: mientras no se llame a start() (por ejemplo en
+    tests), submit() no hace nada.
+    """
+    _instance = None
+    LATENCY_WINDOW = 1000  # últimos tickets considerados para las métricas de latencia
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super(TicketPipeline, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, "initialized"):
+            self.executor = None
+            self.sale_service = None
+            self._lock = threading.Lock()
+            self.queued = 0
+            self.in_progress = 0
+            self.processed = 0
+            self.failed = 0
+            self._wait_times = deque(maxlen=self.LATENCY_WINDOW)
+            self._total_times = deque(maxlen=self.LATENCY_WINDOW)
+            self.initialized = True
+
+    def start(self, sale_service, workers=None):
+        if self.executor is not None:
+            return
+        workers = workers or int(os.getenv("TICKET_WORKERS", 2))
+        self.sale_service = sale_service
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tickets")
+        print(f"Pipeline de tickets iniciado ({workers} workers)")
+
+    def shutdown(self, wait=True):
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait)
+            self.executor = None
+
+    def submit(self, sale_id):
+        """Encola la generación del ticket de una venta ya confirmada."""
+        if self.executor is None:
+            return False
+        with self._lock:
+            self.queued += 1
+        self.executor.submit(self._process, sale_id, time.monotonic())
+        return True
+
+    def _process(self, sale_id, enqueued_at):
+        started_at = time.monotonic()
+        with self._lock:
+            self.queued -= 1
+            self.in_progress += 1
+
+        ok = False
+        try:
+            ok = self._generate_and_upload(sale_id)
+        except Exception as e:
+            print(f"Error generando ticket de la venta {sale_id}: {e}")
+        finally:
+            # El worker usa su propia conexión del pool: devolverla en cada ticket
+            Database().release_connection()
+            finished_at = time.monotonic()
+            with self._lock:
+                self.in_progress -= 1
+                if ok:
+                    self.processed += 1
+                else:
+                    self.failed += 1
+                self._wait_times.append(started_at - enqueued_at)
+                self._total_times.append(finished_at - enqueued_at)
+
+    def _generate_and_upload(self, sale_id):
+        complete = self.sale_service.get_sale_with_products(sale_id)
+        if complete is None:
+            print(f"Ticket omitido: la venta {sale_id} no existe")
+            return False
+
+        sale = complete["sale"]
+        sale_date = sale["sale_date"]
+        pdf = generar_ticket(
+            nro_ticket=str(sale_id),
+            fecha_hora=sale_date.strftime("%d/%m/%Y %H:%M:%S") if hasattr(sale_date, "strftime") else str(sale_date),
+            lista_productos=[
+                (line["product_name"] or f"Producto {line['product_id']}", line["quantity"], line["unit_price"])
+                for line in complete["products"]
+            ],
+            total=sale["total_amount"]
+        )
+        # ticket_url guarda el nombre del objeto: la URL prefirmada se arma al pedir el ticket
+        nombre = MinioClient.guardar_ticket(f"ticket_{sale_id}.pdf", pdf)
+        return self.sale_service.update_sale_status(sale_id, ticket_url=nombre) is not None
+
+    def metrics(self):
+        """Profundidad de la cola, contadores y latencias (segundos) de los últimos tickets."""
+        with self._lock:
+            wait_times = sorted(self._wait_times)
+            total_times = sorted(self._total_times)
+            return {
+                "running": self.executor is not None,
+                "queue_depth": self.queued,
+                "in_progress": self.in_progress,
+                "processed": self.processed,
+                "failed": self.failed,
+                "wait_seconds": _percentiles(wait_times),
+                "latency_seconds": _percentiles(total_times)
+            }
+
+
+def _percentiles(values):
+    if not values:
+        return {"p50": None, "p95": None, "max": None}
+    return {
+        "p50": round(values[len(values) // 2], 4),
+        "p95": round(values[min(len(values) - 1, int(len(values) * 0.95))], 4),
+        "max": round(values[-1], 4)
+    }
@@ -1,44 +1,39 @@
-import os
-import time
+import io
 from reportlab.lib.pagesizes import mm
 from reportlab.pdfgen import canvas
 from reportlab.graphics.barcode import code128
 
-def generar_ticket(lista_productos: list[tuple[str, float]]) -> str:
-    # Crear carpeta si no existe
-    output_dir = "tickets_pdf/"
-    os.makedirs(output_dir, exist_ok=True)
+NOMBRE_COMERCIO = "Kiosco Don Pepe"
+ALTO_LINEA = 5*mm
 
-    # Generar número de ticket único basado en timestamp
-    nro_ticket = str(int(time.time() * 1000))
 
-    # Nombre del archivo basado en el nro_ticket
-    nombre_archivo = f"{output_dir}ticket{nro_ticket}.pdf"
-
-    # Obtener fecha y hora actuales
-    fecha_hora = time.strftime("%d/%m/%Y %H:%M:%S")
-
-    c = canvas.Canvas(nombre_archivo, pagesize=(80*mm, 120*mm))
+def generar_ticket(nro_ticket: str, fecha_hora: str, lista_productos: list[tuple[str, int, float]], total: float) -> bytes:
+    """
+    Renderiza el ticket en memoria y devuelve el PDF en bytes (no toca el disco).
+    lista_productos: (nombre, cantidad, precio_unitario) por línea.
+    """
+    # El alto de la página crece con la cantidad de líneas
+    alto = max(120*mm, 75*mm + len(lista_productos) * ALTO_LINEA)
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=(80*mm, alto))
 
     # Encabezado
+    y = alto - 10*mm
     c.setFont("Helvetica-Bold", 14)
-    c.drawString(10*mm, 110*mm, "Kiosco Don Pepe")
+    c.drawString(10*mm, y, NOMBRE_COMERCIO)
     c.setFont("Helvetica", 10)
-    c.drawString(10*mm, 100*mm, f"Ticket N°: {nro_ticket}")
-    c.drawString(10*mm, 95*mm, f"Fecha/Hora: {fecha_hora}")
+    c.drawString(10*mm, y - 10*mm, f"Ticket N°: {nro_ticket}")
+    c.drawString(10*mm, y - 15*mm, f"Fecha/Hora: {fecha_hora}")
 
-    # Posición inicial para productos
-    y = 90*mm
-    total = 0
-
-    for producto, precio in lista_productos:
-        c.drawString(10*mm, y, f"{producto}: ${precio:.2f}")
-        total += precio
-        y -= 5*mm  # bajar línea para siguiente producto
+    # Productos
+    y -= 20*mm
+    for producto, cantidad, precio in lista_productos:
+        c.drawString(10*mm, y, f"{cantidad} x {producto}: ${cantidad * precio:.2f}")
+        y -= ALTO_LINEA  # bajar línea para siguiente producto
 
     # Total
     c.setFont("Helvetica-Bold", 10)
-    c.drawString(10*mm, y-5*mm, f"Total: ${total:.2f}")
+    c.drawString(10*mm, y - 5*mm, f"Total: ${total:.2f}")
 
     # Código de barras 1D
     barcode = code128.Code128(nro_ticket, barHeight=15*mm, barWidth=0.5)
@@ -51,9 +46,4 @@ def generar_ticket(lista_productos: list[tuple[str, float]]) -> str:
     c.showPage()
     c.save()
 
-    return nro_ticket  # para guardar en DB o mostrar
-
-# Ejemplo de uso
-productos = [("Coca Cola 500ml", 850.00), ("Chips", 450.00), ("Agua 600ml", 300.00)]
-ticket_id = generar_ticket(productos)
-print("Ticket generado con N°:", ticket_id)
+    return buffer.getvalue()
@@ -4,7 +4,10 @@ sys.path.insert(0, "/app")  # Apunta al código montado en /app
 from src.app import create_app
 
 @pytest.fixture
-def client():
-    app = create_app(testing=True)
+def app():
+    return create_app(testing=True)
+
+@pytest.fixture
+def client(app):
     with app.test_client() as client:
-        yield client
\ No newline at end of file
+        yield client
@@ -0,0 +1,29 @@
+import json
+
+BASE_PATH = "/api/events"
+
+
+def _next_event(stream):
+    chunk = next(stream).decode("utf-8")
+    fields = dict(line.split(": ", 1) for line in chunk.strip().splitlines() if not line.startswith(":"))
+    return fields.get("event"), json.loads(fields["data"]) if "data" in fields else None
+
+
+def test_events_stream_publishes_sale_created(client):
+    response = client.get(f"{BASE_PATH}?types=sale_created", buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    stream = iter(response.response)
+    assert next(stream).startswith(b"retry:")
+
+    body = {"products": [{"product_id": 1, "quantity": 1, "unit_price": 19.99}]}
+    sale_id = client.post("/api/sales/", json=body).json["sale"]["id"]
+
+    event, data = _next_event(stream)
+    assert event == "sale_created"
+    assert data["id"] == sale_id
+    response.close()
+
+
+def test_events_stream_rejects_unknown_types(client):
+    assert client.get(f"{BASE_PATH}?types=sale_created,otro").status_code == 400
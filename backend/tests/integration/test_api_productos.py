@@ -1,4 +1,11 @@
+import io
+
 import pytest
+from PIL import Image
+
+from src.products.services.catalog_cache import CatalogCache
+from src.products.services.image_pipeline import ImagePipeline, LocalImageStorage
+from src.products.services.products_service import ProductoService
 
 def test_get_products(client):
     response = client.get("/api/productos/")
@@ -47,3 +54,239 @@ def test_delete_product(client):
     assert response.status_code == 200
     assert response.json["message"] == "Producto eliminado"
 
+
+def test_catalogo_en_memoria_refleja_cambios(client):
+    body = {"name": "Producto Cache", "barcode": "7790000000016", "price": 10.0,
+            "stock": 5, "url_image": "", "category": "Test"}
+    product_id = client.post("/api/productos/", json=body).json["id"]
+
+    response = client.put(f"/api/productos/{product_id}", json={"price": 12.5})
+    assert response.status_code == 200
+    assert float(client.get(f"/api/productos/{product_id}").json["price"]) == 12.5
+
+    client.post(f"/api/productos/{product_id}/stock", json={"quantity": 3})
+    assert client.get(f"/api/productos/{product_id}").json["stock"] == 8
+
+    # Con el stock en memoria atrasado, la venta se confirma contra la base antes de rechazarla
+    CatalogCache().apply_stock_deltas({product_id: -8})
+    response = client.post("/api/sales/", json={
+        "payment_method": "efectivo",
+        "products": [{"product_id": product_id, "quantity": 8, "unit_price": 12.5}]
+    })
+    assert response.status_code == 201
+
+    client.delete(f"/api/sales/{response.json['sale']['id']}")
+    assert client.delete(f"/api/productos/{product_id}").status_code == 200
+    assert client.get(f"/api/productos/{product_id}").status_code == 404
+
+def test_catalogo_en_memoria_conserva_parches_al_recargar(client, monkeypatch):
+    body = {"name": "Producto Recarga", "barcode": "7790000000092", "price": 10.0,
+            "stock": 5, "url_image": "", "category": "Test"}
+    product_id = client.post("/api/productos/", json=body).json["id"]
+    cache = CatalogCache()
+    updated_at = cache.get(product_id).updated_at
+    cache.apply_stock_deltas({product_id: -1})
+    assert cache.get(product_id).updated_at == updated_at
+
+    # Una baja que se parchea mientras la recarga ya leyó la fila no debe revivir el producto
+    execute = cache.db.execute
+    def execute_y_parchear(query, params=None):
+        cursor = execute(query, params)
+        cache.remove(product_id)
+        return cursor
+    monkeypatch.setattr(cache.db, "execute", execute_y_parchear)
+    cache.load()
+    monkeypatch.undo()
+    assert cache.get(product_id) is None
+    assert cache.get_by_barcode("7790000000092") is None
+
+    cache.load()
+    assert cache.get(product_id).stock == 5
+    client.delete(f"/api/productos/{product_id}")
+
+def test_obtener_producto_por_codigo(client):
+    response = client.get("/api/productos/barcode/253457892345")
+    assert response.status_code == 200
+    assert response.json["name"] == "Producto A"
+
+    assert client.get("/api/productos/barcode/0000000000000").status_code == 404
+
+def test_buscar_varios_codigos(client):
+    response = client.post("/api/productos/barcode/lookup", json={
+        "barcodes": ["724385270352", "0000000000000", "253457892345"]
+    })
+    assert response.status_code == 200
+    assert [p["name"] for p in response.json["products"]] == ["Producto B", "Producto A"]
+    assert response.json["not_found"] == ["0000000000000"]
+
+    assert client.post("/api/productos/barcode/lookup", json={"barcodes": []}).status_code == 400
+
+def test_codigo_fuera_del_catalogo_en_memoria(client):
+    # Un producto que el catálogo en memoria no tiene se resuelve desde la base
+    CatalogCache().remove(3)
+    response = client.get("/api/productos/barcode/389543207459")
+    assert response.status_code == 200
+    assert response.json["id"] == 3
+    assert CatalogCache().get_by_barcode("389543207459") is not None
+
+def test_buscar_productos(client):
+    response = client.get("/api/productos/search?q=producto")
+    assert response.status_code == 200
+    assert {"Producto A", "Producto B", "Producto C"} <= {p["name"] for p in response.json}
+
+    response = client.get("/api/productos/search?q=alimentos")
+    assert [p["name"] for p in response.json] == ["Producto A"]
+
+    assert client.get("/api/productos/search").status_code == 400
+    assert client.get("/api/productos/search?q=a&limit=500").status_code == 400
+
+def test_buscar_productos_sin_acentos_y_al_dia(client):
+    body = {"name": "Jamón Crudo Búsqueda", "barcode": "7790000000023", "price": 10.0,
+            "stock": 5, "url_image": "", "category": "Fiambres"}
+    product_id = client.post("/api/productos/", json=body).json["id"]
+
+    for query in ["jamon crudo", "JAMÓN", "busq", "jamom", "jamn crudo"]:
+        response = client.get(f"/api/productos/search?q={query}")
+        assert response.json[0]["id"] == product_id, query
+    # A una letra de distancia sin ningún trigrama en común con la palabra
+    for query in ["crdo", "jmon crudo"]:
+        assert client.get(f"/api/productos/search?q={query}").json[0]["id"] == product_id, query
+    # Comienzo del código de barras
+    assert product_id in [p["id"] for p in client.get("/api/productos/search?q=779000000002").json]
+
+    client.put(f"/api/productos/{product_id}", json={"name": "Jamón Cocido Búsqueda"})
+    assert client.get("/api/productos/search?q=crudo").json == []
+    assert client.get("/api/productos/search?q=cocido").json[0]["id"] == product_id
+
+    client.delete(f"/api/productos/{product_id}")
+    assert client.get("/api/productos/search?q=jamon").json == []
+
+def test_obtener_productos_condicional(client, monkeypatch):
+    monkeypatch.setattr(ProductoService, "SETTLE_SECONDS", 0)
+    response = client.get("/api/productos/")
+    etag = response.headers["ETag"]
+    assert response.status_code == 200
+
+    response = client.get("/api/productos/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+
+    price = float(client.get("/api/productos/2").json["price"])
+    client.put("/api/productos/2", json={"price": price + 1})
+    response = client.get("/api/productos/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    client.put("/api/productos/2", json={"price": price})
+
+def test_obtener_cambios_del_catalogo(client, monkeypatch):
+    monkeypatch.setattr(ProductoService, "SETTLE_SECONDS", 0)
+    full = client.get("/api/productos/changes?since=0").json
+    assert {"Producto A", "Producto B", "Producto C"} <= {p["name"] for p in full["products"]}
+    version = full["version"]
+
+    price = float(client.get("/api/productos/3").json["price"])
+    client.put("/api/productos/3", json={"price": price + 1})
+    body = {"name": "Producto Borrado Sync", "barcode": "7790000000030", "price": 1.0,
+            "stock": 1, "url_image": "", "category": "Test"}
+    deleted_id = client.post("/api/productos/", json=body).json["id"]
+    client.delete(f"/api/productos/{deleted_id}")
+
+    changes = client.get(f"/api/productos/changes?since={version}").json
+    assert [p["id"] for p in changes["products"]] == [3]
+    assert changes["deleted"] == [deleted_id]
+    assert changes["version"] >= version
+
+    assert client.get("/api/productos/changes?since=abc").status_code == 400
+    client.put("/api/productos/3", json={"price": price})
+
+def test_importar_productos_csv(client):
+    data = (
+        "name,barcode,price,stock,category\n"
+        "Importado Uno,7790000000047,10.50,4,Importados\n"
+        "Importado Dos,,\"3,25\",,Importados\n"
+        "Importado Malo,7790000000054,abc,1,Importados\n"
+    )
+    response = client.post("/api/productos/import", data=data.encode("utf-8"), content_type="text/csv")
+    assert response.status_code == 200
+    assert response.json["processed"] == 3
+    assert response.json["upserted"] == 2
+    assert response.json["errors"] == [{"row": 4, "error": "price inválido: 'abc'"}]
+
+    # Reimportar actualiza por nombre o código de barras sin tocar el stock
+    response = client.post("/api/productos/import", json=[
+        {"name": "Importado Uno", "barcode": "7790000000047", "price": 12, "stock": 99}
+    ])
+    assert response.json["upserted"] == 1
+    product = client.get("/api/productos/barcode/7790000000047").json
+    assert float(product["price"]) == 12
+    assert product["stock"] == 4
+
+    for name in ["Importado Uno", "Importado Dos"]:
+        product_id = client.get(f"/api/productos/search?q={name}").json[0]["id"]
+        client.delete(f"/api/productos/{product_id}")
+
+def test_actualizar_precios_en_bloque(client):
+    price = float(client.get("/api/productos/3").json["price"])  # Producto C, categoría Bebidas
+
+    response = client.post("/api/productos/prices/bulk", json={"category": "Bebidas", "amount": 1.5})
+    assert response.status_code == 200
+    assert response.json["updated"] >= 1
+    assert float(client.get("/api/productos/3").json["price"]) == pytest.approx(price + 1.5)
+
+    client.post("/api/productos/prices/bulk", json={"category": "Bebidas", "amount": -1.5})
+    assert float(client.get("/api/productos/3").json["price"]) == pytest.approx(price)
+
+    assert client.post("/api/productos/prices/bulk", json={"percentage": 10}).status_code == 400
+    assert client.post("/api/productos/prices/bulk",
+                       json={"category": "Bebidas", "percentage": 10, "amount": 1}).status_code == 400
+
+@pytest.fixture
+def uploads(tmp_path, monkeypatch):
+    """Las imágenes subidas en los tests van a una carpeta temporal, no a la de uploads."""
+    images = ImagePipeline()
+    monkeypatch.setattr(images, "upload_folder", str(tmp_path))
+    monkeypatch.setattr(images, "uses_minio", False)
+    monkeypatch.setattr(images, "storage", LocalImageStorage(str(tmp_path)))
+    return tmp_path
+
+def _png_bytes(size=(1200, 800)):
+    buffer = io.BytesIO()
+    Image.new("RGBA", size, (200, 30, 30, 255)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+def test_subir_imagen_variantes_y_dedup(client, uploads):
+    data = _png_bytes()
+    response = client.post("/api/productos/upload-image", data={"image": (io.BytesIO(data), "foto.png")},
+                           content_type="multipart/form-data")
+    assert response.status_code == 200
+    assert response.json["deduplicated"] is False
+    assert response.json["url"].endswith("/medium.webp")
+    assert set(response.json["variants"]) == {"thumb", "medium", "large"}
+
+    thumb = client.get(response.json["variants"]["thumb"]["jpg"])
+    assert thumb.status_code == 200
+    assert max(Image.open(io.BytesIO(thumb.data)).size) == 160
+
+    again = client.post("/api/productos/upload-image", data={"image": (io.BytesIO(data), "copia.png")},
+                        content_type="multipart/form-data")
+    assert again.json["deduplicated"] is True
+    assert again.json["url"] == response.json["url"]
+    assert len(list(uploads.glob("*/original.png"))) == 1
+
+def test_imagenes_subidas_cacheables(client, uploads):
+    url = client.post("/api/productos/upload-image", data={"image": (io.BytesIO(_png_bytes((300, 200))), "f.png")},
+                      content_type="multipart/form-data").json["url"]
+    response = client.get(url)
+    assert response.status_code == 200
+    assert "immutable" in response.headers["Cache-Control"]
+    assert response.headers["ETag"]
+
+    assert client.get(url, headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+    partial = client.get(url, headers={"Range": "bytes=0-9"})
+    assert partial.status_code == 206
+    assert partial.data == response.data[:10]
+
+def test_subir_imagen_invalida(client, uploads):
+    response = client.post("/api/productos/upload-image", data={"image": (io.BytesIO(b"no es imagen"), "x.jpg")},
+                           content_type="multipart/form-data")
+    assert response.status_code == 400
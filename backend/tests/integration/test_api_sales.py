@@ -0,0 +1,227 @@
+import gzip
+import json
+import time
+
+import pytest
+
+from src.products.models.product import Product
+from src.sales.routes.sales_routes import sale_service
+
+BASE_PATH = "/api/sales"
+
+
+def _get_stock(client, product_id):
+    response = client.get(f"/api/productos/{product_id}")
+    assert response.status_code == 200
+    return response.json["stock"]
+
+
+def test_create_sale_ok(client):
+    stock_before = _get_stock(client, 1)
+    body = {
+        "payment_method": "efectivo",
+        "products": [{"product_id": 1, "quantity": 2, "unit_price": 19.99}]
+    }
+    response = client.post(f"{BASE_PATH}/", json=body)
+
+    assert response.status_code == 201
+    assert response.json["success"] is True
+    assert response.json["sale"]["total_amount"] == pytest.approx(39.98)
+    assert _get_stock(client, 1) == stock_before - 2
+
+
+def test_create_sale_rollback_on_error(client):
+    # El segundo producto no existe: la venta entera debe deshacerse
+    stock_before = _get_stock(client, 1)
+    body = {
+        "payment_method": "efectivo",
+        "products": [
+            {"product_id": 1, "quantity": 1, "unit_price": 19.99},
+            {"product_id": 9999, "quantity": 1, "unit_price": 10.00}
+        ]
+    }
+    response = client.post(f"{BASE_PATH}/", json=body)
+
+    assert response.status_code == 500
+    assert response.json["success"] is False
+    assert _get_stock(client, 1) == stock_before
+
+
+def test_delete_sale_restores_stock(client):
+    stock_before = _get_stock(client, 2)
+    body = {"products": [{"product_id": 2, "quantity": 3, "unit_price": 29.99}]}
+    sale_id = client.post(f"{BASE_PATH}/", json=body).json["sale"]["id"]
+    assert _get_stock(client, 2) == stock_before - 3
+
+    response = client.delete(f"{BASE_PATH}/{sale_id}")
+
+    assert response.status_code == 200
+    assert _get_stock(client, 2) == stock_before
+    assert client.get(f"{BASE_PATH}/{sale_id}").status_code == 404
+
+
+def test_bulk_sales_per_sale_results(client):
+    suffix = str(int(time.time() * 1000))
+    stock_before = _get_stock(client, 3)
+    sales = [
+        {"client_id": f"caja1-{suffix}-1", "payment_method": "efectivo",
+         "products": [{"product_id": 3, "quantity": 1, "unit_price": 19.99}]},
+        {"client_id": f"caja1-{suffix}-2", "sale_date": "2025-01-15T10:30:00",
+         "products": [{"product_id": 3, "quantity": 2, "unit_price": 19.99}]},
+        {"client_id": f"caja1-{suffix}-3",
+         "products": [{"product_id": 9999, "quantity": 1, "unit_price": 1.00}]}
+    ]
+    response = client.post(f"{BASE_PATH}/bulk", json={"sales": sales})
+
+    assert response.status_code == 200
+    statuses = [r["status"] for r in response.json["results"]]
+    assert statuses == ["created", "created", "error"]
+    assert _get_stock(client, 3) == stock_before - 3
+
+    # Reenviar la misma cola no duplica ventas ni descuenta stock otra vez
+    response = client.post(f"{BASE_PATH}/bulk", json={"sales": sales[:2]})
+    assert [r["status"] for r in response.json["results"]] == ["duplicate", "duplicate"]
+    assert _get_stock(client, 3) == stock_before - 3
+
+
+def test_bulk_sales_producto_eliminado_antes_del_lock(client, monkeypatch):
+    # El producto 999998 pasa la validación pero ya no está al bloquear las filas
+    get_products_by_ids = sale_service.product_service.get_products_by_ids
+    monkeypatch.setattr(sale_service.product_service, "get_products_by_ids", lambda ids, **kwargs: {
+        **get_products_by_ids(ids, **kwargs),
+        999998: Product(id=999998, name="Eliminado", price=1, stock=10)
+    })
+    suffix = str(int(time.time() * 1000))
+    stock_before = _get_stock(client, 3)
+    sales = [
+        {"client_id": f"caja2-{suffix}-1",
+         "products": [{"product_id": 999998, "quantity": 1, "unit_price": 1.00}]},
+        {"client_id": f"caja2-{suffix}-2",
+         "products": [{"product_id": 3, "quantity": 1, "unit_price": 19.99}]}
+    ]
+    response = client.post(f"{BASE_PATH}/bulk", json={"sales": sales})
+
+    assert response.status_code == 200
+    results = response.json["results"]
+    assert [r["status"] for r in results] == ["error", "created"]
+    assert results[0]["message"] == "Producto 999998 no encontrado"
+    assert _get_stock(client, 3) == stock_before - 1
+
+
+def test_bulk_sales_requires_list(client):
+    response = client.post(f"{BASE_PATH}/bulk", json={"sales": []})
+    assert response.status_code == 400
+
+
+def test_create_sale_idempotency_key_replays(client):
+    stock_before = _get_stock(client, 1)
+    key = f"test-{time.time()}"
+    body = {"products": [{"product_id": 1, "quantity": 1, "unit_price": 19.99}]}
+
+    first = client.post(f"{BASE_PATH}/", json=body, headers={"Idempotency-Key": key})
+    retry = client.post(f"{BASE_PATH}/", json=body, headers={"Idempotency-Key": key})
+
+    assert first.status_code == 201
+    assert retry.status_code == 201
+    assert retry.headers.get("Idempotent-Replayed") == "true"
+    assert retry.json["sale"] == first.json["sale"]
+    assert _get_stock(client, 1) == stock_before - 1
+
+
+def test_list_sales_keyset_pagination(client):
+    first_page = client.get(f"{BASE_PATH}/?limit=2")
+    assert first_page.status_code == 200
+    assert len(first_page.json["sales"]) == 2
+    cursor = first_page.json["next_cursor"]
+    assert cursor
+
+    second_page = client.get(f"{BASE_PATH}/?limit=2&cursor={cursor}")
+    assert second_page.status_code == 200
+    first_ids = {s["id"] for s in first_page.json["sales"]}
+    assert first_ids.isdisjoint({s["id"] for s in second_page.json["sales"]})
+
+
+def test_list_sales_filters(client):
+    response = client.get(f"{BASE_PATH}/?invoice_state=facturado&limit=500")
+    assert response.status_code == 200
+    assert all(s["invoice_state"] == "facturado" for s in response.json["sales"])
+
+
+def test_list_sales_invalid_cursor(client):
+    response = client.get(f"{BASE_PATH}/?cursor=no-es-un-cursor")
+    assert response.status_code == 400
+
+
+def test_sale_complete_includes_product_names(client):
+    body = {"products": [{"product_id": 1, "quantity": 2, "unit_price": 19.99}]}
+    sale_id = client.post(f"{BASE_PATH}/", json=body).json["sale"]["id"]
+
+    response = client.get(f"{BASE_PATH}/{sale_id}/complete")
+
+    assert response.status_code == 200
+    data = response.json["data"]
+    assert data["sale"]["id"] == sale_id
+    assert data["total_items"] == 2
+    assert data["products"][0]["product_name"]
+    assert "barcode" in data["products"][0]
+    assert (data["products"][0]["sale_id"], data["products"][0]["product_id"]) == (sale_id, 1)
+
+
+def test_sales_complete_batch(client):
+    body = {"products": [{"product_id": 2, "quantity": 1, "unit_price": 29.99}]}
+    first = client.post(f"{BASE_PATH}/", json=body).json["sale"]["id"]
+    second = client.post(f"{BASE_PATH}/", json=body).json["sale"]["id"]
+
+    response = client.get(f"{BASE_PATH}/complete?ids={second},{first},999999")
+
+    assert response.status_code == 200
+    assert [entry["sale"]["id"] for entry in response.json["data"]] == [second, first]
+    assert response.json["not_found"] == [999999]
+
+
+def test_sales_complete_batch_invalid_ids(client):
+    assert client.get(f"{BASE_PATH}/complete").status_code == 400
+    assert client.get(f"{BASE_PATH}/complete?ids=1,abc").status_code == 400
+
+
+def test_export_sales_csv(client):
+    response = client.get(f"{BASE_PATH}/export?format=csv")
+
+    assert response.status_code == 200
+    lines = response.data.decode("utf-8").splitlines()
+    assert lines[0].startswith("id,sale_date,total_amount")
+    assert len(lines) > 1
+
+
+def test_export_sales_ndjson_gzip(client):
+    response = client.get(f"{BASE_PATH}/export?format=ndjson&gzip=true")
+
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in gzip.decompress(response.data).splitlines()]
+    assert rows and all("total_amount" in row for row in rows)
+
+
+def test_export_sales_invalid_format(client):
+    assert client.get(f"{BASE_PATH}/export?format=xml").status_code == 400
+
+
+def test_bulk_delete_sales_restores_stock(client):
+    stock_before = _get_stock(client, 2)
+    body = {"products": [{"product_id": 2, "quantity": 1, "unit_price": 29.99}]}
+    ids = [client.post(f"{BASE_PATH}/", json=body).json["sale"]["id"] for _ in range(3)]
+    assert _get_stock(client, 2) == stock_before - 3
+
+    response = client.delete(f"{BASE_PATH}/bulk", json={"ids": ids + [999999]})
+
+    assert response.status_code == 200
+    assert response.json["deleted"] == sorted(ids)
+    assert response.json["not_found"] == [999999]
+    assert _get_stock(client, 2) == stock_before
+
+    movements = client.get("/api/productos/2/stock").json
+    assert any(m["movement_type"] == "devolucion" for m in movements)
+
+
+def test_bulk_delete_sales_requires_ids(client):
+    assert client.delete(f"{BASE_PATH}/bulk", json={"ids": []}).status_code == 400
+    assert client.delete(f"{BASE_PATH}/bulk", json={"ids": ["a"]}).status_code == 400
@@ -0,0 +1,72 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.db import Database
+
+BASE_PATH = "/api/sales"
+INITIAL_STOCK = 10
+TOTAL_SALES = 40
+# Muy por debajo de innodb_lock_wait_timeout (50 s): una venta que esperara el lock no llega
+MAX_UNBLOCKED_SECONDS = 5
+
+
+@pytest.fixture
+def temp_product(client):
+    """Producto con stock limitado para vender desde varias cajas a la vez."""
+    unique_suffix = str(int(time.time() * 1000))
+    body = {
+        "name": f"Producto Concurrencia {unique_suffix}",
+        "barcode": f"CC{unique_suffix}",
+        "price": 10.00,
+        "stock": INITIAL_STOCK,
+        "url_image": "",
+        "category": "Test"
+    }
+    response = client.post("/api/productos/", json=body)
+    assert response.status_code == 201
+    product_id = response.json["id"]
+    yield product_id
+    client.delete(f"/api/productos/{product_id}")
+
+
+def _sell_one(app, product_id):
+    # Cada hilo usa su propio cliente: un request, una conexión del pool
+    with app.test_client() as client:
+        body = {"products": [{"product_id": product_id, "quantity": 1, "unit_price": 10.00}]}
+        return client.post(f"{BASE_PATH}/", json=body).status_code
+
+
+@pytest.mark.parametrize("workers", [1, 4, 8])
+def test_parallel_sales_never_oversell(app, client, temp_product, workers):
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        statuses = list(pool.map(lambda _: _sell_one(app, temp_product), range(TOTAL_SALES)))
+
+    assert statuses.count(201) == INITIAL_STOCK
+    assert statuses.count(500) == TOTAL_SALES - INITIAL_STOCK
+
+    response = client.get(f"/api/productos/{temp_product}")
+    assert response.json["stock"] == 0
+
+
+def test_parallel_sales_of_different_products_do_not_block(app, client):
+    # Sin candado global: con la fila del producto 1 tomada por otra transacción, la venta
+    # del producto 1 espera y la del producto 2 se confirma mientras tanto
+    db = Database()
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        with db.transaction() as connection:
+            cursor = connection.cursor()
+            cursor.execute("SELECT id FROM products WHERE id = 1 FOR UPDATE")
+            cursor.fetchall()
+            cursor.close()
+
+            blocked = pool.submit(_sell_one, app, 1)
+            time.sleep(0.5)  # que llegue a esperar el lock
+            start = time.perf_counter()
+            assert _sell_one(app, 2) == 201
+            assert time.perf_counter() - start < MAX_UNBLOCKED_SECONDS
+            assert not blocked.done()
+
+        assert blocked.result(timeout=MAX_UNBLOCKED_SECONDS) == 201
+    db.release_connection()
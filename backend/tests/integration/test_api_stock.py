@@ -1,5 +1,11 @@
+from datetime import date, timedelta
+
 import pytest
 
+from src.db import Database
+from src.products.services.reorder_engine import ReorderEngine
+from src.products.services.stock_snapshot_service import StockSnapshotService
+
 def test_add_stock_invalid_quantity(client):
     # Producto 1 existe en la DB de prueba
     body = {"quantity": 0}
@@ -45,3 +51,139 @@ def test_get_stock_movements_not_found(client):
 
     assert response.status_code == 404
     assert response.json["error"] == "Producto no encontrado"
+
+
+def test_get_stock_movements_paginado(client):
+    for quantity in (1, 2, 3):
+        client.post("/api/productos/2/stock", json={"quantity": quantity})
+
+    first = client.get("/api/productos/2/stock?limit=2")
+    assert first.status_code == 200
+    assert [m["quantity"] for m in first.json] == [3, 2]
+    cursor = first.headers["X-Next-Cursor"]
+
+    second = client.get(f"/api/productos/2/stock?limit=2&cursor={cursor}")
+    assert second.status_code == 200
+    assert second.json[0]["quantity"] == 1
+    assert not {m["id"] for m in first.json} & {m["id"] for m in second.json}
+
+    assert client.get("/api/productos/2/stock?cursor=invalido").status_code == 400
+
+
+def test_get_stock_movements_agrupados(client):
+    client.post("/api/productos/3/stock", json={"quantity": 4})
+
+    response = client.get("/api/productos/3/stock?group=week")
+    assert response.status_code == 200
+    latest = response.json[0]
+    assert latest["ingreso"] >= 4
+    assert latest["net"] == latest["ingreso"] + latest["devolucion"] - latest["salida"]
+
+    assert client.get("/api/productos/3/stock?group=month").status_code == 400
+    assert client.get("/api/productos/9999/stock?group=day").status_code == 404
+
+
+def test_stock_as_of(client):
+    StockSnapshotService().take_snapshots()  # cierre de ayer
+    Database().release_connection()
+    client.post("/api/productos/1/stock", json={"quantity": 5})
+
+    today = date.today()
+    response = client.get(f"/api/productos/stock/as-of?date={today}&product_id=1")
+    assert response.status_code == 200
+    assert response.json["products"][0]["stock"] == client.get("/api/productos/1").json["stock"]
+
+    # Ayer: el stock de hoy menos los movimientos de hoy
+    yesterday = client.get(f"/api/productos/stock/as-of?date={today - timedelta(days=1)}&product_id=1").json
+    net_today = sum(row["net"] for row in client.get(
+        f"/api/productos/1/stock?group=day&from={today}").json)
+    assert yesterday["source"].startswith("snapshot")
+    assert yesterday["products"][0]["stock"] == response.json["products"][0]["stock"] - net_today
+
+    everything = client.get(f"/api/productos/stock/as-of?date={today}").json
+    assert len(everything["products"]) >= 3
+    assert float(everything["total_value"]) == pytest.approx(sum(float(p["value"]) for p in everything["products"]))
+
+    assert client.get("/api/productos/stock/as-of").status_code == 400
+    assert client.get(f"/api/productos/stock/as-of?date={today + timedelta(days=1)}").status_code == 400
+    assert client.get(f"/api/productos/stock/as-of?date={today}&product_id=9999").status_code == 404
+
+def test_stock_as_of_producto_creado_despues(client):
+    StockSnapshotService().take_snapshots()
+    Database().release_connection()
+    body = {"name": "Producto Nuevo As Of", "barcode": "7790000000108", "price": 2.0,
+            "stock": 40, "url_image": "", "category": "Test"}
+    product_id = client.post("/api/productos/", json=body).json["id"]
+
+    try:
+        today = date.today()
+        yesterday = today - timedelta(days=1)
+        response = client.get(f"/api/productos/stock/as-of?date={yesterday}")
+        assert product_id not in [p["product_id"] for p in response.json["products"]]
+        assert client.get(f"/api/productos/stock/as-of?date={yesterday}&product_id={product_id}").status_code == 404
+
+        response = client.get(f"/api/productos/stock/as-of?date={today}&product_id={product_id}")
+        assert response.json["products"][0]["stock"] == 40
+    finally:
+        client.delete(f"/api/productos/{product_id}")
+
+
+def test_reorder_engine(client):
+    body = {"name": "Producto Reposición", "barcode": "7790000000078", "price": 5.0,
+            "stock": 6, "url_image": "", "category": "Test"}
+    product_id = client.post("/api/productos/", json=body).json["id"]
+    sale_id = None
+    try:
+        sale_id = client.post("/api/sales/", json={
+            "payment_method": "efectivo",
+            "products": [{"product_id": product_id, "quantity": 4, "unit_price": 5.0}]
+        }).json["sale"]["id"]
+
+        engine = ReorderEngine()
+        assert product_id in engine._dirty  # la venta lo marcó para recalcular
+        engine.refresh_dirty()
+        Database().release_connection()
+
+        # 4 unidades en la ventana: velocidad 4 / REORDER_WINDOW_DAYS, stock 2 <= punto de pedido
+        item = next(row for row in client.get("/api/productos/reorder").json if row["product_id"] == product_id)
+        assert float(item["daily_velocity"]) == pytest.approx(4 / engine.window_days, abs=0.001)
+        assert item["stock"] == 2
+        assert item["reorder_point"] >= 2
+
+        dashboard = client.get("/api/contabilidad/reports/dashboard").json
+        assert dashboard["alerts"]["low_stock_products"] == engine.count_needs_reorder() >= 1
+
+        assert client.get("/api/productos/reorder?limit=0").status_code == 400
+    finally:
+        _delete_sale_and_product(client, sale_id, product_id)
+
+def test_reorder_engine_producto_agotado(client):
+    body = {"name": "Producto Agotado", "barcode": "7790000000085", "price": 5.0,
+            "stock": 3, "url_image": "", "category": "Test"}
+    product_id = client.post("/api/productos/", json=body).json["id"]
+    sale_id = None
+    try:
+        sale_id = client.post("/api/sales/", json={
+            "payment_method": "efectivo",
+            "products": [{"product_id": product_id, "quantity": 3, "unit_price": 5.0}]
+        }).json["sale"]["id"]
+
+        # Vendió hasta quedarse sin stock y la venta ya salió de la ventana: velocidad 0
+        db = Database()
+        db.execute("UPDATE sales SET sale_date = sale_date - INTERVAL %s DAY WHERE id = %s",
+                   (ReorderEngine().window_days + 1, sale_id)).close()
+        ReorderEngine().refresh([product_id])
+        db.release_connection()
+
+        item = next(row for row in client.get("/api/productos/reorder").json if row["product_id"] == product_id)
+        assert item["stock"] == 0
+        assert float(item["daily_velocity"]) == 0
+        assert float(item["days_of_cover"]) == 0
+    finally:
+        _delete_sale_and_product(client, sale_id, product_id)
+
+def _delete_sale_and_product(client, sale_id, product_id):
+    """Borra lo que crea cada test de reposición: así se puede volver a correr con el mismo código de barras."""
+    if sale_id is not None:
+        client.delete(f"/api/sales/{sale_id}")
+    client.delete(f"/api/productos/{product_id}")
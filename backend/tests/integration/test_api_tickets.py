@@ -0,0 +1,46 @@
+import time
+
+from src.minio_storage.minio_service import MinioClient
+from src.sales.routes.sales_routes import sale_service
+from src.tickets.services.ticket_pipeline import TicketPipeline
+
+BASE_PATH = "/api/tickets"
+
+
+def test_ticket_metrics(client):
+    response = client.get(f"{BASE_PATH}/metrics")
+
+    assert response.status_code == 200
+    metrics = response.json["metrics"]
+    assert metrics["queue_depth"] >= 0
+    assert {"processed", "failed", "latency_seconds"} <= metrics.keys()
+
+
+def test_ticket_worker_genera_y_sube_el_pdf(client, monkeypatch):
+    body = {"products": [{"product_id": 1, "quantity": 2, "unit_price": 19.99}]}
+    sale_id = client.post("/api/sales/", json=body).json["sale"]["id"]
+
+    uploads = {}
+    def guardar_ticket(nombre, ticket_pdf):
+        uploads[nombre] = ticket_pdf
+        return nombre
+    monkeypatch.setattr(MinioClient, "guardar_ticket", guardar_ticket)
+    monkeypatch.setattr(MinioClient, "url_ticket", lambda nombre: f"http://minio.test/tickets/{nombre}?X-Amz-Signature=firma")
+    assert client.get(f"/api/sales/{sale_id}/ticket").status_code == 404  # todavía no se generó
+
+    # Lo que corre un worker del pool para cada venta encolada
+    pipeline = TicketPipeline()
+    monkeypatch.setattr(pipeline, "sale_service", sale_service)
+    processed, failed = pipeline.processed, pipeline.failed
+    pipeline._process(sale_id, time.monotonic())
+
+    assert (pipeline.processed, pipeline.failed) == (processed + 1, failed)
+    assert uploads[f"ticket_{sale_id}.pdf"].startswith(b"%PDF")
+    sale = client.get(f"/api/sales/{sale_id}").json["sale"]
+    assert sale["ticket_url"] == f"ticket_{sale_id}.pdf"
+
+    # El bucket no es público: el ticket se entrega con una URL prefirmada
+    response = client.get(f"/api/sales/{sale_id}/ticket")
+    assert response.status_code == 302
+    assert response.headers["Location"] == f"http://minio.test/tickets/ticket_{sale_id}.pdf?X-Amz-Signature=firma"
+    assert client.get("/api/sales/999999/ticket").status_code == 404
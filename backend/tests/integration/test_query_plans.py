@@ -0,0 +1,109 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from src.db import Database
+from src.accounting.services.reports_services import ReportsService
+from src.accounting.services.cash_closures_services import CashClosureService
+from src.sales.services.sale_service import SaleService
+from src.products.services.stock_service import StockService
+
+SEEDED_SALES = 2000
+
+
+@pytest.fixture
+def captured_queries(app, monkeypatch):
+    """Registra las consultas que ejecutan los servicios para poder pedir su EXPLAIN."""
+    queries = []
+    original_execute = Database.execute
+
+    def spy(self, query, params=None):
+        queries.append((query, params))
+        return original_execute(self, query, params)
+
+    monkeypatch.setattr(Database, "execute", spy)
+    with app.app_context():
+        yield queries
+
+
+@pytest.fixture
+def seeded_sales(app):
+    """
+    Ventas viejas (2015) para que el plan no dependa del azar: con la tabla casi vacía
+    un full scan cuesta lo mismo que el índice y el optimizador elige cualquiera.
+    """
+    db = Database()
+    with app.app_context():
+        with db.transaction() as connection:
+            cursor = connection.cursor()
+            cursor.executemany(
+                "INSERT INTO sales (sale_date, total_amount, payment_method, client_id) VALUES (%s, %s, %s, %s)",
+                [(datetime(2015, 1, 1) + timedelta(hours=i), 10, "efectivo", f"plan-{i}")
+                 for i in range(SEEDED_SALES)]
+            )
+            cursor.close()
+        db.execute("ANALYZE TABLE sales").close()
+        db.release_connection()
+    yield
+    with app.app_context():
+        db.execute("DELETE FROM sales WHERE client_id LIKE 'plan-%'").close()
+        db.release_connection()
+
+
+def _sale_date_queries(queries):
+    return [(q, p) for q, p in queries if "sale_date >=" in q and "FROM sales" in q]
+
+
+def _sales_date_access(query, params):
+    """Filas del EXPLAIN que leen sales con el filtro de fecha disponible."""
+    cursor = Database().execute("EXPLAIN " + query, params)
+    rows = cursor.fetchall()
+    cursor.close()
+    return [
+        row for row in rows
+        if row["table"] in ("sales", "s") and "idx_sales_date" in (row["possible_keys"] or "")
+    ]
+
+
+@pytest.mark.parametrize("run_service", [
+    lambda: ReportsService().get_daily_report(date.today().strftime('%Y-%m-%d')),
+    lambda: ReportsService().get_monthly_report(2025, 1),
+    lambda: ReportsService().get_yearly_report(2025),
+    lambda: ReportsService().get_dashboard_kpis(),
+    lambda: ReportsService().get_weekly_quick_stats(),
+    lambda: CashClosureService()._calculate_daily_totals(date.today()),
+    lambda: SaleService().get_sales_by_date(date.today().strftime('%Y-%m-%d')),
+    lambda: SaleService().get_daily_summary(),
+], ids=["daily", "monthly", "yearly", "dashboard", "weekly", "closure", "by_date", "summary"])
+def test_sale_date_filters_use_index(seeded_sales, captured_queries, run_service):
+    run_service()
+    queries = _sale_date_queries(captured_queries)
+    assert queries
+
+    for query, params in queries:
+        rows = _sales_date_access(query, params)
+        assert rows, query
+        for row in rows:
+            assert row["key"] == "idx_sales_date", query
+            assert row["type"] == "range", query
+
+
+@pytest.mark.parametrize("run_service", [
+    lambda: StockService().get_movements(1, limit=10),
+    lambda: StockService().get_movement_totals(1, "day"),
+    lambda: StockService().get_movement_totals(1, "week", date_from=date(2025, 1, 1)),
+], ids=["page", "day", "week"])
+def test_stock_movements_use_product_date_index(captured_queries, run_service):
+    run_service()
+    queries = [(q, p) for q, p in captured_queries if "FROM stock_movements" in q]
+    assert queries
+
+    for query, params in queries:
+        cursor = Database().execute("EXPLAIN " + query, params)
+        row = cursor.fetchone()
+        cursor.close()
+        assert "idx_stock_movements_product_date" in (row["possible_keys"] or ""), query
+        if "GROUP BY" in query:
+            # Los totales se calculan sin leer las filas de la tabla
+            assert row["key"] == "idx_stock_movements_product_date", query
+            assert "Using index" in (row["Extra"] or ""), query
@@ -0,0 +1,93 @@
+from contextlib import contextmanager
+import time
+
+import mysql.connector
+import pytest
+
+from src.sales.routes.sales_routes import sale_service
+from src.sales.services.sale_journal import _decode
+
+
+@pytest.fixture
+def journal(app, tmp_path, monkeypatch):
+    journal = sale_service.journal
+    monkeypatch.setattr(journal, "path", str(tmp_path / "sales_journal.log"))
+    monkeypatch.setattr(journal, "rejected_path", str(tmp_path / "sales_journal.log.rejected"))
+    monkeypatch.setattr(journal, "_file", None)
+    with app.app_context():
+        yield journal
+
+
+@pytest.fixture
+def temp_product(client):
+    unique_suffix = str(int(time.time() * 1000))
+    body = {
+        "name": f"Producto Diario {unique_suffix}",
+        "barcode": f"DJ{unique_suffix}",
+        "price": 10.00,
+        "stock": 5,
+        "url_image": "",
+        "category": "Test"
+    }
+    response = client.post("/api/productos/", json=body)
+    assert response.status_code == 201
+    product_id = response.json["id"]
+    yield product_id
+    client.delete(f"/api/productos/{product_id}")
+
+
+def _get_stock(client, product_id):
+    return client.get(f"/api/productos/{product_id}").json["stock"]
+
+
+def test_journal_replay_loads_sales_once(client, journal, temp_product):
+    client_id = f"diario-{time.time()}"
+    sale = {
+        "client_id": client_id,
+        "sale_date": "2025-01-15T10:30:00",
+        "payment_method": "efectivo",
+        "products": [{"product_id": temp_product, "quantity": 1, "unit_price": 10.0}]
+    }
+    journal.append(sale)
+    journal.append(sale)  # reintento: el client_id evita la doble carga
+
+    assert journal.replay(sale_service) == 2
+    assert journal.pending_count() == 0
+    assert _get_stock(client, temp_product) == 4
+
+
+def test_create_sale_sin_base_va_al_diario(client, journal, monkeypatch):
+    @contextmanager
+    def connection_lost(*args, **kwargs):
+        raise mysql.connector.errors.OperationalError(msg="Lost connection to MySQL server", errno=2013)
+        yield
+
+    monkeypatch.setattr(sale_service.db, "transaction", connection_lost)
+    monkeypatch.setattr(journal, "_offline_until", 0.0)  # se restaura al terminar: no afecta otros tests
+    response = client.post("/api/sales/", json={
+        "payment_method": "tarjeta",
+        "products": [{"product_id": 1, "quantity": 2, "unit_price": 19.99}]
+    })
+
+    assert response.status_code == 202
+    assert response.json["queued"] is True
+    assert response.json["sale"]["id"] is None
+    assert journal.is_offline()
+
+    with open(journal.path, "rb") as file:
+        lines = file.read().splitlines()
+    assert len(lines) == 1
+    sale = _decode(lines[0])
+    assert sale["client_id"] == response.json["sale"]["client_id"]
+    assert sale["payment_method"] == "tarjeta"
+    assert sale["products"] == [{"product_id": 1, "quantity": 2, "unit_price": 19.99}]
+
+
+def test_journal_rejects_corrupt_lines(journal):
+    with open(journal.path, "wb") as file:
+        file.write(b"00000000 {\"client_id\": \"roto\"}\n")
+
+    assert journal.replay(sale_service) == 1
+    assert journal.pending_count() == 0
+    with open(journal.rejected_path) as file:
+        assert "Checksum" in file.read()
@@ -0,0 +1,54 @@
+import statistics
+import time
+
+import pytest
+
+BASE_PATH = "/api/sales"
+CART_SIZES = [1, 10, 50]
+SALES_PER_SIZE = 30
+# Con una consulta por línea, 50 líneas costarían decenas de veces una; en lote, poco más
+MAX_P50_GROWTH = 5
+# El p99 con 30 ventas es casi el peor caso: más ruidoso, la cota es más holgada
+MAX_P99_GROWTH = 10
+
+
+@pytest.fixture
+def bench_products(client):
+    """Crea 50 productos con stock de sobra para armar carritos grandes."""
+    unique_suffix = str(int(time.time() * 1000))
+    product_ids = []
+    for i in range(max(CART_SIZES)):
+        body = {
+            "name": f"Producto Bench {unique_suffix}-{i}",
+            "barcode": f"BE{unique_suffix}{i:02d}",
+            "price": 1.00,
+            "stock": 100000,
+            "url_image": "",
+            "category": "Bench"
+        }
+        response = client.post("/api/productos/", json=body)
+        assert response.status_code == 201
+        product_ids.append(response.json["id"])
+    yield product_ids
+    for product_id in product_ids:
+        client.delete(f"/api/productos/{product_id}")
+
+
+def test_checkout_latency_by_cart_size(client, bench_products):
+    """El p50 y el p99 del checkout se mantienen casi planos con el tamaño del carrito."""
+    p50, p99 = {}, {}
+    for size in CART_SIZES:
+        cart = [{"product_id": pid, "quantity": 1, "unit_price": 1.00} for pid in bench_products[:size]]
+        latencies = []
+        for _ in range(SALES_PER_SIZE):
+            start = time.perf_counter()
+            response = client.post(f"{BASE_PATH}/", json={"products": cart})
+            latencies.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 201
+
+        percentiles = statistics.quantiles(latencies, n=100)
+        p50[size], p99[size] = percentiles[49], percentiles[98]
+
+    smallest, largest = min(CART_SIZES), max(CART_SIZES)
+    assert p50[largest] < MAX_P50_GROWTH * p50[smallest], p50
+    assert p99[largest] < MAX_P99_GROWTH * p99[smallest], p99
@@ -10,11 +10,22 @@ CREATE TABLE products (
         price DECIMAL(10,2) NOT NULL,
         stock INT NOT NULL DEFAULT 0,
         url_image VARCHAR(255),
-        category varchar(100)
+        category varchar(100),
+        created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,  -- stock as-of skips products created later
+        updated_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)  -- version for delta sync
 ); 
 
 CREATE INDEX idx_products_name ON products(name);
 CREATE INDEX idx_products_barcode ON products(barcode);
+CREATE INDEX idx_products_updated_at ON products(updated_at);
+
+-- 2.1 Deleted products (tombstones for delta sync)
+CREATE TABLE product_deletions (
+        product_id INT PRIMARY KEY,
+        deleted_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6)
+);
+
+CREATE INDEX idx_product_deletions_deleted_at ON product_deletions(deleted_at);
 
 
 -- 3. Sales
@@ -24,7 +35,8 @@ CREATE TABLE sales (
         total_amount DECIMAL(10,2) NOT NULL,
         payment_method VARCHAR(50),
         ticket_url VARCHAR(255),  -- link to PDF in MinIO
-        invoice_state ENUM('pendiente', 'facturado') DEFAULT 'pendiente'
+        invoice_state ENUM('pendiente', 'facturado') DEFAULT 'pendiente',
+        client_id VARCHAR(64) UNIQUE  -- id generated by the register (offline sync)
 );
 
 CREATE INDEX idx_sales_date ON sales(sale_date);
@@ -43,6 +55,17 @@ CREATE TABLE sale_product (
 CREATE INDEX idx_sale_product_product_id ON sale_product(product_id);
 CREATE INDEX idx_sale_product_sale_id ON sale_product(sale_id);
 
+-- 3.2 Idempotency keys for POST /api/sales (safe client retries)
+CREATE TABLE idempotency_keys (
+        idempotency_key VARCHAR(255) PRIMARY KEY,
+        sale_id INT,
+        status_code INT NOT NULL,
+        response_body TEXT NOT NULL,  -- stored response replayed on retries
+        created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX idx_idempotency_keys_created_at ON idempotency_keys(created_at);
+
 -- 4. Providers
 CREATE TABLE providers (
         id INT PRIMARY KEY AUTO_INCREMENT,
@@ -96,6 +119,7 @@ CREATE TABLE expenses (
         notes TEXT,
         FOREIGN KEY (user_id) REFERENCES users(id)
 );
+CREATE INDEX idx_expenses_date ON expenses(expense_date);
 
 -- 8. Cash Closures
 CREATE TABLE cash_closures (
@@ -105,6 +129,7 @@ CREATE TABLE cash_closures (
         total_sales DECIMAL(10,2) DEFAULT 0,
         total_expenses DECIMAL(10,2) DEFAULT 0,
         final_balance DECIMAL(10,2) DEFAULT 0,
+        UNIQUE KEY uq_cash_closures_date (closure_date),
         FOREIGN KEY (user_id) REFERENCES users(id)
 );
 
@@ -135,5 +160,29 @@ CREATE TABLE stock_movements (
         FOREIGN KEY (provider_id) REFERENCES providers(id) ON DELETE SET NULL
 );
 
-CREATE INDEX idx_stock_movements_product_id ON stock_movements(product_id);
-CREATE INDEX idx_stock_movements_date ON stock_movements(movement_date);
\ No newline at end of file
+-- product history: keyset pages on (movement_date, id) and per-period totals are index-only (also backs the product_id FK)
+CREATE INDEX idx_stock_movements_product_date ON stock_movements(product_id, movement_date, id, movement_type, quantity);
+CREATE INDEX idx_stock_movements_date ON stock_movements(movement_date);
+
+-- 10.1 Daily closing stock per product (written by a background job; backs stock as-of-date queries)
+CREATE TABLE stock_snapshots (
+        snapshot_date DATE NOT NULL,
+        product_id INT NOT NULL,
+        stock INT NOT NULL,
+        PRIMARY KEY (snapshot_date, product_id)
+);
+
+-- 10.2 Reorder stats per product (sales velocity over a sliding window, refreshed by a background job)
+CREATE TABLE product_reorder_stats (
+        product_id INT PRIMARY KEY,
+        daily_velocity DECIMAL(12,3) NOT NULL,   -- average units sold per day
+        velocity_stddev DECIMAL(12,3) NOT NULL,
+        days_of_cover DECIMAL(12,1),             -- NULL if the product does not sell
+        reorder_point INT NOT NULL,
+        needs_reorder TINYINT(1) NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
+);
+
+-- dashboard count is index-only; the reorder list walks it most urgent first
+CREATE INDEX idx_product_reorder_stats_needs_reorder ON product_reorder_stats(needs_reorder, days_of_cover);
\ No newline at end of file
@@ -47,6 +47,49 @@ export const getProductsApi = async (
 };
 
 
+// Resuelve un código de barras en el servidor. Devuelve null si no existe.
+export const getProductByBarcodeApi = async (
+    barcode: string
+): Promise<Product | null> => {
+    const res = await fetch(`${API_URL}barcode/${encodeURIComponent(barcode)}`, {
+        method: "GET",
+        headers: {
+            'Accept': 'application/json',
+        },
+        credentials: 'omit'
+    });
+
+    if (res.status === 404) {
+        return null;
+    }
+    if (!res.ok) {
+        throw new Error(`Error http: ${res.status} ${res.statusText}`);
+    }
+    return await res.json() as Product;
+};
+
+
+// Búsqueda por nombre, código o categoría resuelta en el servidor, ordenada por relevancia.
+export const searchProductsApi = async (
+    query: string,
+    limit = 20
+): Promise<Product[]> => {
+    const params = new URLSearchParams({ q: query, limit: String(limit) });
+    const res = await fetch(`${API_URL}search?${params}`, {
+        method: "GET",
+        headers: {
+            'Accept': 'application/json',
+        },
+        credentials: 'omit'
+    });
+
+    if (!res.ok) {
+        throw new Error(`Error http: ${res.status} ${res.statusText}`);
+    }
+    return await res.json() as Product[];
+};
+
+
 export const updateProductApi = async (
     productId: number,
     productData: Partial<CreateProductData>
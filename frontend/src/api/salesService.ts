@@ -2,12 +2,17 @@ import type { CreateSalePayload, SaleResponse } from '../types/Sale';
 
 const API_URL = "http://localhost:5000/api/sales/";
 
-export const createSaleApi = async (saleData: CreateSalePayload): Promise<SaleResponse> => {
+export const createSaleApi = async (
+  saleData: CreateSalePayload,
+  idempotencyKey?: string
+): Promise<SaleResponse> => {
   const res = await fetch(API_URL, {
     method: "POST",
     headers: {
       'Accept': 'application/json',
       'Content-Type': 'application/json',
+      // El backend devuelve la misma venta si se reintenta con la misma clave
+      ...(idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : {}),
     },
     body: JSON.stringify(saleData)
   });
@@ -19,4 +24,7 @@ export const createSaleApi = async (saleData: CreateSalePayload): Promise<SaleRe
   }
 
   return data;
-};
\ No newline at end of file
+};
+
+// El PDF del ticket se pide al backend, que redirige a una URL prefirmada de MinIO
+export const saleTicketUrl = (saleId: number): string => `${API_URL}${saleId}/ticket`;
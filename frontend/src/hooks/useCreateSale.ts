@@ -1,16 +1,23 @@
-import { useState } from 'react';
+import { useRef, useState } from 'react';
 import { createSaleApi } from '../api/salesService';
 import type { CreateSalePayload, SaleResponse } from '../types/Sale';
 
 const useCreateSale = () => {
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
+  // Clave de idempotencia del carrito en curso: se reutiliza si se reintenta el mismo carrito
+  const pendingKey = useRef<{ payload: string; key: string } | null>(null);
 
   const createSale = async (payload: CreateSalePayload): Promise<SaleResponse | null> => {
     setLoading(true);
     setError(null);
+    const serialized = JSON.stringify(payload);
+    if (!pendingKey.current || pendingKey.current.payload !== serialized) {
+      pendingKey.current = { payload: serialized, key: crypto.randomUUID() };
+    }
     try {
-      const result = await createSaleApi(payload);
+      const result = await createSaleApi(payload, pendingKey.current.key);
+      pendingKey.current = null;
       return result;
     } catch (err) {
       const msg = err instanceof Error ? err.message : "Error desconocido al crear la venta";
@@ -5,6 +5,7 @@ import Navbar from '../../components/Navbar';
 import useCart from '../../hooks/useCart';
 import useGetProducts from '../../hooks/useGetProducts'; 
 import useCreateSale from '../../hooks/useCreateSale';
+import { saleTicketUrl } from '../../api/salesService';
 import ScannerInput from './components/ScannerInput';
 import PosCart from './components/PosCart';
 import PaymentModal from './components/PaymentModal';
@@ -37,7 +38,7 @@ const Sales = () => {
       setShowSuccessToast(true);
       console.log("Ticket de venta generado:", response.sale);
       if (response.sale.ticket_url) {
-        window.open(response.sale.ticket_url, '_blank');
+        window.open(saleTicketUrl(response.sale.id), '_blank');
       }
     }
   };
@@ -2,6 +2,7 @@ import React, { useState, useRef, useEffect } from 'react';
 import { FaBarcode } from "react-icons/fa6";
 import { Alert } from 'react-bootstrap';
 import type { Product } from '../../../types/Product';
+import { getProductByBarcodeApi, searchProductsApi } from '../../../api/productService';
 
 interface Props {
   products: Product[];
@@ -29,15 +30,24 @@ const ScannerInput = ({ products, onScan }: Props) => {
     }
   };
 
-  const handleScan = () => {
+  const handleScan = async () => {
     if (!inputValue.trim()) return;
 
     const term = inputValue.toLowerCase().trim();
     
-    // Buscar coincidencia exacta por código de barras O coincidencia parcial por nombre
-    const found = products.find(p => 
-      p.barcode === term || p.name.toLowerCase().includes(term)
-    );
+    // El código de barras y la búsqueda por nombre se resuelven en el servidor (índices en
+    // memoria); la lista local sólo se usa si el servidor no responde
+    let found: Product | null | undefined = null;
+    try {
+      found = await getProductByBarcodeApi(inputValue.trim());
+      if (!found) {
+        [found] = await searchProductsApi(inputValue.trim(), 1);
+      }
+    } catch {
+      found = products.find(p => 
+        p.barcode === term || p.name.toLowerCase().includes(term)
+      );
+    }
 
     if (found) {
       onScan(found);